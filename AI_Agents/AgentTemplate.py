@@ -97,15 +97,40 @@ def get_available_queue_directions(game_state: dict, team_color: str) -> list:
     
     return result
 
+# Return the entity grid: the name of what's on each tile, or '' for nothing. Index it like game_state['EntityGrid'][y][x].
+# Works whichever way you asked for the entity grid (see Agent.game_state_options). If the engine didn't send
+# the full grid, it's rebuilt the first time you ask for it and kept in game_state['EntityGrid'].
+def get_entity_grid(game_state: dict) -> list:
+    if 'EntityGrid' in game_state:
+        return game_state['EntityGrid']
+
+    grid = [[''] * len(game_state['FloorTiles'][0]) for _ in game_state['FloorTiles']]
+    if 'EntityPositions' in game_state:
+        for x, y, name in game_state['EntityPositions']:
+            grid[y][x] = name
+    else:
+        # Rebuilt from the lists. Mercenaries and demons that just died are still listed, but not on the grid
+        for tower in game_state['Towers']:
+            grid[tower['y']][tower['x']] = tower['Name']
+        for unit in game_state['Mercenaries'] + game_state['Demons']:
+            if unit['State'] != 'dead':
+                grid[unit['y']][unit['x']] = unit['Name']
+        for demon in game_state.get('GridOnlyDemons', []):
+            grid[demon['y']][demon['x']] = demon['Name']
+
+    game_state['EntityGrid'] = grid
+    return grid
+
 # team_color should be 'r' or 'b'
 # Return a list of coordinates that are available for building
 def get_available_build_spaces(game_state: dict, team_color: str):
     result = []
+    entity_grid = get_entity_grid(game_state)
 
     for y, row in enumerate(game_state['FloorTiles']):
         for x, chr_at_x in enumerate(row):
             if chr_at_x == team_color:
-                if game_state['EntityGrid'][y][x] == '':
+                if entity_grid[y][x] == '':
                     result.append((x,y))
 
     return result
@@ -127,6 +152,12 @@ def get_my_money_amount(game_state: dict, team_color: str) -> int:
 
 # -- AGENT CLASS (COMPETITORS WILL IMPLEMENT THIS) --
 class Agent:
+    # Optional: change how the game state is sent to you every turn (the initial game state is always complete).
+    #   {"EntityGrid": "sparse"} - "EntityPositions", a list of [x, y, name] for occupied tiles, instead of "EntityGrid"
+    #   {"EntityGrid": "none"}   - no entity grid at all. The Towers, Mercenaries and Demons lists have the same information.
+    # Either way, get_entity_grid(game_state) still gives you the full grid when you need it.
+    game_state_options = {}
+
     def initialize_and_set_name(self, initial_game_state: dict, team_color: str) -> str:
         # -- YOUR CODE BEGINS HERE --
         # Competitors: Do any initialization here
@@ -159,9 +190,13 @@ if __name__ == '__main__':
         input_buffer.append(input())
     game_state_init = json.loads(''.join(input_buffer[:-1]))
 
-    # create and initialize agent, set team name
+    # create and initialize agent, ask for any game state options, set team name
     agent = Agent()
-    print(agent.initialize_and_set_name(game_state_init, team_color))
+    team_name = agent.initialize_and_set_name(game_state_init, team_color)
+    game_state_options = getattr(agent, 'game_state_options', None)
+    if game_state_options:
+        print("--OPTIONS " + json.dumps(game_state_options) + "--")
+    print(team_name)
 
     # perform first action
     print(agent.do_turn(game_state_init).to_json())
@@ -138,6 +138,13 @@ class Agent:
         self.num_cannons = 0
         self.num_crossbows = 0
         self.num_miniguns = 0
+
+        # The engine sends facts about the map that never change with the initial game state only, so keep them
+        map_analysis = initial_game_state.get("MapAnalysis")
+        if map_analysis is not None:
+            self.q_directions = map_analysis["QueueDirections"][team_color]
+        else:
+            self.q_directions = get_available_queue_directions(initial_game_state, team_color)
         print("Check here")
         # Return a string representing your team's name
         return "Your Team Name"
@@ -148,7 +155,7 @@ class Agent:
         # -- YOUR CODE BEGINS HERE --
         # Competitors: For your convenience, it's recommended that you use the helper functions given earlier in this file
         print("Check here2")
-        q_directions = get_available_queue_directions(game_state, self.team_color)
+        q_directions = self.q_directions
         build_spaces = get_available_build_spaces(game_state, self.team_color)
         my_money = get_my_money_amount(game_state, self.team_color)
         my_towers = get_my_towers(game_state, self.team_color)
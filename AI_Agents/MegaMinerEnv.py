@@ -7,6 +7,7 @@ import numpy as np
 from gymnasium.spaces import Box, Dict, Discrete
 from pettingzoo import AECEnv
 from pettingzoo.utils import agent_selector, wrappers
+import os
 import sys
 from pathlib import Path
 
@@ -15,8 +16,17 @@ sys.path.append(str(Path(__file__).resolve().parent.parent / 'backend'))
 
 from Game import Game
 from AIAction import AIAction
+from MapCache import load_map
+from GameEvents import summarize_turn
 import Constants
 
+try:
+    import obs_encoding
+    import action_encoding
+except ImportError:
+    from AI_Agents import obs_encoding
+    from AI_Agents import action_encoding
+
 
 def get_available_build_spaces(game, team_color: str):
     """
@@ -29,20 +39,22 @@ def get_available_build_spaces(game, team_color: str):
     for y, row in enumerate(gs.floor_tiles):
         for x, tile_owner in enumerate(row):
             if tile_owner == team_color:
-                # entity_grid is a 2D array of entities or None
-                if gs.entity_grid[y][x] is None:
+                # entity_grid is an EntityGrid; get() returns the entity on a tile, or None
+                if gs.entity_grid.get(x, y) is None:
                     result.append((x, y))
 
     return result
 
 
-def env(map_path):
+def env(map_path=None, curriculum=None, obs_mode="padded", obs_bucket=4, action_mode="xy"):
     """
     The env function wraps the raw environment in helpful wrappers provided by PettingZoo.
     These wrappers can enforce constraints and perform standard transformations, which is good practice.
+    Pass either one map to train on, or a MapCurriculum (see map_curriculum.py) to draw a map from on every reset.
+    obs_mode and obs_bucket choose the observation layout (see obs_encoding.py), action_mode the action layout (see action_encoding.py).
     """
     internal_render_mode = "human"
-    env = raw_env(render_mode=internal_render_mode, map_path=map_path)
+    env = raw_env(render_mode=internal_render_mode, map_path=map_path, curriculum=curriculum, obs_mode=obs_mode, obs_bucket=obs_bucket, action_mode=action_mode)
     # This wrapper asserts that actions are within the defined action space.
     # It's useful for debugging during development to catch invalid actions.
     env = wrappers.AssertOutOfBoundsWrapper(env)
@@ -65,17 +77,44 @@ class raw_env(AECEnv):
 
     # Define maximum map dimensions for padding the observation space.
     # This ensures a consistent observation shape regardless of the actual map size, which is required by most RL libraries.
-    MAX_MAP_WIDTH = 50
-    MAX_MAP_HEIGHT = 50
+    MAX_MAP_WIDTH = obs_encoding.MAX_MAP_WIDTH
+    MAX_MAP_HEIGHT = obs_encoding.MAX_MAP_HEIGHT
 
-    def __init__(self, map_path, render_mode=None):
+    def __init__(self, map_path=None, render_mode=None, curriculum=None, obs_mode="padded", obs_bucket=4, action_mode="xy"):
         super().__init__()
         self.render_mode = render_mode
+
+        # Observation layout (see obs_encoding.py). A compact map covers every map this env may play.
+        if obs_mode not in obs_encoding.OBS_MODES:
+            raise ValueError(f"obs_mode must be one of {', '.join(obs_encoding.OBS_MODES)}, got {obs_mode}")
+        self.obs_mode = obs_mode
+        self.obs_map_shape = None
+        map_paths = curriculum.map_paths if curriculum is not None else [map_path]
+        if obs_mode == "compact":
+            self.obs_map_shape = obs_encoding.compact_map_shape(
+                [(load_map(path).width, load_map(path).height) for path in map_paths], obs_bucket
+            )
+
+        # Action layout (see action_encoding.py). The tile layout has room for the most tiles a team has on any map this env may play.
+        if action_mode not in action_encoding.ACTION_MODES:
+            raise ValueError(f"action_mode must be one of {', '.join(action_encoding.ACTION_MODES)}, got {action_mode}")
+        self.action_mode = action_mode
+        self.num_action_tiles = None
+        if action_mode == "tile":
+            self.num_action_tiles = action_encoding.max_buildable_tiles([load_map(path).floor_tiles for path in map_paths])
+
+        # The engine log is only written during training when asked for (train_ppo.py --enable_logging).
+        # Set on each of this env's games, so other games in the process keep logging as they were.
+        self.logging = os.environ.get("MEGAMINER_LOGGING") == "ON"
         
         # Load the game map and initialize the game state from the backend.
-        self.map_path = map_path
-        self.game = Game(self.map_path)
-        self.map_size = (len(self.game.game_state.floor_tiles[0]), len(self.game.game_state.floor_tiles))
+        # With a curriculum, the map is drawn again on every reset; one Game is kept per map this env has played,
+        # so going back to a map reuses its state objects.
+        self.curriculum = curriculum
+        self.games = {}
+        # (map path, team color) -> the team's tiles on that map, which tile actions index into
+        self.build_tiles = {}
+        self._use_map(map_path if map_path is not None else curriculum.sample())
 
         # --- PettingZoo Setup ---
         # Define the agents that exist in the environment.
@@ -101,6 +140,28 @@ class raw_env(AECEnv):
         self.action_r = None
         self.action_b = None
 
+    def _use_map(self, map_path):
+        """Switch to a map. The observation is padded to the same size on every map, so the spaces don't change."""
+        self.map_path = map_path
+        self.game = self.games.get(map_path)
+        if self.game is None:
+            self.game = Game(map_path)
+            # Rewards come from what happened each turn (see GameEvents.py)
+            self.game.game_state.events = []
+            self.game.game_state.logging = self.logging
+            self.games[map_path] = self.game
+        self.map_size = (len(self.game.game_state.floor_tiles[0]), len(self.game.game_state.floor_tiles))
+        for team_color in ('r', 'b'):
+            if (map_path, team_color) not in self.build_tiles:
+                tiles = self.game.game_state.map_data.buildable_tiles(team_color)
+                # A compiled map has its own copy of the list; ppo_agent.py works it out from the floor tiles
+                if tiles != action_encoding.buildable_tiles(self.game.game_state.floor_tiles, team_color):
+                    raise ValueError(f"The compiled form of {map_path} lists team {team_color}'s tiles in another order; compile it again (MapCompiler.py)")
+                self.build_tiles[(map_path, team_color)] = tiles
+        max_h, max_w = self.obs_map_shape or (self.MAX_MAP_HEIGHT, self.MAX_MAP_WIDTH)
+        if self.map_size[0] > max_w or self.map_size[1] > max_h:
+            raise ValueError(f"Map {map_path} is {self.map_size[0]}x{self.map_size[1]}, larger than the {max_w}x{max_h} observation")
+
     def observation_space(self, agent):
         """Returns the observation space for a given agent."""
         return self._observation_space_dict
@@ -115,34 +176,24 @@ class raw_env(AECEnv):
         We use a MultiDiscrete space, which is a flat vector of discrete choices.
         This is a common way to represent a complex action space for an RL agent.
         The vector is structured as: [action_type, x, y, tower_type, merc_direction]
+        - action_type: 0=nothing, 1=build
+        - x, y: coordinates for the action (0 to MAX_MAP_WIDTH-1, 0 to MAX_MAP_HEIGHT-1)
+        - tower_type: 0=crossbow, 1=cannon, 2=minigun, 3=house, 4=church
+        - merc_direction: 0="", 1=N, 2=S, 3=E, 4=W (used for spawning mercenaries)
+        In the tile layout, x and y are replaced by one index into the team's tiles (see action_encoding.py).
         """
-        return gymnasium.spaces.MultiDiscrete([
-            2,  # action_type: 0=nothing, 1=build, 2=destroy
-            self.MAX_MAP_WIDTH,  # x-coordinate for the action (0 to MAX_MAP_WIDTH-1)
-            self.MAX_MAP_HEIGHT, # y-coordinate for the action (0 to MAX_MAP_HEIGHT-1)
-            5,  # tower_type: 0=crossbow, 1=cannon, 2=minigun, 3=house, 4=church
-            5   # merc_direction: 0="", 1=N, 2=S, 3=E, 4=W (used for spawning mercenaries)
-        ])
+        return action_encoding.action_space(self.action_mode, self.num_action_tiles)
 
     def _create_observation_space(self):
         """
         Defines the observation space for an agent.
-        The observation is a Dict space containing:
-        - 'map': A 3D tensor (50x50x9) representing the spatial map with multiple channels
+        In the padded layout, the observation is a Dict space containing:
+        - 'map': A 3D tensor (50x50x7) representing the spatial map with multiple channels
         - 'vector': A 1D vector (10,) containing global game state features
         This is ideal for CNN policies that can process spatial information efficiently.
+        The compact layout holds the same map cropped, in 'tiles' and 'values' (see obs_encoding.py).
         """
-        # The map is represented as a 3D tensor (Height, Width, Channels).
-        map_space = Box(low=-np.inf, high=np.inf, shape=(self.MAX_MAP_HEIGHT, self.MAX_MAP_WIDTH, 7), dtype=np.float32)
-        
-        # The vector part contains additional global game state information.
-        vector_space = Box(low=-np.inf, high=np.inf, shape=(10,), dtype=np.float32)
-        
-        # Return a Dict space combining both
-        return Dict({
-            'map': map_space,
-            'vector': vector_space
-        })
+        return obs_encoding.observation_space(self.obs_mode, self.obs_map_shape)
 
     def _get_obs(self, agent):
         """
@@ -156,8 +207,8 @@ class raw_env(AECEnv):
 
         # --- Map Representation (Multi-channel) ---
         # Multi-channel map to represent spatial information. Each channel represents a different aspect of the game state.
-        obs_map = np.zeros((self.MAX_MAP_HEIGHT, self.MAX_MAP_WIDTH, 7), dtype=np.float32)
-        map_view = obs_map[:map_h, :map_w, :]  # view for easier indexing into non-padded area
+        # Filled in at the map's real size; obs_encoding pads or crops it for the observation layout.
+        map_view = np.zeros((map_h, map_w, obs_encoding.NUM_MAP_CHANNELS), dtype=np.float32)
 
         # --- Channel 0: Terrain Type ---
         # Encodes the type of each tile: 1=Path, 2=My Territory, 3=Opponent's Territory
@@ -297,12 +348,9 @@ class raw_env(AECEnv):
         vector_features[5:10] /= 100  # tower costs
 
         # --- Return observation as Dict with 3D map structure ---
-        # Keep map as 3D tensor (50x50x9) for CNN policies
+        # Keep map as 3D tensor for CNN policies
         # Include vector features separately
-        return {
-            'map': obs_map,
-            'vector': vector_features
-        }
+        return obs_encoding.encode(map_view, vector_features, self.obs_mode, self.obs_map_shape)
 
     def observe(self, agent):
         """
@@ -314,9 +362,17 @@ class raw_env(AECEnv):
     def reset(self, seed=None, options=None):
         """
         Resets the environment to its initial state for a new episode and returns the initial observation.
+        options may name the map to play ({"map_path": ...}); otherwise a curriculum, if there is one, picks it.
         """
+        # Pick this episode's map
+        if options and options.get("map_path"):
+            self._use_map(options["map_path"])
+        elif self.curriculum is not None:
+            self._use_map(self.curriculum.sample())
+
         # Reset the underlying game engine to a fresh state.
-        self.game = Game(self.map_path)
+        # This restores the existing game in place instead of building a new one, which matters when episodes are short.
+        self.game.reset()
 
         # Reset the PettingZoo-specific state for the new episode.
         self.agents = self.possible_agents[:]
@@ -327,7 +383,7 @@ class raw_env(AECEnv):
         self._cumulative_rewards = {agent: 0 for agent in self.agents}
         self.terminations = {agent: False for agent in self.agents}
         self.truncations = {agent: False for agent in self.agents}
-        self.infos = {agent: {} for agent in self.agents}
+        self.infos = {agent: {"map_path": self.map_path} for agent in self.agents}
         
         self.action_r = None
         self.action_b = None
@@ -357,14 +413,17 @@ class raw_env(AECEnv):
         tower_type_map = {0: "crossbow", 1: "cannon", 2: "minigun", 3: "house", 4: "church"}
         merc_dir_map = {0: "", 1: "N", 2: "S", 3: "E", 4: "W"}
 
-        act_type, x, y, tower_type, merc_dir = action
+        team_color = 'r' if agent == "player_r" else 'b'
+        act_type, x, y, tower_type, merc_dir = action_encoding.decode(action, self.action_mode, self.build_tiles[(self.map_path, team_color)])
 
         map_w, map_h = self.map_size
         original_x, original_y = x, y
 
         # --- Enforce map boundaries ---
-        x = np.clip(original_x, 0, map_w - 1)
-        y = np.clip(original_y, 0, map_h - 1)
+        # (A tile action is always on the map, or NO_TILE, which must stay an invalid build)
+        if self.action_mode == "xy":
+            x = np.clip(original_x, 0, map_w - 1)
+            y = np.clip(original_y, 0, map_h - 1)
 
         # # Out-of-bounds: penalize and force "nothing"
         # if original_x >= map_w or original_y >= map_h or original_x < 0 or original_y < 0:
@@ -380,9 +439,6 @@ class raw_env(AECEnv):
                 self.rewards[agent] += 20
 
 
-        team_color = 'r' if agent == "player_r" else 'b'
-
-
         valid_build_spaces = set(get_available_build_spaces(self.game, team_color))
 
         # If the chosen (x, y) is not a valid tile for this player, penalize and force "nothing"
@@ -421,24 +477,6 @@ class raw_env(AECEnv):
 
         # --- If both agents have acted, run a game turn and compute rewards ---
         if self.action_r is not None and self.action_b is not None:
-            # Snapshot state BEFORE running the turn
-            old_health_r = self.game.game_state.player_base_r.health
-            old_health_b = self.game.game_state.player_base_b.health
-            old_money_r = self.game.game_state.money_r
-            old_money_b = self.game.game_state.money_b
-
-            # Tower prices (we'll use price changes to detect builds)
-            old_house_cost_r    = self.game.game_state.house_price_r
-            old_house_cost_b    = self.game.game_state.house_price_b
-            old_crossbow_cost_r = self.game.game_state.crossbow_price_r
-            old_crossbow_cost_b = self.game.game_state.crossbow_price_b
-            old_cannon_cost_r   = self.game.game_state.cannon_price_r
-            old_cannon_cost_b   = self.game.game_state.cannon_price_b
-            old_minigun_cost_r  = self.game.game_state.minigun_price_r
-            old_minigun_cost_b  = self.game.game_state.minigun_price_b
-            old_church_cost_r   = self.game.game_state.church_price_r
-            old_church_cost_b   = self.game.game_state.church_price_b
-
             # Keep references to the actions *used* this turn
             old_action_r = self.action_r
             old_action_b = self.action_b
@@ -450,34 +488,21 @@ class raw_env(AECEnv):
             self.action_r = None
             self.action_b = None
 
-            # --- State AFTER the turn ---
-            health_r = self.game.game_state.player_base_r.health
-            health_b = self.game.game_state.player_base_b.health
-            money_r  = self.game.game_state.money_r
-            money_b  = self.game.game_state.money_b
-
-            house_cost_r    = self.game.game_state.house_price_r
-            house_cost_b    = self.game.game_state.house_price_b
-            crossbow_cost_r = self.game.game_state.crossbow_price_r
-            crossbow_cost_b = self.game.game_state.crossbow_price_b
-            cannon_cost_r   = self.game.game_state.cannon_price_r
-            cannon_cost_b   = self.game.game_state.cannon_price_b
-            minigun_cost_r  = self.game.game_state.minigun_price_r
-            minigun_cost_b  = self.game.game_state.minigun_price_b
-            church_cost_r   = self.game.game_state.church_price_r
-            church_cost_b   = self.game.game_state.church_price_b
-
-            # --- Detect which towers actually got built (prices usually increase on purchase) ---
-            house_built_r    = (house_cost_r    != old_house_cost_r)
-            house_built_b    = (house_cost_b    != old_house_cost_b)
-            crossbow_built_r = (crossbow_cost_r != old_crossbow_cost_r)
-            crossbow_built_b = (crossbow_cost_b != old_crossbow_cost_b)
-            cannon_built_r   = (cannon_cost_r   != old_cannon_cost_r)
-            cannon_built_b   = (cannon_cost_b   != old_cannon_cost_b)
-            minigun_built_r  = (minigun_cost_r  != old_minigun_cost_r)
-            minigun_built_b  = (minigun_cost_b  != old_minigun_cost_b)
-            church_built_r   = (church_cost_r   != old_church_cost_r)
-            church_built_b   = (church_cost_b   != old_church_cost_b)
+            # --- What happened this turn, per team (from the engine's events, see GameEvents.py) ---
+            turn = summarize_turn(self.game.game_state.events)
+            turn_r, turn_b = turn['r'], turn['b']
+
+            # --- Which towers actually got built (a team can build at most one tower per turn) ---
+            house_built_r    = "House"    in turn_r.towers_built
+            house_built_b    = "House"    in turn_b.towers_built
+            crossbow_built_r = "Crossbow" in turn_r.towers_built
+            crossbow_built_b = "Crossbow" in turn_b.towers_built
+            cannon_built_r   = "Cannon"   in turn_r.towers_built
+            cannon_built_b   = "Cannon"   in turn_b.towers_built
+            minigun_built_r  = "Minigun"  in turn_r.towers_built
+            minigun_built_b  = "Minigun"  in turn_b.towers_built
+            church_built_r   = "Church"   in turn_r.towers_built
+            church_built_b   = "Church"   in turn_b.towers_built
 
             # ======================
             #   REWARD COMPONENTS
@@ -485,12 +510,12 @@ class raw_env(AECEnv):
 
             # 1. HEALTH-BASED (primary objective)
             # How much more did I damage the opponent than they damaged me?
-            health_delta_r = health_r - old_health_r
-            health_delta_b = health_b - old_health_b
+            health_delta_r = -turn_r.base_damage_taken
+            health_delta_b = -turn_b.base_damage_taken
 
             # 2. ECONOMY (secondary)
-            income_r = money_r - old_money_r
-            income_b = money_b - old_money_b
+            income_r = turn_r.money_change
+            income_b = turn_b.money_change
 
             # 3. TIME PENALTY (encourage faster games)
             time_penalty = -0.01
@@ -0,0 +1,65 @@
+# This script defines how the PPO policy's actions are laid out. Like obs_encoding.py, it's shared by the
+# training environment (MegaMinerEnv.py) and the agent that plays with the trained model (ppo_agent.py).
+#
+#   "xy"   - the original layout: MultiDiscrete [action type, x, y, tower type, merc direction], with x and y
+#            picked over the whole 50x50 observation. Most (x, y) pairs aren't tiles the team can build on.
+#            Models trained before the tile layout existed use this one.
+#   "tile" - MultiDiscrete [action type, tile, tower type, merc direction], where tile indexes the team's own
+#            tiles on the current map (buildable_tiles), so every choice is a real tile of the team. The space
+#            has room for the map with the most tiles; on smaller maps the extra indices are invalid builds.
+#
+# Both decode to (action type, x, y, tower type, merc direction). Action type is 0 = nothing, 1 = build.
+
+import numpy as np
+# The engine's own list of a team's tiles (backend/MapCache.py), which the training env's maps use too, so a
+# policy's tile indices mean the same tiles in training and in play. Importers put the backend on the path.
+from MapCache import buildable_tiles
+
+ACTION_MODES = ("xy", "tile")
+
+MAX_MAP_WIDTH = 50
+MAX_MAP_HEIGHT = 50
+
+# Number of action types, tower types and merc directions
+NUM_ACTION_TYPES = 2
+NUM_TOWER_TYPES = 5
+NUM_MERC_DIRECTIONS = 5
+
+# (x, y) decoded from a tile index past the end of the map's tile list; never a valid build
+NO_TILE = (-1, -1)
+
+
+def max_buildable_tiles(floor_tiles_of_maps) -> int:
+    """The most tiles either team owns on any of these maps: how many tile indices the action space needs."""
+    return max(
+        len(buildable_tiles(floor_tiles, team_color))
+        for floor_tiles in floor_tiles_of_maps
+        for team_color in ('r', 'b')
+    )
+
+
+def action_space(mode: str, num_tiles: int = None):
+    """The gymnasium action space of a layout. num_tiles is only used by the tile layout."""
+    from gymnasium.spaces import MultiDiscrete
+
+    if mode == "xy":
+        return MultiDiscrete([NUM_ACTION_TYPES, MAX_MAP_WIDTH, MAX_MAP_HEIGHT, NUM_TOWER_TYPES, NUM_MERC_DIRECTIONS])
+    return MultiDiscrete([NUM_ACTION_TYPES, num_tiles, NUM_TOWER_TYPES, NUM_MERC_DIRECTIONS])
+
+
+def layout_of(space) -> str:
+    """The mode of an action space made by action_space(), e.g. a trained model's."""
+    return "tile" if len(space.nvec) == 4 else "xy"
+
+
+def decode(action, mode: str, tiles: tuple = None) -> tuple:
+    """
+    Turn a policy action into (action type, x, y, tower type, merc direction), as plain ints.
+    tiles is the team's buildable_tiles on the current map, for the tile layout.
+    """
+    action = [int(value) for value in np.asarray(action).reshape(-1)]
+    if mode == "xy":
+        return tuple(action)
+    act_type, tile_index, tower_type, merc_dir = action
+    x, y = tiles[tile_index] if tile_index < len(tiles) else NO_TILE
+    return (act_type, x, y, tower_type, merc_dir)
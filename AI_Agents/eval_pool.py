@@ -0,0 +1,227 @@
+# This script evaluates a PPO policy against a pool of fixed opponents, using parallel worker processes.
+# Training hands it a saved snapshot of the current policy and keeps going; the games are played in
+# the background and the win rates are picked up whenever they're ready (see PoolEvalCallback in train_ppo.py).
+#
+# Opponents can be agent scripts (like ExampleAgentRuleBased.py) or frozen PPO checkpoints (.zip files).
+# Games are played in-process against the backend, without the engine's subprocess protocol, so many
+# games fit in the time one evaluation used to take.
+#
+# With several maps, the games are spread over them, and the win rate on each map is reported too
+# (train_ppo.py feeds those back into its map curriculum, see map_curriculum.py).
+#
+# It can also be run on its own to evaluate a checkpoint:
+#   python eval_pool.py training/models/best_model/best_model.zip --map-path map0.json --opponents ExampleAgentRuleBased.py
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add the backend directory to the Python path to import game components.
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from Game import Game
+from AIAction import AIAction
+
+
+# --- Worker process side ---
+
+# Agent scripts and PPO models already loaded by this worker process, so they're loaded once rather than once per game
+_agent_modules = {}
+_models = {}
+# Policy snapshots change every evaluation, so only the most recent models are kept
+MAX_CACHED_MODELS = 4
+
+
+def _load_agent_module(agent_path: str):
+    """Import an agent script as a module (its driver code only runs as __main__)."""
+    agent_path = str(Path(agent_path).resolve())
+    module = _agent_modules.get(agent_path)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(f"eval_pool_agent_{len(_agent_modules)}", agent_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _agent_modules[agent_path] = module
+    return module
+
+
+def _make_agent(agent_spec: str):
+    """Create an agent from a PPO checkpoint (.zip) or an agent script (.py)."""
+    if agent_spec.endswith(".zip"):
+        ppo_agent = _load_agent_module(Path(__file__).resolve().parent / "ppo_agent.py")
+        ppo_agent.DEBUG_LOGGING = False
+        model = _models.get(agent_spec)
+        if model is None:
+            from stable_baselines3 import PPO
+            model = PPO.load(agent_spec, device="cpu")
+            if len(_models) >= MAX_CACHED_MODELS:
+                _models.pop(next(iter(_models)))
+            _models[agent_spec] = model
+        return ppo_agent.Agent(model_path=agent_spec, model=model)
+    return _load_agent_module(agent_spec).Agent()
+
+
+def _get_action(agent, game_state: dict) -> AIAction:
+    """Ask an agent for its action. Like the engine, a crash or a bad action forfeits the turn."""
+    try:
+        return AIAction.from_dict(agent.do_turn(game_state).to_dict())
+    except Exception:
+        return AIAction("nothing", 0, 0)
+
+
+def play_eval_game(policy: str, opponent: str, map_path: str, seed: int, policy_color: str) -> str:
+    """
+    Play one game between the policy and an opponent, in this process.
+    Returns "win", "loss" or "tie" from the policy's point of view.
+    """
+    random.seed(seed)
+
+    # Agents print debug output meant for their own stderr; keep it out of the training console
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return _play_game(policy, opponent, map_path, policy_color)
+
+
+def _play_game(policy: str, opponent: str, map_path: str, policy_color: str) -> str:
+    game = Game(map_path)
+    game.game_state.logging = False
+    agents = {
+        policy_color: _make_agent(policy),
+        ('b' if policy_color == 'r' else 'r'): _make_agent(opponent)
+    }
+    game_state = json.loads(game.game_state_to_json(include_map_analysis=True))
+    for team_color, agent in agents.items():
+        agent.initialize_and_set_name(game_state, team_color)
+
+    while not game.game_state.is_game_over():
+        action_r = _get_action(agents['r'], game_state)
+        action_b = _get_action(agents['b'], game_state)
+        game.run_turn(action_r, action_b)
+        game_state = json.loads(game.game_state_to_json())
+
+    victory = game.game_state.victory
+    if victory == policy_color:
+        return "win"
+    if victory in ('r', 'b'):
+        return "loss"
+    return "tie"
+
+
+# --- Training process side ---
+
+class EvalPool:
+    """
+    Plays a policy against every opponent in the pool, games_per_opponent times (alternating colors),
+    on a pool of worker processes. submit() returns immediately; finished evaluations come out of poll().
+    map_path is a map file, or a list of them to take turns playing on.
+    """
+    def __init__(self, map_path, opponents: list, games_per_opponent: int = 10, max_workers: int = 4, seed: int = 0):
+        self.map_paths = [map_path] if isinstance(map_path, (str, Path)) else list(map_path)
+        self.opponents = list(opponents)
+        self.games_per_opponent = games_per_opponent
+        self.seed = seed
+        # Spawn, not fork: the training process has torch and its threads loaded
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.finished = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def submit(self, policy: str, tag=None):
+        """Start evaluating a saved policy. tag (e.g. the training timestep) is passed back with the results."""
+        total_games = len(self.opponents) * self.games_per_opponent
+        summary = {
+            "Tag": tag,
+            "Policy": policy,
+            "Results": {Path(opponent).stem: {"win": 0, "loss": 0, "tie": 0, "error": 0} for opponent in self.opponents},
+            "MapResults": {str(map_path): {"win": 0, "loss": 0, "tie": 0, "error": 0} for map_path in self.map_paths}
+        }
+        remaining = [total_games]
+        with self.lock:
+            self.pending += 1
+
+        def game_done(opponent_name, map_path, future):
+            try:
+                outcome = future.result()
+            except Exception:
+                outcome = "error"
+            with self.lock:
+                summary["Results"][opponent_name][outcome] += 1
+                summary["MapResults"][map_path][outcome] += 1
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+                self.pending -= 1
+            self.finished.put(self._summarize(summary))
+
+        # Numbered across all the opponents, so each opponent gets its own seeds, and maps keep rotating
+        # from one opponent to the next instead of every opponent starting over on the first map
+        game_number = 0
+        for opponent in self.opponents:
+            for _ in range(self.games_per_opponent):
+                # Both colors on a map before moving to the next one
+                policy_color = 'r' if game_number % 2 == 0 else 'b'
+                map_path = str(self.map_paths[(game_number // 2) % len(self.map_paths)])
+                future = self.executor.submit(play_eval_game, policy, opponent, map_path, self.seed + game_number, policy_color)
+                future.add_done_callback(lambda future, name=Path(opponent).stem, map_path=map_path: game_done(name, map_path, future))
+                game_number += 1
+
+    def busy(self) -> bool:
+        """True while an earlier evaluation is still being played."""
+        with self.lock:
+            return self.pending > 0
+
+    def poll(self) -> list:
+        """Summaries of every evaluation that finished since the last call. Never blocks."""
+        summaries = []
+        while True:
+            try:
+                summaries.append(self.finished.get_nowait())
+            except queue.Empty:
+                return summaries
+
+    def close(self, wait: bool = True):
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _summarize(self, summary: dict) -> dict:
+        win_rates = {opponent_name: _win_rate(counts) for opponent_name, counts in summary["Results"].items()}
+        summary["WinRates"] = win_rates
+        summary["Overall"] = sum(win_rates.values()) / len(win_rates) if win_rates else 0.0
+        # Maps that got no games this time (more maps than games) are left out
+        summary["MapWinRates"] = {
+            map_path: _win_rate(counts) for map_path, counts in summary["MapResults"].items() if sum(counts.values())
+        }
+        return summary
+
+
+def _win_rate(counts: dict) -> float:
+    # Win rate counts a tie as half a win. Games that crashed count as losses.
+    games = sum(counts.values())
+    return (counts["win"] + 0.5 * counts["tie"]) / games if games else 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate a PPO checkpoint (or agent script) against a pool of opponents.")
+    parser.add_argument("policy", help="PPO checkpoint (.zip) or agent script (.py) to evaluate")
+    parser.add_argument("--map-path", type=str, nargs="+", default=["map0.json"], help="Map files in the maps directory (or glob patterns), to spread the games over")
+    parser.add_argument("--opponents", nargs="+", default=[str(Path(__file__).resolve().parent / "ExampleAgentRuleBased.py")], help="Agent scripts and/or PPO checkpoints to play against")
+    parser.add_argument("--games", type=int, default=10, help="Games against each opponent")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    args = parser.parse_args()
+
+    from map_curriculum import resolve_map_paths
+    pool = EvalPool(resolve_map_paths(args.map_path), args.opponents, args.games, args.workers)
+    pool.submit(args.policy)
+    pool.close(wait=True)
+    for summary in pool.poll():
+        for opponent_name, counts in summary["Results"].items():
+            print(f"{opponent_name}: win rate {summary['WinRates'][opponent_name]:.2f} ({counts})")
+        if len(summary["MapResults"]) > 1:
+            for map_path, win_rate in summary["MapWinRates"].items():
+                print(f"{Path(map_path).name}: win rate {win_rate:.2f} ({summary['MapResults'][map_path]})")
@@ -0,0 +1,110 @@
+# This script defines the map curriculum used to train one PPO model on many maps (see train_ppo.py --maps).
+# Every training env draws a map from the curriculum when it resets, and the evaluation win rates on each map
+# feed back into the weights: maps the policy already wins are picked less often, so training time goes to
+# the maps where it's weakest. Every map keeps a minimum weight, so the policy doesn't forget any of them.
+#
+# Maps are parsed once per process and shared through the backend's map cache (MapCache.py), so switching
+# maps on reset only costs setting up a fresh game.
+
+import glob
+import itertools
+import os
+import random
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path to import game components.
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from MapCache import load_map
+
+MAPS_DIR = Path(__file__).resolve().parent.parent / 'maps'
+
+# Curricula made in this process, by id, so that copies of an env share their curriculum (see MapCurriculum.__reduce__).
+# The weights live in this process only: envs stepped in other processes can't use a curriculum.
+_curricula = {}
+_next_id = itertools.count()
+
+
+def resolve_map_paths(names: list) -> list:
+    """
+    Turn map names into absolute paths. A name is a path, a file name in the maps directory (e.g. 'map0.json'),
+    or a glob pattern of either (e.g. 'map*.json').
+    """
+    paths = []
+    for name in names:
+        candidates = [name] if os.path.isabs(name) or os.path.exists(name) else [str(MAPS_DIR / name)]
+        matches = sorted(glob.glob(candidates[0])) if glob.has_magic(candidates[0]) else candidates
+        if not matches:
+            raise FileNotFoundError(f"No map matches {name}")
+        for match in matches:
+            path = os.path.abspath(match)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Map file not found: {name}")
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+class MapCurriculum:
+    """
+    A weighted set of maps to train on. sample() picks a map for the next episode, update() adjusts the weights
+    from per-map win rates: each weight moves towards the policy's loss rate on that map, but never below min_weight.
+    """
+    def __init__(self, map_paths: list, min_weight: float = 0.1, smoothing: float = 0.5, seed: int = None):
+        """
+        map_paths: the maps to train on (see resolve_map_paths).
+        min_weight: lowest weight a map can get, however often the policy wins on it.
+        smoothing: how far each update moves a weight towards its new target (1 replaces it outright).
+        """
+        self.map_paths = [os.path.abspath(path) for path in map_paths]
+        if not self.map_paths:
+            raise ValueError("A map curriculum needs at least one map")
+        self.min_weight = min_weight
+        self.smoothing = smoothing
+        self.rng = random.Random(seed)
+        # Every map starts out equally likely
+        self.weights = {path: 1.0 for path in self.map_paths}
+
+        # Parse every map now: a broken map fails here rather than in the middle of training,
+        # and the envs find them all in the map cache
+        for path in self.map_paths:
+            load_map(path)
+
+        self.id = next(_next_id)
+        self.pid = os.getpid()
+        _curricula[self.id] = self
+
+    def sample(self) -> str:
+        """Pick the map for the next episode."""
+        return self.rng.choices(self.map_paths, weights=[self.weights[path] for path in self.map_paths])[0]
+
+    def update(self, win_rates: dict):
+        """Move the weights towards each map's loss rate. win_rates maps map paths to win rates in [0, 1]; other maps keep their weight."""
+        for path, win_rate in win_rates.items():
+            path = os.path.abspath(path)
+            if path not in self.weights:
+                continue
+            target = max(self.min_weight, 1.0 - win_rate)
+            self.weights[path] += self.smoothing * (target - self.weights[path])
+
+    def probabilities(self) -> dict:
+        """The chance of each map being picked, by map path."""
+        total = sum(self.weights.values())
+        return {path: weight / total for path, weight in self.weights.items()}
+
+    def __reduce__(self):
+        # Vectorized envs are copied by pickling them (supersuit's concat_vec_envs does). Copies made in this
+        # process get this same curriculum, so they all follow its updates. A copy in another process would get
+        # a frozen copy of the weights that the win rates never reach, so unpickling it there is refused.
+        return (_find_curriculum, (self.id, self.pid))
+
+
+def _find_curriculum(curriculum_id: int, pid: int) -> MapCurriculum:
+    curriculum = _curricula.get(curriculum_id) if pid == os.getpid() else None
+    if curriculum is None:
+        raise RuntimeError(
+            "A map curriculum can only be used by envs stepped in the process that made it; "
+            "vectorize the envs with num_cpus=1 when training on several maps"
+        )
+    return curriculum
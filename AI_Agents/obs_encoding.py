@@ -0,0 +1,92 @@
+# This script defines how observations are laid out for the PPO policy. It's shared by the training
+# environment (MegaMinerEnv.py) and the agent that plays with the trained model (ppo_agent.py), so both
+# always give the model the same thing.
+#
+# Both first fill in the 7 map channels at the map's real size (see MegaMinerEnv._get_obs for what each
+# channel holds) and the 10 global features, then encode() packs them in one of two layouts:
+#
+#   "padded"  - the original layout: 'map' is a 50x50x7 float32 tensor, zero-padded around the real map,
+#               and 'vector' the 10 features. About 70 KB per observation. Models trained before the
+#               compact layout existed expect this one.
+#   "compact" - the same information in about 2 KB. The map is cropped to the real map size rounded up
+#               to a multiple of the bucket size, so one observation shape covers every map trained on:
+#                 'tiles'  - uint8 (H, W, 4): terrain, entity type, team (0 neutral, 1 mine, 2 opponent's), tower type
+#                 'values' - float16 (H, W, 3): health, my damage per turn, opponent's damage per turn
+#                 'vector' - float32 (10,): the global features, unchanged (they're tiny)
+
+import numpy as np
+
+MAX_MAP_WIDTH = 50
+MAX_MAP_HEIGHT = 50
+
+OBS_MODES = ("padded", "compact")
+
+# Map channels that hold categories (stored as uint8 in the compact layout), and those that hold quantities (float16)
+CATEGORICAL_CHANNELS = (0, 1, 3, 4)
+CONTINUOUS_CHANNELS = (2, 5, 6)
+# Highest code in each categorical channel: terrain 0-3, entity type 0-4, team 0-2, tower type 0-4
+CATEGORICAL_HIGH = np.array([3, 4, 2, 4], dtype=np.uint8)
+
+NUM_MAP_CHANNELS = 7
+NUM_VECTOR_FEATURES = 10
+
+
+def compact_map_shape(map_sizes, bucket: int = 4) -> tuple:
+    """
+    (height, width) of the compact map for a set of maps, given as (width, height) pairs:
+    the largest of them, rounded up to a multiple of bucket. bucket=1 crops to the exact size.
+    """
+    width = max(size[0] for size in map_sizes)
+    height = max(size[1] for size in map_sizes)
+    if width > MAX_MAP_WIDTH or height > MAX_MAP_HEIGHT:
+        raise ValueError(f"Maps up to {MAX_MAP_WIDTH}x{MAX_MAP_HEIGHT} are supported, got {width}x{height}")
+    height = min(-(-height // bucket) * bucket, MAX_MAP_HEIGHT)
+    width = min(-(-width // bucket) * bucket, MAX_MAP_WIDTH)
+    return (height, width)
+
+
+def observation_space(mode: str, map_shape: tuple = None):
+    """The gymnasium observation space of a layout. map_shape is the compact (height, width), unused when padded."""
+    from gymnasium.spaces import Box, Dict
+
+    vector_space = Box(low=-np.inf, high=np.inf, shape=(NUM_VECTOR_FEATURES,), dtype=np.float32)
+    if mode == "padded":
+        return Dict({
+            'map': Box(low=-np.inf, high=np.inf, shape=(MAX_MAP_HEIGHT, MAX_MAP_WIDTH, NUM_MAP_CHANNELS), dtype=np.float32),
+            'vector': vector_space
+        })
+    height, width = map_shape
+    return Dict({
+        'tiles': Box(low=0, high=np.broadcast_to(CATEGORICAL_HIGH, (height, width, len(CATEGORICAL_CHANNELS))).copy(), dtype=np.uint8),
+        'values': Box(low=-np.inf, high=np.inf, shape=(height, width, len(CONTINUOUS_CHANNELS)), dtype=np.float16),
+        'vector': vector_space
+    })
+
+
+def layout_of(space) -> tuple:
+    """(mode, compact map shape) of an observation space made by observation_space(), e.g. a trained model's."""
+    if 'tiles' in space.spaces:
+        return ("compact", tuple(space['tiles'].shape[:2]))
+    return ("padded", None)
+
+
+def encode(map_view: np.ndarray, vector_features: np.ndarray, mode: str, map_shape: tuple = None) -> dict:
+    """
+    Pack the map channels (float32, (map height, map width, 7), team as 1 / -1 / 0) and the global features
+    into the observation for a layout.
+    """
+    map_h, map_w = map_view.shape[:2]
+    if mode == "padded":
+        obs_map = np.zeros((MAX_MAP_HEIGHT, MAX_MAP_WIDTH, NUM_MAP_CHANNELS), dtype=np.float32)
+        obs_map[:map_h, :map_w, :] = map_view
+        return {'map': obs_map, 'vector': vector_features}
+
+    height, width = map_shape
+    tiles = np.zeros((height, width, len(CATEGORICAL_CHANNELS)), dtype=np.uint8)
+    values = np.zeros((height, width, len(CONTINUOUS_CHANNELS)), dtype=np.float16)
+    categorical = map_view[:, :, CATEGORICAL_CHANNELS]
+    # Opponent's team is -1 in the channels; uint8 has no negatives
+    categorical[:, :, 2][categorical[:, :, 2] < 0] = 2
+    tiles[:map_h, :map_w, :] = categorical
+    values[:map_h, :map_w, :] = map_view[:, :, CONTINUOUS_CHANNELS]
+    return {'tiles': tiles, 'values': values, 'vector': vector_features}
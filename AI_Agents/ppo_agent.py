@@ -12,6 +12,11 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent / 'backend'))
 import Constants
 
+# The observation layout is shared with the training environment, next to this script
+sys.path.append(str(Path(__file__).resolve().parent))
+import obs_encoding
+import action_encoding
+
 class AIAction:
     """
     Represents one turn of actions in the game.
@@ -43,25 +48,21 @@ class AIAction:
         """Serializes the action to a JSON string, which is sent to the game engine."""
         return json.dumps(self.to_dict())
 
-def _convert_state_to_obs(game_state: dict, team_color: str) -> np.ndarray:
+def _convert_state_to_obs(game_state: dict, team_color: str, obs_mode: str = "padded", obs_map_shape: tuple = None) -> dict:
     """
-    Converts the JSON game state into the same flattened observation
-    that the training environment's _get_obs() produces, after a
-    FlattenObservation wrapper (map + vector concatenated).
+    Converts the JSON game state into the same observation that the
+    training environment's _get_obs() produces, in the model's layout
+    (see obs_encoding.py).
     """
 
     # Map size from JSON
     map_w = len(game_state['FloorTiles'][0])
     map_h = len(game_state['FloorTiles'])
 
-    MAX_MAP_WIDTH = 50
-    MAX_MAP_HEIGHT = 50
-
     is_red_agent = (team_color == "r")
 
-    # --- Map tensor (H, W, 7) ---
-    obs_map = np.zeros((MAX_MAP_HEIGHT, MAX_MAP_WIDTH, 7), dtype=np.float32)
-    map_view = obs_map[:map_h, :map_w, :]
+    # --- Map tensor (H, W, 7), at the map's real size ---
+    map_view = np.zeros((map_h, map_w, obs_encoding.NUM_MAP_CHANNELS), dtype=np.float32)
 
     # =========
     # Channel 0: Terrain (path / my territory / opp territory)
@@ -222,31 +223,59 @@ def _convert_state_to_obs(game_state: dict, team_color: str) -> np.ndarray:
     vector_features[4] /= (Constants.MAX_TURNS or 1.0)
     vector_features[5:10] /= 100.0  # tower costs
 
-    return {
-            'map': obs_map,
-            'vector': vector_features
-        }
+    return obs_encoding.encode(map_view, vector_features, obs_mode, obs_map_shape)
 
 # Create a debug log file
 DEBUG_LOG = Path(__file__).resolve().parent / "agent_debug.log"
+# Set to False to skip the debug log, e.g. when many games are played in one process (see eval_pool.py)
+DEBUG_LOGGING = True
 
 def debug_log(msg):
     """Write debug messages to a file instead of stderr."""
+    if not DEBUG_LOGGING:
+        return
     with open(DEBUG_LOG, "a") as f:
         f.write(f"{msg}\n")
 
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent.parent / "training" / "models" / "best_model" / "best_model.zip"
+
+def load_model(model_path):
+    """
+    Load a PPO checkpoint, at most once per process. When this agent runs in an AgentZygote,
+    warm_up() loads it before any match is forked, so matches start without loading anything.
+    """
+    from stable_baselines3 import PPO
+    from AgentZygote import preloaded
+    return preloaded(("ppo_model", str(model_path)), lambda: PPO.load(model_path))
+
+def warm_up():
+    """Called once by AgentZygote (see backend/AgentZygote.py) before it starts forking matches."""
+    load_model(DEFAULT_MODEL_PATH)
+
 class Agent:
+    def __init__(self, model_path=None, model=None):
+        """
+        model_path: PPO checkpoint to play with (defaults to the best model from training).
+        model: an already loaded PPO model, used instead of loading one (see eval_pool.py).
+        """
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        self.model = model
+        # This team's tiles on the map, for models that pick a tile rather than x and y (see action_encoding.py)
+        self.build_tiles = None
+
     def initialize_and_set_name(self, initial_game_state: dict, team_color: str) -> str:
         debug_log("=== Agent Initialization ===")
         debug_log(f"Team color: {team_color}")
         
         self.team_color = team_color
-        from stable_baselines3 import PPO
+        self.build_tiles = action_encoding.buildable_tiles(initial_game_state['FloorTiles'], team_color)
+        if self.model is not None:
+            return "Big Hero 4"
         
-        model_path = Path(__file__).resolve().parent.parent / "training" / "models"  / "best_model" / "best_model.zip"
+        model_path = self.model_path
         debug_log(f"Loading model from: {model_path}")
         try:
-            self.model = PPO.load(model_path)
+            self.model = load_model(model_path)
             debug_log("Model loaded successfully.")
         except Exception as e:
             debug_log(f"ERROR: Failed to load PPO model: {e}")
@@ -257,7 +286,7 @@ class Agent:
     def do_turn(self, game_state: dict) -> AIAction:
         debug_log("=== Turn Start ===")
         
-        observation = _convert_state_to_obs(game_state, self.team_color)
+        observation = _convert_state_to_obs(game_state, self.team_color, *obs_encoding.layout_of(self.model.observation_space))
         #debug_log(f"Observation shape: {observation.shape}")
         
         #observation = observation.reshape(1, -1)
@@ -274,10 +303,15 @@ class Agent:
         tower_type_map = {0: "crossbow", 1: "cannon", 2: "minigun", 3: "house", 4: "church"}
         merc_dir_map = {0: "", 1: "N", 2: "S", 3: "E", 4: "W"}
 
-        act_type, x, y, tower_type, merc_dir = action_vector
+        act_type, x, y, tower_type, merc_dir = action_encoding.decode(
+            action_vector, action_encoding.layout_of(self.model.action_space), self.build_tiles
+        )
 
         if act_type == 1:
             merc_dir = 0
+        if (x, y) == action_encoding.NO_TILE:
+            # A tile index past this map's tiles: not a build the engine could accept
+            act_type, x, y = 0, 0, 0
         ai_action = AIAction(
             action=action_type_map[act_type],
             x=int(x),
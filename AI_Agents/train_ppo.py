@@ -3,13 +3,14 @@
 # The script can be run from the command line with various arguments to control the training process.
 
 import os
+import shutil
 import time
 import torch
 import argparse
 from pathlib import Path
 import supersuit as ss
 from stable_baselines3 import PPO
-from stable_baselines3.common.callbacks import BaseCallback, EvalCallback, CallbackList
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList
 from stable_baselines3.common.vec_env import VecMonitor
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 
@@ -21,10 +22,14 @@ from gymnasium import spaces
 # This is necessary to ensure that the MegaMinerEnv can be imported correctly.
 try:
     import MegaMinerEnv
+    import eval_pool
+    import map_curriculum
 except ImportError:
     import sys
     sys.path.append(str(Path(__file__).resolve().parent.parent))
     from AI_Agents import MegaMinerEnv
+    from AI_Agents import eval_pool
+    from AI_Agents import map_curriculum
 
 
 class DictCNNFeatureExtractor(BaseFeaturesExtractor):
@@ -117,6 +122,75 @@ class TimeLimitCallback(BaseCallback):
             return False
         return True
 
+class PoolEvalCallback(BaseCallback):
+    """
+    A callback that periodically evaluates the model against a pool of fixed opponents, without pausing training.
+    A snapshot of the model is handed to an EvalPool (see eval_pool.py), which plays the games in worker processes.
+    Results are logged (eval_pool/win_rate/...) whenever they come in, and the best snapshot so far is kept as the best model.
+    When training on a map curriculum, the win rate on each map updates the curriculum's weights.
+    """
+    def __init__(self, pool: eval_pool.EvalPool, eval_freq: int, snapshot_dir: str, best_model_save_path: str, curriculum: map_curriculum.MapCurriculum = None, verbose: int = 0):
+        """
+        Initializes the callback.
+        :param pool: The EvalPool that plays the evaluation games.
+        :param eval_freq: Start an evaluation every eval_freq calls, unless the previous one is still running.
+        :param snapshot_dir: Where model snapshots are saved for the workers to load.
+        :param best_model_save_path: Directory to save the best model in (as best_model.zip).
+        :param curriculum: The map curriculum the training envs draw their maps from, if any.
+        :param verbose: The verbosity level.
+        """
+        super(PoolEvalCallback, self).__init__(verbose)
+        self.pool = pool
+        self.eval_freq = eval_freq
+        self.snapshot_dir = snapshot_dir
+        self.best_model_save_path = best_model_save_path
+        self.curriculum = curriculum
+        self.best_win_rate = -1.0
+
+    def _init_callback(self) -> None:
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        os.makedirs(self.best_model_save_path, exist_ok=True)
+
+    def _on_step(self) -> bool:
+        """
+        Report any finished evaluations, and start a new one every eval_freq calls.
+        Evaluations never overlap, so a slow evaluation just means fewer of them.
+        :return: (bool) Always True; evaluation never stops training.
+        """
+        self._report_results()
+        if self.n_calls % self.eval_freq == 0 and not self.pool.busy():
+            snapshot_path = os.path.join(self.snapshot_dir, f"policy_{self.num_timesteps}.zip")
+            self.model.save(snapshot_path)
+            self.pool.submit(snapshot_path, tag=self.num_timesteps)
+        return True
+
+    def _on_training_end(self) -> None:
+        """Wait for the last evaluation, so its result still counts towards the best model."""
+        self.pool.close(wait=True)
+        self._report_results()
+
+    def _report_results(self):
+        for summary in self.pool.poll():
+            for opponent_name, win_rate in summary["WinRates"].items():
+                self.logger.record(f"eval_pool/win_rate/{opponent_name}", win_rate)
+            self.logger.record("eval_pool/win_rate", summary["Overall"])
+            if self.curriculum is not None:
+                self.curriculum.update(summary["MapWinRates"])
+                for map_path, win_rate in summary["MapWinRates"].items():
+                    self.logger.record(f"eval_pool/map_win_rate/{Path(map_path).stem}", win_rate)
+                for map_path, probability in self.curriculum.probabilities().items():
+                    self.logger.record(f"curriculum/probability/{Path(map_path).stem}", probability)
+            if self.verbose > 0:
+                rates = ", ".join(f"{name}: {rate:.2f}" for name, rate in summary["WinRates"].items())
+                print(f"Eval at {summary['Tag']} timesteps: win rate {summary['Overall']:.2f} ({rates})")
+
+            if summary["Overall"] > self.best_win_rate:
+                self.best_win_rate = summary["Overall"]
+                shutil.copyfile(summary["Policy"], os.path.join(self.best_model_save_path, "best_model.zip"))
+                if self.verbose > 0:
+                    print("New best model.")
+            os.remove(summary["Policy"])
+
 def main(args):
     """
     Main function to set up and run the PPO training.
@@ -142,8 +216,18 @@ def main(args):
 
     # --- 2. Setup Environment ---
     # Create the MegaMiner environment. The map file can be specified as a command-line argument.
-    map_file = str(Path(__file__).resolve().parent.parent / 'maps' / args.map_path)
-    env = MegaMinerEnv.env(map_path=map_file)
+    # With several maps (--maps), every env draws a map from the curriculum each time it resets.
+    map_files = map_curriculum.resolve_map_paths(args.maps or [args.map_path])
+    curriculum = map_curriculum.MapCurriculum(map_files, seed=args.seed) if len(map_files) > 1 else None
+    # --action-mode tile picks one of the team's own tiles instead of x and y (see action_encoding.py).
+    # --obs-mode compact crops the observation to the maps' size and packs it in small dtypes (see obs_encoding.py).
+    env = MegaMinerEnv.env(
+        map_path=map_files[0] if curriculum is None else None,
+        curriculum=curriculum,
+        obs_mode=args.obs_mode,
+        obs_bucket=args.obs_bucket,
+        action_mode=args.action_mode
+    )
     # Convert the AEC (Agent-Environment-Cycle) environment to a parallel environment.
     # This is required for compatibility with Stable Baselines3.
     env = aec_to_parallel(env)
@@ -151,8 +235,10 @@ def main(args):
     # --- 3. Wrap Environment for SB3 ---
     # Wrap the PettingZoo environment to be compatible with Stable Baselines3.
     # This involves vectorizing the environment and concatenating multiple environments if needed.
+    # The copies are stepped one after another in this process (num_cpus=1), so they all share the curriculum and
+    # follow its updates. The curriculum refuses to be copied into other processes, so keep num_cpus at 1 with --maps.
     env = ss.pettingzoo_env_to_vec_env_v1(env)
-    env = ss.concat_vec_envs_v1(env, num_vec_envs=1, num_cpus=1, base_class="stable_baselines3")
+    env = ss.concat_vec_envs_v1(env, num_vec_envs=args.num_envs, num_cpus=1, base_class="stable_baselines3")
     
     # --- 4. Setup PPO Model ---
     # Define the directories for saving logs and models.
@@ -201,19 +287,20 @@ def main(args):
     max_training_time_seconds = args.train_minutes * 60
     time_callback = TimeLimitCallback(max_time=max_training_time_seconds, verbose=1)
 
-    # Evaluation callback to evaluate the model periodically and save the best one.
-    eval_env = MegaMinerEnv.env(map_path=map_file)
-    eval_env = aec_to_parallel(eval_env)
-    eval_env = ss.pettingzoo_env_to_vec_env_v1(eval_env)
-    eval_env = ss.concat_vec_envs_v1(eval_env, num_vec_envs=1, num_cpus=4, base_class="stable_baselines3")
-
-    eval_callback = EvalCallback(
-        eval_env,
-        best_model_save_path=os.path.join(model_dir, "best_model"),
-        log_path=f"{log_dir}/eval",
+    # Evaluation callback to play the model against a pool of fixed opponents and save the best one.
+    # The games run in separate worker processes, so training carries on while they're played.
+    opponents = [
+        opponent if os.path.isabs(opponent) or os.path.exists(opponent) else str(Path(__file__).resolve().parent / opponent)
+        for opponent in args.eval_opponents
+    ]
+    pool = eval_pool.EvalPool(map_files, opponents, games_per_opponent=args.eval_games, max_workers=args.eval_workers)
+    eval_callback = PoolEvalCallback(
+        pool,
         eval_freq=10000,
-        deterministic=True,
-        render=False
+        snapshot_dir=os.path.join(model_dir, "eval_snapshots"),
+        best_model_save_path=os.path.join(model_dir, "best_model"),
+        curriculum=curriculum,
+        verbose=1
     )
     
     # Combine the callbacks into a single list.
@@ -239,6 +326,15 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--enable-logging", action="store_true", help="Enable game engine logging during training.")
     parser.add_argument("--map-path", type=str, default="map0.json", help="Specify the map file to use for training (e.g., 'map0.json').")
+    parser.add_argument("--maps", nargs="+", help="Train on several maps instead (file names or glob patterns, e.g. 'map*.json'), picked by a curriculum that favors the maps the model loses on.")
+    parser.add_argument("--num-envs", type=int, default=1, help="Number of environment copies, stepped one after another in this process and batched together for PPO; with --maps, each plays its own map.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the curriculum's map choices.")
+    parser.add_argument("--obs-mode", choices=["padded", "compact"], default="padded", help="Observation layout: 'padded' (50x50 float32, what older models use) or 'compact' (cropped, uint8/float16, ~30x smaller).")
+    parser.add_argument("--action-mode", choices=["xy", "tile"], default="xy", help="Action layout: 'xy' (x and y over 50x50, what older models use) or 'tile' (an index into the team's own tiles).")
+    parser.add_argument("--obs-bucket", type=int, default=4, help="With --obs-mode compact, round the cropped map size up to a multiple of this, so similar maps share a shape.")
     parser.add_argument("--train-minutes", type=int, default=20, help="Specify the number of minutes to train the PPO agent.")
+    parser.add_argument("--eval-opponents", nargs="+", default=["ExampleAgentRuleBased.py"], help="Agent scripts and/or frozen PPO checkpoints (.zip) to evaluate against.")
+    parser.add_argument("--eval-games", type=int, default=10, help="Number of evaluation games against each opponent.")
+    parser.add_argument("--eval-workers", type=int, default=4, help="Number of worker processes playing evaluation games.")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -0,0 +1,411 @@
+import collections
+import os
+import queue
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from ResourceMonitor import ResourceLimits, ResourceMonitor
+from Utils import log_msg
+
+# Connections from the engine to AI agents.
+# Whether an agent is a child process or a server on another machine, the engine talks to it the same way:
+#   send()       - write one protocol message (handshake, or game state + "--END OF TURN--")
+#   read_line()  - read the agent's next line of output (team name or action JSON)
+#   error_output - the last of what the agent wrote to stderr, for crash reports
+#   close()      - end the agent's part in the match
+#   monitor      - the agent's ResourceMonitor: what it has cost so far, and its limits
+# main.initialize_agent also sets options: the game state options the agent asked for in its handshake.
+
+
+# Environment for agent processes: the backend directory goes on their import path,
+# so agents can use engine modules such as ForwardModel and AIAction directly
+def agent_environment() -> dict:
+    environment = dict(os.environ)
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    python_path = environment.get('PYTHONPATH')
+    environment['PYTHONPATH'] = backend_dir if not python_path else backend_dir + os.pathsep + python_path
+    return environment
+
+
+# The last lines an agent wrote to stderr. A background thread reads the pipe as fast as the agent writes,
+# so an agent that logs a lot never fills the pipe and blocks (which would leave the engine waiting on it forever).
+# Only the tail is kept: at most max_lines lines of at most MAX_LINE_LENGTH characters.
+class StderrTail:
+    MAX_LINE_LENGTH = 4096
+
+    def __init__(self, stream, max_lines: int = 200):
+        self.lines = collections.deque(maxlen=max_lines)
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._drain, args=(stream,), daemon=True)
+        self.thread.start()
+
+    def _drain(self, stream):
+        try:
+            for line in iter(lambda: stream.readline(self.MAX_LINE_LENGTH), ''):
+                with self.lock:
+                    self.lines.append(line)
+        except (OSError, ValueError):
+            # The pipe was closed under us
+            pass
+
+    # wait: seconds to give the thread to read what's still in the pipe (once the agent has exited)
+    def text(self, wait: float = 0) -> str:
+        if wait > 0:
+            self.thread.join(wait)
+        with self.lock:
+            return ''.join(self.lines)
+
+
+# Agent running as a child process of the engine, talking over stdin/stdout pipes
+class LocalAgent:
+    def __init__(self, agent_file: str, limits: ResourceLimits = None):
+        self.process = subprocess.Popen(
+            [sys.executable, agent_file],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=agent_environment()
+        )
+        self.stderr_tail = StderrTail(self.process.stderr)
+        self.monitor = ResourceMonitor(self.process.pid, limits)
+        self.monitor.limits.apply_to_process(self.process.pid)
+
+        # stdin and stdout are pumped by threads too, so that reads can time out, and an agent that has
+        # fallen behind (and stopped reading its input) can't hold up the engine when the pipe fills
+        self.stdin_messages = queue.Queue()
+        self.stdout_lines = queue.Queue()
+        # Lines the agent still owes us for reads that timed out. They are skipped when they arrive.
+        self.stale_lines = 0
+        threading.Thread(target=self._pump_stdin, daemon=True).start()
+        threading.Thread(target=self._pump_stdout, daemon=True).start()
+
+    def send(self, message: str):
+        self.monitor.message_sent(message)
+        self.stdin_messages.put(message)
+
+    # Returns an empty string if the agent process ended. Raises TimeoutError if no line arrives in time.
+    def read_line(self, timeout: float = None) -> str:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                line = self.stdout_lines.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.stale_lines += 1
+                raise TimeoutError('timed out waiting for agent')
+            if not line:
+                # Leave the end of output there for any later reads
+                self.stdout_lines.put(line)
+                return ''
+            self.monitor.line_received(line)
+            if self.stale_lines > 0:
+                # Late answer to an earlier turn
+                self.stale_lines -= 1
+                continue
+            return line
+
+    def _pump_stdin(self):
+        while True:
+            message = self.stdin_messages.get()
+            if message is None:
+                return
+            try:
+                self.process.stdin.write(message)
+                self.process.stdin.flush()
+            except (OSError, ValueError):
+                # The agent has exited; reads will return '' from now on
+                return
+
+    def _pump_stdout(self):
+        try:
+            for line in self.process.stdout:
+                self.stdout_lines.put(line)
+        except (OSError, ValueError):
+            pass
+        self.stdout_lines.put('')
+
+    # Never blocks for long: if the agent has exited, its last output is read first
+    def error_output(self) -> str:
+        return self.stderr_tail.text(wait=1.0 if self.process.poll() is not None else 0)
+
+    def close(self):
+        self.stdin_messages.put(None)
+        self.process.terminate()
+        self.process.wait()
+
+
+# Line-buffered reader on top of a socket, with a deadline for each line
+class _SocketLines:
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.buffer = b''
+
+    # Raise TimeoutError if no full line arrives before the deadline, ConnectionError if the peer hung up
+    def readline(self, deadline: float = None) -> str:
+        while b'\n' not in self.buffer:
+            if deadline is None:
+                self.connection.settimeout(None)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('timed out waiting for agent')
+                self.connection.settimeout(remaining)
+            try:
+                chunk = self.connection.recv(65536)
+            except socket.timeout:
+                raise TimeoutError('timed out waiting for agent')
+            if not chunk:
+                raise ConnectionError('connection closed')
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode()
+
+    def send(self, text: str):
+        self.connection.settimeout(None)
+        self.connection.sendall(text.encode())
+
+
+# Open connections to agent servers that finished a match, so the next match against the same server skips the TCP setup
+_idle_connections = {}
+
+# Where RemoteAgent finds the AgentServer's shared secret when it isn't given one, so it reaches the engines
+# that Tournament.py workers start in their own processes
+AGENT_KEY_VARIABLE = 'MEGAMINER_AGENT_KEY'
+
+
+# A new connection starts with the server's key: "--AUTH <key>--", answered with "--AUTH OK--" or "--AUTH FAILED--"
+def _open_connection(address: tuple, connect_timeout: float, key: str) -> _SocketLines:
+    idle = _idle_connections.get(address)
+    if idle:
+        return idle.pop()
+    connection = socket.create_connection(address, timeout=connect_timeout)
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    lines = _SocketLines(connection)
+    try:
+        lines.send(f'--AUTH {key}--\n')
+        reply = lines.readline(time.monotonic() + connect_timeout)
+    except OSError:
+        connection.close()
+        raise
+    if reply != '--AUTH OK--':
+        connection.close()
+        raise ConnectionRefusedError(f'Agent server at {address[0]}:{address[1]} refused the agent key (--agent_key or {AGENT_KEY_VARIABLE})')
+    return lines
+
+
+def close_idle_connections():
+    for connections in _idle_connections.values():
+        for lines in connections:
+            lines.connection.close()
+    _idle_connections.clear()
+
+
+# "host:port" -> ("host", port)
+def parse_agent_address(address: str) -> tuple:
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'Agent address must look like HOST:PORT, got "{address}"')
+    return (host, int(port))
+
+
+# Agents kept warm by an AgentZygote (see AgentZygote.py) are addressed as "zygote:<unix socket path>"
+ZYGOTE_PREFIX = 'zygote:'
+
+
+# Raise ValueError unless the address is either HOST:PORT or zygote:<socket path> of an existing socket
+def check_agent_address(address: str):
+    if address.startswith(ZYGOTE_PREFIX):
+        if not os.path.exists(address[len(ZYGOTE_PREFIX):]):
+            raise ValueError(f'Agent zygote socket not found: {address[len(ZYGOTE_PREFIX):]}')
+    else:
+        parse_agent_address(address)
+
+
+# Connect to an agent that isn't started from a file: an AgentServer or an AgentZygote
+# key: the AgentServer's shared secret, for HOST:PORT addresses (by default, from MEGAMINER_AGENT_KEY)
+def connect_agent(address: str, limits: ResourceLimits = None, key: str = None):
+    if address.startswith(ZYGOTE_PREFIX):
+        return ZygoteAgent(address[len(ZYGOTE_PREFIX):], limits=limits)
+    return RemoteAgent(address, limits=limits, key=key)
+
+
+# Agent forked by an AgentZygote on this machine, with the agent's modules (and maybe its model) already loaded.
+# The connection is the agent's stdin and stdout; the zygote first tells us the agent's pid, so it can be
+# monitored and limited like a LocalAgent.
+class ZygoteAgent:
+    def __init__(self, socket_path: str, connect_timeout: float = 5.0, limits: ResourceLimits = None):
+        self.socket_path = socket_path
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.settimeout(connect_timeout)
+            connection.connect(socket_path)
+            self.lines = _SocketLines(connection)
+            greeting = self.lines.readline(time.monotonic() + connect_timeout)
+        except OSError:
+            connection.close()
+            raise
+        if not (greeting.startswith('--AGENT PID ') and greeting.endswith('--')):
+            connection.close()
+            raise ConnectionError(f'Unexpected greeting from agent zygote at {socket_path}: {greeting}')
+        self.pid = int(greeting[len('--AGENT PID '):-2])
+        self.monitor = ResourceMonitor(self.pid, limits)
+        self.monitor.limits.apply_to_process(self.pid)
+        # Lines the agent still owes us for reads that timed out. They are skipped when they arrive.
+        self.stale_lines = 0
+        self.exited = False
+
+    def send(self, message: str):
+        self.monitor.message_sent(message)
+        try:
+            self.lines.send(message)
+        except OSError:
+            # The agent has exited; reads will return '' from now on
+            self.exited = True
+
+    # Returns an empty string if the agent process ended, like LocalAgent
+    def read_line(self, timeout: float = None) -> str:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.exited:
+            try:
+                line = self.lines.readline(deadline)
+            except TimeoutError:
+                self.stale_lines += 1
+                raise
+            except OSError:
+                self.exited = True
+                break
+            self.monitor.line_received(line)
+            if self.stale_lines > 0:
+                # Late answer to an earlier turn
+                self.stale_lines -= 1
+                continue
+            return line
+        return ''
+
+    def error_output(self) -> str:
+        # The agent's stderr goes to the zygote's stderr
+        return ''
+
+    def close(self):
+        # Closing the connection ends the agent's input, but one that's busy thinking may not notice for a while
+        self.lines.connection.close()
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+
+# Agent hosted by an AgentServer (see AgentServer.py), possibly on another machine.
+# The server starts a fresh agent process for every match, but the TCP connection is kept and
+# reused for the next match. If the connection drops mid-match, we reconnect and resume the same
+# agent process; messages and replies lost in transit are re-sent by whichever side still has them.
+class RemoteAgent:
+    def __init__(self, address: str, connect_timeout: float = 5.0, reconnect_attempts: int = 3, limits: ResourceLimits = None, key: str = None):
+        self.address = parse_agent_address(address)
+        self.key = key if key is not None else os.environ.get(AGENT_KEY_VARIABLE, '')
+        # Only the think budget applies to an agent on another machine
+        self.monitor = ResourceMonitor(None, limits)
+        self.connect_timeout = connect_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.match_id = uuid.uuid4().hex
+
+        # Bookkeeping for resuming after a reconnect
+        self.messages_sent = 0
+        self.last_message = ''
+        self.lines_received = 0
+        # Lines the agent still owes us for reads that timed out. They are skipped when they arrive.
+        self.stale_lines = 0
+
+        self.exited = False
+        self.lines = None
+        for attempt in range(2):
+            lines = _open_connection(self.address, connect_timeout, self.key)
+            try:
+                lines.send(f'--NEW MATCH {self.match_id}--\n')
+                self._expect_ready(lines, time.monotonic() + connect_timeout)
+                self.lines = lines
+                break
+            except (OSError, ValueError):
+                # A pooled connection may have gone stale between matches; try once more with a new one
+                lines.connection.close()
+                if attempt == 1:
+                    raise
+
+    def send(self, message: str):
+        self.monitor.message_sent(message)
+        self.last_message = message
+        self.messages_sent += 1
+        try:
+            self.lines.send(message)
+        except OSError as e:
+            log_msg(f'Lost connection to agent at {self.address[0]}:{self.address[1]} while sending ({e}), reconnecting')
+            # Resuming re-sends the message if the server didn't get all of it
+            self._reconnect()
+
+    # Returns an empty string if the agent process ended, like LocalAgent
+    def read_line(self, timeout: float = None) -> str:
+        if self.exited:
+            return ''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                line = self.lines.readline(deadline)
+            except TimeoutError:
+                self.stale_lines += 1
+                raise
+            except OSError as e:
+                log_msg(f'Lost connection to agent at {self.address[0]}:{self.address[1]} ({e}), reconnecting')
+                self._reconnect()
+                continue
+            self.lines_received += 1
+            if line == '--AGENT EXITED--':
+                self.exited = True
+                return ''
+            self.monitor.line_received(line)
+            if self.stale_lines > 0:
+                # Late answer to an earlier turn
+                self.stale_lines -= 1
+                continue
+            return line
+
+    def error_output(self) -> str:
+        # The agent's stderr stays on the machine running it
+        return ''
+
+    def close(self):
+        try:
+            self.lines.send('--END MATCH--\n')
+            _idle_connections.setdefault(self.address, []).append(self.lines)
+        except OSError:
+            self.lines.connection.close()
+
+    # Wait for "--MATCH READY <messages received>--" and return the number. Raise ValueError if the server doesn't know the match.
+    def _expect_ready(self, lines: _SocketLines, deadline: float) -> int:
+        while True:
+            reply = lines.readline(deadline)
+            if reply.startswith('--MATCH READY ') and reply.endswith('--'):
+                return int(reply[len('--MATCH READY '):-2])
+            if reply == '--UNKNOWN MATCH--':
+                raise ValueError(f'Agent server does not know match {self.match_id}')
+            # Anything else is late output from the previous match on a reused connection
+
+    def _reconnect(self):
+        self.lines.connection.close()
+        for attempt in range(self.reconnect_attempts):
+            try:
+                lines = _open_connection(self.address, self.connect_timeout, self.key)
+                lines.send(f'--RESUME MATCH {self.match_id} {self.lines_received}--\n')
+                messages_received = self._expect_ready(lines, time.monotonic() + self.connect_timeout)
+                if messages_received < self.messages_sent:
+                    lines.send(self.last_message)
+                self.lines = lines
+                return
+            except (OSError, ValueError) as e:
+                log_msg(f'Reconnect attempt {attempt + 1} to {self.address[0]}:{self.address[1]} failed: {e}')
+                time.sleep(min(2 ** attempt * 0.1, 2.0))
+        raise ConnectionError(f'Could not reconnect to agent at {self.address[0]}:{self.address[1]}')
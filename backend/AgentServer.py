@@ -0,0 +1,225 @@
+import argparse
+import hmac
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from AgentConnection import AGENT_KEY_VARIABLE, agent_environment
+
+# Hosts an AI agent so that engines on other machines can play against it (see RemoteAgent in AgentConnection.py).
+# Example: python AgentServer.py ../AI_Agents/ppo_agent.py --port 5000 --key <secret>
+#          python main.py <map_json_file> -r1 <host>:5000 -a2 <agent> --agent_key <secret>
+#
+# A connection can start agent processes on this machine, so the server only listens on this machine unless
+# --host says otherwise, and every connection must first send the shared key. Without --key (or MEGAMINER_AGENT_KEY)
+# the server makes up a random one and prints it.
+#
+# Engines connect over TCP and may play any number of matches on one connection:
+#   engine: --AUTH <key>--                            first line; the server replies --AUTH OK--, or --AUTH FAILED--
+#                                                     and hangs up
+#   engine: --NEW MATCH <id>--                        server starts a fresh agent process, replies --MATCH READY 0--
+#   engine: <normal agent protocol messages>          forwarded to the agent's stdin, one complete message at a time
+#   server: <agent output lines>                      forwarded from the agent's stdout
+#   engine: --END MATCH--                             server stops the agent process, connection stays open
+#   engine: --RESUME MATCH <id> <lines received>--    after a dropped connection: reattach to a running match.
+#                                                     Replies --MATCH READY <messages received>--, then re-sends
+#                                                     any agent output the engine hasn't seen.
+#   server: --AGENT EXITED--                          the agent process ended; it won't send anything else
+
+# Lines that end a protocol message from the engine
+MESSAGE_TERMINATORS = ('--END INITIAL GAME STATE--', '--END OF TURN--')
+# Sent in place of agent output once the agent process has exited
+AGENT_EXITED = '--AGENT EXITED--'
+
+
+# One match: an agent process, plus whichever engine connection is currently attached to it
+class AgentMatch:
+    def __init__(self, agent_file: str):
+        self.process = subprocess.Popen(
+            [sys.executable, agent_file],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=agent_environment()
+        )
+        self.lock = threading.Lock()
+        self.connection = None
+        # Everything the agent printed this match, so it can be re-sent after a reconnect
+        self.output_lines = []
+        self.messages_received = 0
+        self.partial_message = []
+        self.detached_since = None
+        threading.Thread(target=self._pump_output, daemon=True).start()
+
+    def attach(self, connection: socket.socket, lines_already_received: int):
+        with self.lock:
+            self.connection = connection
+            self.detached_since = None
+            # A message cut off by the disconnect gets re-sent by the engine in full
+            self.partial_message = []
+            data = f'--MATCH READY {self.messages_received}--\n'
+            data += ''.join(line + '\n' for line in self.output_lines[lines_already_received:])
+            connection.sendall(data.encode())
+
+    def detach(self, connection: socket.socket):
+        with self.lock:
+            # The engine may already have resumed on a newer connection
+            if self.connection is connection:
+                self.connection = None
+                self.detached_since = time.monotonic()
+
+    # Forward engine input to the agent, but only whole messages
+    def receive_line(self, line: str):
+        self.partial_message.append(line)
+        if line in MESSAGE_TERMINATORS:
+            try:
+                self.process.stdin.write(''.join(part + '\n' for part in self.partial_message))
+                self.process.stdin.flush()
+            except OSError:
+                # The agent died; the engine finds out from AGENT_EXITED
+                pass
+            self.partial_message = []
+            self.messages_received += 1
+
+    def close(self):
+        # Detach first, so the engine doesn't receive this agent's exit on a connection it reuses for the next match
+        with self.lock:
+            self.connection = None
+        self.process.terminate()
+        self.process.wait()
+
+    def _pump_output(self):
+        for line in self.process.stdout:
+            self._forward(line.rstrip('\n'))
+        self._forward(AGENT_EXITED)
+
+    def _forward(self, line: str):
+        with self.lock:
+            self.output_lines.append(line)
+            if self.connection is not None:
+                try:
+                    self.connection.sendall((line + '\n').encode())
+                except OSError:
+                    self.connection = None
+                    self.detached_since = time.monotonic()
+
+
+class AgentServer:
+    def __init__(self, agent_file: str, host: str, port: int, resume_grace: float, key: str):
+        self.agent_file = agent_file
+        self.key = key.encode()
+        self.resume_grace = resume_grace
+        # match id -> AgentMatch, for every match that hasn't ended
+        self.matches = {}
+        self.matches_lock = threading.Lock()
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+
+    def serve_forever(self):
+        threading.Thread(target=self._reap_abandoned_matches, daemon=True).start()
+        while True:
+            connection, _ = self.listener.accept()
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle_connection, args=(connection,), daemon=True).start()
+
+    def _handle_connection(self, connection: socket.socket):
+        match_id = None
+        match = None
+        authenticated = False
+        try:
+            for line in connection.makefile('r', encoding='utf-8'):
+                line = line.rstrip('\n')
+
+                if not authenticated:
+                    key = line[len('--AUTH '):-2] if line.startswith('--AUTH ') and line.endswith('--') else ''
+                    if not hmac.compare_digest(key.encode(), self.key):
+                        connection.sendall(b'--AUTH FAILED--\n')
+                        break
+                    authenticated = True
+                    connection.sendall(b'--AUTH OK--\n')
+
+                elif line.startswith('--NEW MATCH ') and line.endswith('--'):
+                    self._end_match(match_id)
+                    match_id = line[len('--NEW MATCH '):-2]
+                    match = AgentMatch(self.agent_file)
+                    with self.matches_lock:
+                        self.matches[match_id] = match
+                    match.attach(connection, 0)
+
+                elif line.startswith('--RESUME MATCH ') and line.endswith('--'):
+                    match_id, lines_received = line[len('--RESUME MATCH '):-2].split()
+                    with self.matches_lock:
+                        match = self.matches.get(match_id)
+                    if match is None:
+                        connection.sendall(b'--UNKNOWN MATCH--\n')
+                        match_id = None
+                    else:
+                        match.attach(connection, int(lines_received))
+
+                elif line == '--END MATCH--':
+                    self._end_match(match_id)
+                    match_id = None
+                    match = None
+
+                elif match is not None:
+                    match.receive_line(line)
+        except OSError:
+            pass
+        finally:
+            # Keep the agent running for a while in case the engine reconnects
+            if match is not None:
+                match.detach(connection)
+            connection.close()
+
+    def _end_match(self, match_id: str):
+        if match_id is None:
+            return
+        with self.matches_lock:
+            match = self.matches.pop(match_id, None)
+        if match is not None:
+            match.close()
+
+    def _reap_abandoned_matches(self):
+        while True:
+            time.sleep(1.0)
+            now = time.monotonic()
+            with self.matches_lock:
+                abandoned = [
+                    match_id for match_id, match in self.matches.items()
+                    if match.detached_since is not None and now - match.detached_since > self.resume_grace
+                ]
+            for match_id in abandoned:
+                self._end_match(match_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve an AI agent to remote ApocaWarlords engines over TCP.',
+        epilog='Example usage: python AgentServer.py <ai_agent_file> --port 5000'
+    )
+    parser.add_argument('ai_agent_file', help='Path to the AI agent python file')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (0.0.0.0 for engines on other machines)')
+    parser.add_argument('--key', default=os.environ.get(AGENT_KEY_VARIABLE), help=f'Shared secret engines must send before playing (default: ${AGENT_KEY_VARIABLE}, or a random key)')
+    parser.add_argument('--port', type=int, default=5000, help='TCP port to listen on')
+    parser.add_argument(
+        '--resume_grace',
+        type=float,
+        default=30.0,
+        help='Seconds to keep an agent alive after its engine disconnected, waiting for it to resume the match'
+    )
+    args = parser.parse_args()
+
+    key = args.key or secrets.token_hex(16)
+    server = AgentServer(args.ai_agent_file, args.host, args.port, args.resume_grace, key)
+    print(f'Serving {args.ai_agent_file} on {args.host}:{server.port}', flush=True)
+    if not args.key:
+        print(f'Engines need --agent_key {key} (or {AGENT_KEY_VARIABLE}={key})', flush=True)
+    server.serve_forever()
@@ -0,0 +1,130 @@
+import argparse
+import importlib
+import importlib.util
+import os
+import runpy
+import signal
+import socket
+import sys
+import traceback
+
+# Keeps an AI agent warm so the engine doesn't pay its startup cost every match (see ZygoteAgent in AgentConnection.py).
+# Example: python AgentZygote.py ../AI_Agents/ppo_agent.py --socket /tmp/ppo.sock --preload torch stable_baselines3
+#          python main.py <map_json_file> -r1 zygote:/tmp/ppo.sock -a2 <ai_agent_file_2>
+#
+# The zygote imports the agent file once, along with any heavy modules it names (--preload), and calls the
+# agent's module-level warm_up() function if it has one, e.g. to load a model. Then, for every engine that
+# connects to its unix socket, it forks a child that already has all of that in memory. The child uses the
+# connection as its stdin and stdout, writes "--AGENT PID <pid>--" so the engine can monitor and limit it,
+# and runs the agent file's driver code exactly as if it had been started with "python <agent file>".
+#
+# Objects an agent loads in warm_up() reach the driver code through preloaded() below:
+#   model = AgentZygote.preloaded(("ppo", path), lambda: PPO.load(path))
+# Outside a zygote, preloaded() simply loads the object the first time it's asked for.
+#
+# Only on Unix (it needs fork and unix sockets). warm_up() should load things, not run them: libraries such as
+# torch start worker threads the first time they compute something, and those threads don't survive a fork.
+# The children's stderr goes to the zygote's stderr.
+
+
+# Objects loaded once per process and shared by everything in it (and by every child forked after they're loaded)
+_preloaded = {}
+
+
+def preloaded(key, load):
+    if key not in _preloaded:
+        _preloaded[key] = load()
+    return _preloaded[key]
+
+
+class AgentZygote:
+    def __init__(self, agent_file: str, socket_path: str, preload_modules: list = ()):
+        self.agent_file = os.path.abspath(agent_file)
+        self.socket_path = socket_path
+        self.preload_modules = list(preload_modules)
+
+    # Import everything the agent needs, once, before any match is forked
+    def warm_up(self):
+        # The agent's own directory is on its import path, as when it's run as a script
+        sys.path.insert(0, os.path.dirname(self.agent_file))
+        for module_name in self.preload_modules:
+            importlib.import_module(module_name)
+
+        spec = importlib.util.spec_from_file_location('_zygote_agent', self.agent_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if callable(getattr(module, 'warm_up', None)):
+            module.warm_up()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen()
+
+        # Children are reaped automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        try:
+            while True:
+                connection, _ = listener.accept()
+                if os.fork() == 0:
+                    listener.close()
+                    self._run_child(connection)
+                connection.close()
+        finally:
+            listener.close()
+            os.unlink(self.socket_path)
+
+    # In the forked child: play one match on this connection, then exit. Never returns.
+    def _run_child(self, connection: socket.socket):
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.dup2(connection.fileno(), 0)
+            os.dup2(connection.fileno(), 1)
+            connection.close()
+            sys.stdin = open(0, 'r', encoding='utf-8', closefd=False)
+            sys.stdout = open(1, 'w', encoding='utf-8', buffering=1, closefd=False)
+            print(f'--AGENT PID {os.getpid()}--')
+
+            sys.argv = [self.agent_file]
+            runpy.run_path(self.agent_file, run_name='__main__')
+        except EOFError:
+            # The engine closed the connection: the match is over
+            pass
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            try:
+                sys.stdout.flush()
+            except OSError:
+                pass
+            os._exit(exit_code)
+
+
+if __name__ == '__main__':
+    # Agents import this module by name to reach preloaded(); make that the same module as this script
+    sys.modules.setdefault('AgentZygote', sys.modules[__name__])
+
+    parser = argparse.ArgumentParser(
+        description='Keep an AI agent warm and fork a ready copy of it for every match.',
+        epilog='Example usage: python AgentZygote.py <ai_agent_file> --socket /tmp/agent.sock --preload torch'
+    )
+    parser.add_argument('ai_agent_file', help='Path to the AI agent python file')
+    parser.add_argument('--socket', required=True, help='Path of the unix socket to listen on')
+    parser.add_argument('--preload', nargs='*', default=[], help='Modules to import before forking, besides those the agent file imports')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        print('AgentZygote needs fork, which this platform does not have')
+        exit(1)
+
+    zygote = AgentZygote(args.ai_agent_file, args.socket, args.preload)
+    zygote.warm_up()
+    print(f'Serving {args.ai_agent_file} on {args.socket}', flush=True)
+    zygote.serve_forever()
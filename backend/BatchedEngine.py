@@ -0,0 +1,924 @@
+import random
+import numpy as np
+import Constants
+from MapCache import MapData, load_map
+from TeamStats import TeamStats, TOWER_TYPES
+
+# Plays many games on one map at once, in lockstep. The state of every game is kept in NumPy arrays with one
+# row per game, and each phase of a turn is done for all the games together. This is for RL rollouts and
+# balance sweeps, where thousands of games are played on the same map; Game.py remains the reference engine.
+#
+# Given the same actions and the same random generators, every game goes exactly as Game.py would play it,
+# quirks included:
+# - units that move onto the same tile: the one later in the list takes the tile, the other is left off the grid
+# - demons wiped out by both teams provoking stay on the grid, blocking it and taking hits, until something clears their tile
+# - church buffs reach mercenaries at 0 health that haven't been checked for mortal wounds yet
+# - random tie-breaks between tower targets take one number per candidate, in tower list order
+#
+# Entity names and each tower's Targets (which only the visualizer uses) are not tracked.
+# Only maps whose lanes don't share tiles, with every spawn tile on a lane, are supported; all the maps
+# in the maps directory are. Games that are over are left as they are until they're reset.
+
+TEAMS = ('r', 'b')
+RED, BLUE = 0, 1
+
+# Units are mercenaries and demons. A unit's team is the mercenary's own team, or the team a demon is attacking.
+NO_UNIT = -1
+MERCENARY, DEMON = 1, 2
+MOVING, FIGHTING, WAITING, DEAD = 0, 1, 2, 3
+UNIT_STATES = ('moving', 'fighting', 'waiting', 'dead')
+
+# Tower types, numbered in TeamStats.TOWER_TYPES order
+HOUSE, CROSSBOW, CANNON, MINIGUN, CHURCH = range(len(TOWER_TYPES))
+TOWER_TYPE_INDEX = {tower_type.lower(): index for index, tower_type in enumerate(TOWER_TYPES)}
+TOWER_BASE_PRICES = np.array([
+    Constants.HOUSE_BASE_PRICE, Constants.CROSSBOW_BASE_PRICE, Constants.CANNON_BASE_PRICE,
+    Constants.MINIGUN_BASE_PRICE, Constants.CHURCH_BASE_PRICE
+], dtype=np.int64)
+TOWER_MAX_COOLDOWNS = np.array([
+    Constants.HOUSE_MAX_COOLDOWN, Constants.CROSSBOW_MAX_COOLDOWN, Constants.CANNON_MAX_COOLDOWN,
+    Constants.MINIGUN_MAX_COOLDOWN, Constants.CHURCH_MAX_COOLDOWN
+], dtype=np.int64)
+TOWER_RANGES = (
+    Constants.HOUSE_RANGE, Constants.CROSSBOW_RANGE, Constants.CANNON_RANGE,
+    Constants.MINIGUN_RANGE, Constants.CHURCH_RANGE
+)
+TOWER_DAMAGE = np.array([0, Constants.CROSSBOW_DAMAGE, Constants.CANNON_DAMAGE, Constants.MINIGUN_DAMAGE, 0], dtype=np.int64)
+
+ACTION_NOTHING, ACTION_BUILD, ACTION_DESTROY = 0, 1, 2
+
+# Mercenary queues of a base, in the order they spawn: up, down, left, right
+QUEUE_OFFSETS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+QUEUE_DIRECTIONS = {"N": 0, "S": 1, "W": 2, "E": 3}
+
+VICTORY_NAMES = (None, 'r', 'b', 'tie')
+VICTORY_NONE, VICTORY_R, VICTORY_B, VICTORY_TIE = range(len(VICTORY_NAMES))
+VICTORY_REASONS = (
+    "",
+    "Blue base destroyed!",
+    "Red base destroyed!",
+    "Tie broken: Red has more money.",
+    "Tie broken: Blue has more money.",
+    "Tie broken: Red has more towers.",
+    "Tie broken: Blue has more towers.",
+    "Tie broken: Red has spent more.",
+    "Tie broken: Blue has spent more.",
+    "Tie broken: Red has more mercenaries.",
+    "Tie broken: Blue has more mercenaries.",
+    "Tie broken: Red mercenaries have more health.",
+    "Tie broken: Blue mercenaries have more health.",
+)
+
+# Totals over the whole game, kept in stats[game, team, total]. The rest of TeamStats is counted from the arrays.
+MONEY_SPENT, MONEY_REFUNDED, INCOME, MERCS_SPAWNED, MERCS_LOST, DAMAGE_DEALT, BASE_DAMAGE_DEALT = range(7)
+NUM_TOTALS = 7
+
+
+class BatchedActions:
+    # One team's actions for one turn in every game, as arrays indexed by game
+    def __init__(self, num_games: int):
+        self.action = np.zeros(num_games, dtype=np.int8)
+        self.x = np.zeros(num_games, dtype=np.int64)
+        self.y = np.zeros(num_games, dtype=np.int64)
+        # HOUSE to CHURCH, or -1 if it isn't a tower type
+        self.tower_type = np.full(num_games, -1, dtype=np.int8)
+        # Index into QUEUE_OFFSETS, or -1 for no mercenary
+        self.merc_direction = np.full(num_games, -1, dtype=np.int8)
+        self.provoke_demons = np.zeros(num_games, dtype=bool)
+
+    @staticmethod
+    def from_ai_actions(actions: list) -> 'BatchedActions':
+        batch = BatchedActions(len(actions))
+        for game, action in enumerate(actions):
+            if action.action == "build":
+                batch.action[game] = ACTION_BUILD
+            elif action.action == "destroy":
+                batch.action[game] = ACTION_DESTROY
+            batch.x[game] = action.x
+            batch.y[game] = action.y
+            batch.tower_type[game] = TOWER_TYPE_INDEX.get(action.tower_type.lower(), -1)
+            batch.merc_direction[game] = QUEUE_DIRECTIONS.get(action.merc_direction, -1)
+            batch.provoke_demons[game] = bool(action.provoke_demons)
+        return batch
+
+
+class BatchedEngine:
+    def __init__(self, map_data, num_games: int, rngs: list = None, max_units: int = None):
+        # map_data is a MapData or the path to a map file
+        self.map_data = map_data if isinstance(map_data, MapData) else load_map(map_data)
+        self.num_games = num_games
+        # Where each game's random tie-breaks come from. To replay a game played by Game.py, give it
+        # a random.Random in the same state as the one the GameState used.
+        self.rngs = list(rngs) if rngs is not None else [random.Random(game) for game in range(num_games)]
+        if len(self.rngs) != num_games:
+            raise ValueError(f"BatchedEngine needs one random generator per game ({num_games}), got {len(self.rngs)}")
+
+        self._build_map_tables()
+        # Each path tile holds one unit, and units killed this turn stay listed until the next one
+        self.max_units = max_units if max_units is not None else 2 * self.num_path_tiles + 16
+        self._allocate()
+        self.reset()
+
+
+    # --- Map ---
+
+    def _build_map_tables(self):
+        map_data = self.map_data
+        width, height = map_data.width, map_data.height
+
+        # Path tiles are numbered lane by lane, from the Red end of each lane to the Blue end
+        lanes = [path for path in (
+            map_data.mercenary_path_up,
+            map_data.mercenary_path_down,
+            map_data.mercenary_path_left,
+            map_data.mercenary_path_right
+        ) if path is not None]
+        path_tile_of = {}
+        tile_x, tile_y, tile_lane, tile_position = [], [], [], []
+        for lane, path in enumerate(lanes):
+            for position, tile in enumerate(path):
+                if tile in path_tile_of:
+                    raise ValueError(f"BatchedEngine doesn't support maps whose lanes share tiles, like {tile}")
+                path_tile_of[tile] = len(tile_x)
+                tile_x.append(tile[0])
+                tile_y.append(tile[1])
+                tile_lane.append(lane)
+                tile_position.append(position)
+
+        self.num_path_tiles = len(tile_x)
+        self.tile_x = np.array(tile_x, dtype=np.int64)
+        self.tile_y = np.array(tile_y, dtype=np.int64)
+        self.tile_lane = np.array(tile_lane, dtype=np.int64)
+        self.tile_position = np.array(tile_position, dtype=np.int64)
+        self.lane_length = np.array([len(path) for path in lanes], dtype=np.int64)
+        self.lane_start = np.concatenate(([0], np.cumsum(self.lane_length)[:-1])).astype(np.int64)
+
+        def path_tile(x: int, y: int, what: str) -> int:
+            tile = path_tile_of.get((x, y))
+            if tile is None:
+                raise ValueError(f"BatchedEngine doesn't support maps with {what} off the lanes, at ({x}, {y})")
+            return tile
+
+        # The tile each mercenary queue spawns on, or -1 if that side of the base isn't a path
+        self.queue_tiles = np.full((2, len(QUEUE_OFFSETS)), -1, dtype=np.int64)
+        for team, (base_x, base_y) in enumerate((map_data.player_base_r_location, map_data.player_base_b_location)):
+            for queue, (dx, dy) in enumerate(QUEUE_OFFSETS):
+                x, y = base_x + dx, base_y + dy
+                if not map_data.is_out_of_bounds(x, y) and map_data.floor_tiles[y][x] == 'O':
+                    self.queue_tiles[team, queue] = path_tile(x, y, "a mercenary spawn")
+
+        self.spawner_tiles = np.array(
+            [path_tile(x, y, "a demon spawner") for x, y, _ in map_data.demon_spawners], dtype=np.int64)
+        self.spawner_initial_targets = np.array(
+            [TEAMS.index(target) for _, _, target in map_data.demon_spawners], dtype=np.int8)
+
+        # Board cells are numbered y * width + x. Territory is RED or BLUE where that team can build, else -1.
+        self.territory = np.full(width * height, -1, dtype=np.int8)
+        for y, row in enumerate(map_data.floor_tiles):
+            for x, tile_type in enumerate(row):
+                if tile_type in TEAMS:
+                    self.territory[y * width + x] = TEAMS.index(tile_type)
+        self.num_tower_slots = int((self.territory >= 0).sum())
+
+        # tiles_in_range[tower type, cell]: the path tiles a tower there checks, in the order it checks them,
+        # padded with -1. Base tiles are left out, since units never stand on them.
+        in_range = [[[] for _ in range(width * height)] for _ in TOWER_TYPES]
+        for cell in np.flatnonzero(self.territory >= 0):
+            x, y = int(cell % width), int(cell // width)
+            for tower_type, tower_range in enumerate(TOWER_RANGES):
+                if tower_range > 0:
+                    in_range[tower_type][cell] = [
+                        path_tile_of[tile] for tile in map_data.paths_in_range(x, y, tower_range) if tile in path_tile_of
+                    ]
+        most_in_range = max(1, max(len(tiles) for per_type in in_range for tiles in per_type))
+        self.tiles_in_range = np.full((len(TOWER_TYPES), width * height, most_in_range), -1, dtype=np.int64)
+        for tower_type, per_type in enumerate(in_range):
+            for cell, tiles in enumerate(per_type):
+                self.tiles_in_range[tower_type, cell, :len(tiles)] = tiles
+
+
+    # --- State ---
+
+    def _allocate(self):
+        games, units, towers = self.num_games, self.max_units, self.num_tower_slots
+        spawners = len(self.spawner_tiles)
+
+        self.turns_remaining = np.zeros(games, dtype=np.int64)
+        self.victory = np.zeros(games, dtype=np.int8)
+        self.victory_reason = np.zeros(games, dtype=np.int8)
+        self.money = np.zeros((games, 2), dtype=np.int64)
+        self.base_health = np.zeros((games, 2), dtype=np.int64)
+        self.queued_mercs = np.zeros((games, 2, len(QUEUE_OFFSETS)), dtype=np.int64)
+        self.tower_prices = np.zeros((games, 2, len(TOWER_TYPES)), dtype=np.int64)
+
+        self.spawner_reload = np.zeros((games, spawners), dtype=np.int64)
+        self.spawner_target = np.zeros((games, spawners), dtype=np.int8)
+        self.spawner_activations = np.zeros((games, spawners), dtype=np.int64)
+        self.spawner_queued = np.zeros((games, spawners), dtype=np.int64)
+
+        # Units, in slots. A slot is free (kind 0) once its unit is off both the lists and the grid.
+        # unit_listed is whether the unit is in GameState.mercs/demons; unit_order is its place in that list.
+        self.unit_kind = np.zeros((games, units), dtype=np.int8)
+        self.unit_team = np.zeros((games, units), dtype=np.int8)
+        self.unit_health = np.zeros((games, units), dtype=np.int64)
+        self.unit_attack = np.zeros((games, units), dtype=np.int64)
+        self.unit_lane = np.zeros((games, units), dtype=np.int64)
+        self.unit_position = np.zeros((games, units), dtype=np.int64)
+        self.unit_state = np.zeros((games, units), dtype=np.int8)
+        self.unit_listed = np.zeros((games, units), dtype=bool)
+        self.unit_order = np.zeros((games, units), dtype=np.int64)
+        self.next_unit_order = np.zeros(games, dtype=np.int64)
+        # Slots from here on are free in every game, so scans over units can stop here
+        self.units_in_use = 0
+        # The unit slot on each path tile (GameState.entity_grid, for the tiles units can be on)
+        self.path_grid = np.full((games, self.num_path_tiles), NO_UNIT, dtype=np.int64)
+
+        # Towers, in list order: the first tower_count[game] slots of each row are used
+        self.tower_count = np.zeros(games, dtype=np.int64)
+        self.tower_type = np.full((games, towers), -1, dtype=np.int8)
+        self.tower_team = np.zeros((games, towers), dtype=np.int8)
+        self.tower_cell = np.zeros((games, towers), dtype=np.int64)
+        self.tower_cooldown = np.zeros((games, towers), dtype=np.int64)
+        self.tower_grid = np.zeros((games, self.map_data.width * self.map_data.height), dtype=bool)
+
+        self.stats = np.zeros((games, 2, NUM_TOTALS), dtype=np.int64)
+
+    # Start new games in the given games (indices or a mask), or in all of them
+    def reset(self, games=None):
+        if games is None:
+            games = slice(None)
+        self.turns_remaining[games] = Constants.MAX_TURNS
+        self.victory[games] = VICTORY_NONE
+        self.victory_reason[games] = 0
+        self.money[games] = Constants.INITIAL_MONEY
+        self.base_health[games] = Constants.PLAYER_BASE_INITIAL_HEALTH
+        self.queued_mercs[games] = 0
+        self.tower_prices[games] = TOWER_BASE_PRICES
+
+        self.spawner_reload[games] = Constants.DEMON_SPAWNER_RELOAD_TURNS
+        self.spawner_target[games] = self.spawner_initial_targets
+        self.spawner_activations[games] = 0
+        self.spawner_queued[games] = 0
+
+        self.unit_kind[games] = 0
+        self.unit_listed[games] = False
+        self.next_unit_order[games] = 0
+        self.path_grid[games] = NO_UNIT
+
+        self.tower_count[games] = 0
+        self.tower_type[games] = -1
+        self.tower_grid[games] = False
+
+        self.stats[games] = 0
+
+    def is_game_over(self) -> np.ndarray:
+        return (self.turns_remaining <= 0) | (self.victory != VICTORY_NONE)
+
+
+    # --- Turn ---
+
+    # Play one turn in every game that isn't over. Actions are BatchedActions or lists of AIAction, one per game.
+    def step(self, actions_r, actions_b):
+        if not isinstance(actions_r, BatchedActions):
+            actions_r = BatchedActions.from_ai_actions(actions_r)
+        if not isinstance(actions_b, BatchedActions):
+            actions_b = BatchedActions.from_ai_actions(actions_b)
+
+        playing = ~self.is_game_over()
+        self._buy_mercenaries(playing, actions_r, RED)
+        self._buy_mercenaries(playing, actions_b, BLUE)
+        self._build(playing, actions_r, RED)
+        self._build(playing, actions_b, BLUE)
+        provoked = self._provoke_demons(playing, actions_r, actions_b)
+        self._world_update(playing, provoked)
+        self.turns_remaining[playing] -= 1
+
+    def _buy_mercenaries(self, playing: np.ndarray, actions: BatchedActions, team: int):
+        queue = np.maximum(actions.merc_direction, 0)
+        buying = np.flatnonzero(
+            playing &
+            (actions.merc_direction >= 0) &
+            (self.money[:, team] >= Constants.MERCENARY_PRICE) &
+            (self.queue_tiles[team, queue] >= 0)
+        )
+        self.queued_mercs[buying, team, queue[buying]] += 1
+        self.money[buying, team] -= Constants.MERCENARY_PRICE
+        self.stats[buying, team, MONEY_SPENT] += Constants.MERCENARY_PRICE
+
+    def _build(self, playing: np.ndarray, actions: BatchedActions, team: int):
+        width, height = self.map_data.width, self.map_data.height
+        all_games = np.arange(self.num_games)
+        in_bounds = (actions.x >= 0) & (actions.x < width) & (actions.y >= 0) & (actions.y < height)
+        cell = np.where(in_bounds, actions.y * width + actions.x, 0)
+        own_tile = playing & in_bounds & (self.territory[cell] == team)
+        occupied = self.tower_grid[all_games, cell]
+
+        tower_type = np.maximum(actions.tower_type, 0)
+        price = self.tower_prices[all_games, team, tower_type]
+        building = np.flatnonzero(
+            own_tile & (actions.action == ACTION_BUILD) & ~occupied &
+            (actions.tower_type >= 0) & (self.money[:, team] >= price)
+        )
+        if len(building):
+            slot = self.tower_count[building]
+            tower_type, price, cell_built = tower_type[building], price[building], cell[building]
+            self.tower_type[building, slot] = tower_type
+            self.tower_team[building, slot] = team
+            self.tower_cell[building, slot] = cell_built
+            self.tower_cooldown[building, slot] = TOWER_MAX_COOLDOWNS[tower_type]
+            self.tower_count[building] += 1
+            self.tower_grid[building, cell_built] = True
+            self.money[building, team] -= price
+            self.stats[building, team, MONEY_SPENT] += price
+            # Same float arithmetic as Utils.get_increased_tower_price
+            self.tower_prices[building, team, tower_type] = np.floor(
+                (1 + 0.01 * Constants.TOWER_PRICE_PERCENT_INCREASE_PER_BUY) * price).astype(np.int64)
+
+        # Few games destroy a tower on any turn, so they're done one at a time
+        for game in np.flatnonzero(own_tile & (actions.action == ACTION_DESTROY) & occupied):
+            count = self.tower_count[game]
+            slot = np.flatnonzero(self.tower_cell[game, :count] == cell[game])[0]
+            refund = TOWER_BASE_PRICES[self.tower_type[game, slot]]
+            for column in (self.tower_type, self.tower_team, self.tower_cell, self.tower_cooldown):
+                column[game, slot:count - 1] = column[game, slot + 1:count]
+            self.tower_type[game, count - 1] = -1
+            self.tower_count[game] -= 1
+            self.tower_grid[game, cell[game]] = False
+            self.money[game, team] += refund
+            self.stats[game, team, MONEY_REFUNDED] += refund
+
+    # Returns which games had exactly one team provoke the demons
+    def _provoke_demons(self, playing: np.ndarray, actions_r: BatchedActions, actions_b: BatchedActions) -> np.ndarray:
+        provoked = []
+        for team, actions in ((RED, actions_r), (BLUE, actions_b)):
+            paying = playing & actions.provoke_demons & (self.money[:, team] >= Constants.PROVOKE_DEMONS_PRICE)
+            self.money[paying, team] -= Constants.PROVOKE_DEMONS_PRICE
+            self.stats[paying, team, MONEY_SPENT] += Constants.PROVOKE_DEMONS_PRICE
+            provoked.append(paying)
+
+        # Both provoking wipes out the demons. Like the reference engine, they're marked dead but left on the grid.
+        both = provoked[RED] & provoked[BLUE]
+        used = self.units_in_use
+        wiped = both[:, None] & (self.unit_kind[:, :used] == DEMON) & self.unit_listed[:, :used]
+        self.unit_state[:, :used][wiped] = DEAD
+        return provoked[RED] ^ provoked[BLUE]
+
+    def _world_update(self, playing: np.ndarray, provoked: np.ndarray):
+        self._remove_dead(playing)
+
+        playing = playing.copy()
+        self._update_units(MERCENARY, playing)
+        self._mortal_wound_check(playing)
+        playing &= ~self._check_wincon(playing)
+
+        self._update_units(DEMON, playing)
+        self._mortal_wound_check(playing)
+        playing &= ~self._check_wincon(playing)
+
+        self._spawn_mercenaries(playing)
+        self._spawn_demons(playing, provoked)
+        self._update_towers(playing)
+        self._mortal_wound_check(playing)
+
+    def _remove_dead(self, games: np.ndarray):
+        used = self.units_in_use
+        rows = games[:, None]
+        listed = self.unit_listed[:, :used]
+        listed[rows & (self.unit_state[:, :used] == DEAD)] = False
+
+        on_grid = np.zeros((self.num_games, used), dtype=bool)
+        grid_games, grid_tiles = np.nonzero(self.path_grid >= 0)
+        on_grid[grid_games, self.path_grid[grid_games, grid_tiles]] = True
+        kind = self.unit_kind[:, :used]
+        kind[rows & ~listed & ~on_grid] = 0
+        in_use = np.flatnonzero((kind != 0).any(axis=0))
+        self.units_in_use = int(in_use[-1]) + 1 if len(in_use) else 0
+
+
+    # --- Units ---
+
+    # +1 for units walking from the Red end of their lane to the Blue end, -1 the other way
+    @staticmethod
+    def _forward(kind: np.ndarray, team: np.ndarray) -> np.ndarray:
+        return np.where((kind == MERCENARY) == (team == RED), 1, -1)
+
+    # Kind (0 for none) and team of the units in the given slots, which may be NO_UNIT
+    def _unit_info(self, games: np.ndarray, units: np.ndarray) -> tuple:
+        slots = np.maximum(units, 0)
+        kind = np.where(units != NO_UNIT, self.unit_kind[games, slots], 0)
+        return kind, self.unit_team[games, slots]
+
+    # Path tile, lane start, lane end and walking direction of each unit
+    def _unit_layout(self, games: np.ndarray, units: np.ndarray) -> tuple:
+        lane = self.unit_lane[games, units]
+        start = self.lane_start[lane]
+        last = self.lane_length[lane] - 1
+        forward = self._forward(self.unit_kind[games, units], self.unit_team[games, units])
+        return self.unit_position[games, units], start, last, forward
+
+    # Units on the tiles one and two steps ahead of each unit
+    def _units_ahead(self, games, position, start, last, forward) -> tuple:
+        ahead1 = self.path_grid[games, start + np.clip(position + forward, 0, last)]
+        ahead2 = self.path_grid[games, start + np.clip(position + 2 * forward, 0, last)]
+        return ahead1, ahead2
+
+    # Decide, move and fight, for every listed and living mercenary (or demon) of the given games at once.
+    # Same rules as UpdateMercenaries.py and UpdateDemons.py.
+    def _update_units(self, kind: int, games: np.ndarray):
+        used = self.units_in_use
+        unit_games, units = np.nonzero(
+            games[:, None] & (self.unit_kind[:, :used] == kind) & self.unit_listed[:, :used] &
+            (self.unit_state[:, :used] != DEAD))
+        if len(units) == 0:
+            return
+
+        team = self.unit_team[unit_games, units]
+        position, start, last, forward = self._unit_layout(unit_games, units)
+        ahead1, ahead2 = self._units_ahead(unit_games, position, start, last, forward)
+        kind1, team1 = self._unit_info(unit_games, ahead1)
+        kind2, team2 = self._unit_info(unit_games, ahead2)
+        base_in_reach = np.where(forward > 0, position == last - 1, position == 1)
+        nothing_ahead = ahead1 == NO_UNIT
+
+        if kind == MERCENARY:
+            # Demons move in their own phase: mercenaries wait behind demons attacking the other team
+            waiting = (kind1 == DEMON) & (team1 != team)
+            fighting = ((kind1 == DEMON) & (team1 == team)) | ((kind1 == MERCENARY) & (team1 != team))
+            fighting |= nothing_ahead & (base_in_reach | ((kind2 == MERCENARY) & (team2 != team)))
+            blocked_state = WAITING
+        else:
+            waiting = np.zeros(len(units), dtype=bool)
+            fighting = ((kind1 == DEMON) & (team1 != team)) | (kind1 == MERCENARY)
+            fighting |= nothing_ahead & (base_in_reach | ((kind2 == DEMON) & (team2 != team)))
+            blocked_state = FIGHTING
+
+        self.unit_state[unit_games, units] = np.where(fighting, FIGHTING, np.where(waiting, WAITING, MOVING))
+        blocking = fighting | waiting
+        self._block_units_behind(kind, unit_games[blocking], units[blocking], blocked_state)
+        state = self.unit_state[unit_games, units]
+
+        moving = state == MOVING
+        if moving.any():
+            self._move_units(unit_games[moving], units[moving], position[moving], start[moving], last[moving], forward[moving])
+
+        fighting = state == FIGHTING
+        if fighting.any():
+            self._unit_combat(kind, unit_games[fighting], units[fighting], team[fighting], position[fighting],
+                              start[fighting], last[fighting], forward[fighting], base_in_reach[fighting])
+
+    # A unit that stays put holds up the line of teammates behind it (block_entity_behind), however it was decided
+    def _block_units_behind(self, kind: int, games: np.ndarray, units: np.ndarray, blocked_state: int):
+        blocked = np.zeros((self.num_games, self.units_in_use), dtype=bool)
+        while len(units):
+            position, start, last, forward = self._unit_layout(games, units)
+            behind_position = np.clip(position - forward, 0, last)
+            behind = self.path_grid[games, start + behind_position]
+            behind_kind, behind_team = self._unit_info(games, behind)
+            follow = (behind_position != position) & (behind_kind == kind) & (behind_team == self.unit_team[games, units])
+            games, units = games[follow], behind[follow]
+            new = ~blocked[games, units]
+            games, units = games[new], units[new]
+            blocked[games, units] = True
+            self.unit_state[games, units] = blocked_state
+
+    def _move_units(self, games, units, position, start, last, forward):
+        self.path_grid[games, start + position] = NO_UNIT
+        new_position = np.clip(position + forward, 0, last)
+        self.unit_position[games, units] = new_position
+        tiles = start + new_position
+
+        # When two units step onto the same tile, the one later in the list ends up on the grid
+        in_list_order = np.argsort(self.unit_order[games, units], kind='stable')
+        keys = (games * self.num_path_tiles + tiles)[in_list_order][::-1]
+        _, last_to_arrive = np.unique(keys, return_index=True)
+        keep = in_list_order[len(keys) - 1 - last_to_arrive]
+        self.path_grid[games[keep], tiles[keep]] = units[keep]
+
+    def _unit_combat(self, kind, games, units, team, position, start, last, forward, base_in_reach):
+        ahead1, ahead2 = self._units_ahead(games, position, start, last, forward)
+        target = np.where(ahead1 != NO_UNIT, ahead1, ahead2)
+        attack = self.unit_attack[games, units]
+
+        hits = target != NO_UNIT
+        np.add.at(self.unit_health, (games[hits], target[hits]), -attack[hits])
+
+        at_base = ~hits & base_in_reach
+        base_team = np.where(forward > 0, BLUE, RED)[at_base]
+        # Mercenaries hit bases for MERCENARY_ATTACK_POWER, whatever churches did to their attack
+        base_attack = np.full(len(units), Constants.MERCENARY_ATTACK_POWER) if kind == MERCENARY else attack
+        base_attack = base_attack[at_base]
+        np.add.at(self.base_health, (games[at_base], base_team), -base_attack)
+
+        if kind == MERCENARY:
+            np.add.at(self.stats, (games[hits], team[hits], DAMAGE_DEALT), attack[hits])
+            np.add.at(self.stats, (games[at_base], team[at_base], DAMAGE_DEALT), base_attack)
+            np.add.at(self.stats, (games[at_base], team[at_base], BASE_DAMAGE_DEALT), base_attack)
+
+    def _mortal_wound_check(self, games: np.ndarray):
+        used = self.units_in_use
+        games, units = np.nonzero(
+            games[:, None] & self.unit_listed[:, :used] & (self.unit_state[:, :used] != DEAD) &
+            (self.unit_health[:, :used] <= 0))
+        if len(units) == 0:
+            return
+        position, start, _, _ = self._unit_layout(games, units)
+        self.path_grid[games, start + position] = NO_UNIT
+        self.unit_state[games, units] = DEAD
+        mercs = self.unit_kind[games, units] == MERCENARY
+        np.add.at(self.stats, (games[mercs], self.unit_team[games[mercs], units[mercs]], MERCS_LOST), 1)
+
+    # Put a new unit on a path tile in each of the given games
+    def _spawn_units(self, games: np.ndarray, kind: int, team, tile: int, health, attack):
+        # Lowest free slot; slot units_in_use is always free unless every slot is taken
+        free = self.unit_kind[games, :self.units_in_use + 1] == 0
+        slots = np.argmax(free, axis=1)
+        if not free[np.arange(len(games)), slots].all():
+            raise RuntimeError(f"BatchedEngine ran out of unit slots; make it with max_units above {self.max_units}")
+        self.units_in_use = max(self.units_in_use, int(slots.max()) + 1)
+
+        self.unit_kind[games, slots] = kind
+        self.unit_team[games, slots] = team
+        self.unit_health[games, slots] = health
+        self.unit_attack[games, slots] = attack
+        self.unit_lane[games, slots] = self.tile_lane[tile]
+        self.unit_position[games, slots] = self.tile_position[tile]
+        self.unit_state[games, slots] = MOVING
+        self.unit_listed[games, slots] = True
+        self.unit_order[games, slots] = self.next_unit_order[games]
+        self.next_unit_order[games] += 1
+        self.path_grid[games, tile] = slots
+
+    def _spawn_mercenaries(self, games: np.ndarray):
+        for team in (RED, BLUE):
+            for queue, tile in enumerate(self.queue_tiles[team]):
+                if tile < 0:
+                    continue
+                spawning = np.flatnonzero(
+                    games & (self.queued_mercs[:, team, queue] > 0) & (self.path_grid[:, tile] == NO_UNIT))
+                if len(spawning) == 0:
+                    continue
+                self._spawn_units(spawning, MERCENARY, team, tile,
+                                  Constants.MERCENARY_INITIAL_HEALTH, Constants.MERCENARY_ATTACK_POWER)
+                # The whole queue is let go at once
+                self.queued_mercs[spawning, team, queue] = 0
+                self.stats[spawning, team, MERCS_SPAWNED] += 1
+
+    def _spawn_demons(self, games: np.ndarray, provoked: np.ndarray):
+        for spawner, tile in enumerate(self.spawner_tiles):
+            reloaded = games & (self.spawner_reload[:, spawner] <= 0)
+            self.spawner_queued[reloaded, spawner] += 1
+            self.spawner_reload[reloaded, spawner] = Constants.DEMON_SPAWNER_RELOAD_TURNS
+            self.spawner_reload[games & ~reloaded, spawner] -= 1
+            self.spawner_queued[games & provoked, spawner] += 1
+
+            spawning = np.flatnonzero(
+                games & (self.spawner_queued[:, spawner] > 0) & (self.path_grid[:, tile] == NO_UNIT))
+            if len(spawning) == 0:
+                continue
+            activations = self.spawner_activations[spawning, spawner]
+            self._spawn_units(
+                spawning, DEMON, self.spawner_target[spawning, spawner], tile,
+                Constants.DEMON_INITIAL_HEALTH + activations * Constants.DEMON_HEALTH_INCREASE_PER_SPAWN,
+                Constants.DEMON_INITIAL_ATTACK_POWER + activations * Constants.DEMON_ATTACK_POWER_INCREASE_PER_SPAWN
+            )
+            self.spawner_queued[spawning, spawner] -= 1
+            self.spawner_activations[spawning, spawner] += 1
+
+
+    # --- Towers ---
+
+    # Which of the units (slots or NO_UNIT, one row per tower) a tower of tower_team shoots at:
+    # enemy mercenaries, and demons attacking its team
+    def _targetable(self, games: np.ndarray, units: np.ndarray, tower_team: np.ndarray) -> np.ndarray:
+        kind, team = self._unit_info(games[:, None], units)
+        tower_team = tower_team[:, None]
+        return ((kind == MERCENARY) & (team != tower_team)) | ((kind == DEMON) & (team == tower_team))
+
+    def _units_in_range(self, games: np.ndarray, tower_type: np.ndarray, cells: np.ndarray) -> np.ndarray:
+        tiles = self.tiles_in_range[tower_type, cells]
+        return np.where(tiles >= 0, self.path_grid[games[:, None], np.maximum(tiles, 0)], NO_UNIT)
+
+    # Every tower of every game takes its turn. Towers go one list position at a time, for all games at once,
+    # since a tower sees what the towers before it in its own game did.
+    def _update_towers(self, games: np.ndarray):
+        counts = np.where(games, self.tower_count, 0)
+        most_towers = int(counts.max()) if len(counts) else 0
+        if most_towers == 0:
+            return
+
+        tower_type = self.tower_type[:, :most_towers]
+        tower_team = self.tower_team[:, :most_towers]
+        tower_cell = self.tower_cell[:, :most_towers]
+        present = np.arange(most_towers)[None, :] < counts[:, None]
+
+        # Crossbows and cannons break ties with one random number per target they could pick. Which units
+        # they could pick doesn't change during this phase, so every game's numbers are drawn up front.
+        aiming_games, aiming_slots = np.nonzero(
+            present & (self.tower_cooldown[:, :most_towers] == 0) &
+            ((tower_type == CROSSBOW) | (tower_type == CANNON)))
+        aim_row = np.full((self.num_games, most_towers), -1, dtype=np.int64)
+        aim_row[aiming_games, aiming_slots] = np.arange(len(aiming_games))
+        if len(aiming_games):
+            candidates = self._units_in_range(
+                aiming_games, tower_type[aiming_games, aiming_slots], tower_cell[aiming_games, aiming_slots])
+            targetable = self._targetable(aiming_games, candidates, tower_team[aiming_games, aiming_slots])
+            draws = np.zeros(targetable.shape)
+            draws_per_game = np.bincount(aiming_games, weights=targetable.sum(axis=1), minlength=self.num_games).astype(np.int64)
+            drawing = np.flatnonzero(draws_per_game)
+            if len(drawing):
+                # Row order is game, then tower list order, then the order towers check tiles in
+                draws[targetable] = np.concatenate(
+                    [self._random_values(self.rngs[game], draws_per_game[game]) for game in drawing])
+
+        for slot in range(most_towers):
+            here = present[:, slot]
+            cooling = here & (self.tower_cooldown[:, slot] > 0)
+            self.tower_cooldown[cooling, slot] -= 1
+            ready = here & ~cooling
+            slot_type = tower_type[:, slot]
+
+            houses = np.flatnonzero(ready & (slot_type == HOUSE))
+            if len(houses):
+                team = tower_team[houses, slot]
+                self.money[houses, team] += Constants.HOUSE_MONEY_PRODUCED
+                self.stats[houses, team, INCOME] += Constants.HOUSE_MONEY_PRODUCED
+                self.tower_cooldown[houses, slot] = Constants.HOUSE_MAX_COOLDOWN
+
+            aiming = np.flatnonzero(aim_row[:, slot] >= 0)
+            if len(aiming):
+                rows = aim_row[aiming, slot]
+                self._shoot_single_target(aiming, slot, candidates[rows], targetable[rows], draws[rows])
+
+            miniguns = np.flatnonzero(ready & (slot_type == MINIGUN))
+            if len(miniguns):
+                self._shoot_all_targets(miniguns, slot)
+
+            churches = np.flatnonzero(ready & (slot_type == CHURCH))
+            if len(churches):
+                self._buff_mercenaries(churches, slot)
+
+    # Same numbers, in the same order, as count calls to rng.random(). Each call takes two 32-bit outputs of
+    # the generator, and getrandbits hands them out low word first.
+    @staticmethod
+    def _random_values(rng, count: int) -> np.ndarray:
+        words = np.frombuffer(rng.getrandbits(64 * count).to_bytes(8 * count, 'little'), dtype='<u4')
+        high = (words[0::2] >> 5).astype(np.float64)
+        low = (words[1::2] >> 6).astype(np.float64)
+        return (high * 67108864.0 + low) * (1.0 / 9007199254740992.0)
+
+    def _shoot_single_target(self, games, slot, candidates, targetable, draws):
+        has_target = targetable.any(axis=1)
+        games, candidates, targetable, draws = games[has_target], candidates[has_target], targetable[has_target], draws[has_target]
+        if len(games) == 0:
+            return
+        rows = games[:, None]
+        slots = np.maximum(candidates, 0)
+        team = self.tower_team[games, slot]
+        tower_type = self.tower_type[games, slot]
+
+        # Shoot_single_priority_target's sort: nearest to the tower's base along its own lane, then most health,
+        # then most attack, then the random number
+        position = self.unit_position[rows, slots]
+        keys = (
+            np.where(team[:, None] == RED, position, -position),
+            -self.unit_health[rows, slots],
+            -self.unit_attack[rows, slots],
+            draws
+        )
+        best = targetable
+        for key in keys:
+            lowest = np.where(best, key, np.inf).min(axis=1, keepdims=True)
+            best = best & (key == lowest)
+        target = candidates[np.arange(len(games)), best.argmax(axis=1)]
+
+        damage = TOWER_DAMAGE[tower_type]
+        np.add.at(self.unit_health, (games, target), -damage)
+        np.add.at(self.stats, (games, team, DAMAGE_DEALT), damage)
+        self.tower_cooldown[games, slot] = TOWER_MAX_COOLDOWNS[tower_type]
+
+        # Cannons also hit the tiles ahead of and behind their target (Tower.damage_adjacent_targets)
+        cannons = tower_type == CANNON
+        if not cannons.any():
+            return
+        games, target, team, damage = games[cannons], target[cannons], team[cannons], damage[cannons]
+        position, start, last, forward = self._unit_layout(games, target)
+        for step in (forward, -forward):
+            neighbor = self.path_grid[games, start + np.clip(position + step, 0, last)]
+            kind, neighbor_team = self._unit_info(games, neighbor)
+            hit = ((kind == MERCENARY) & (neighbor_team != team)) | (kind == DEMON)
+            np.add.at(self.unit_health, (games[hit], neighbor[hit]), -damage[hit])
+            np.add.at(self.stats, (games[hit], team[hit], DAMAGE_DEALT), damage[hit])
+
+    def _shoot_all_targets(self, games, slot):
+        units = self._units_in_range(games, MINIGUN, self.tower_cell[games, slot])
+        team = self.tower_team[games, slot]
+        hit = self._targetable(games, units, team)
+        hit_games = np.repeat(games, hit.sum(axis=1))
+        np.add.at(self.unit_health, (hit_games, units[hit]), -Constants.MINIGUN_DAMAGE)
+        np.add.at(self.stats, (hit_games, np.repeat(team, hit.sum(axis=1)), DAMAGE_DEALT), Constants.MINIGUN_DAMAGE)
+        # The reference resets the cooldown on seeing anything in range
+        self.tower_cooldown[games[(units != NO_UNIT).any(axis=1)], slot] = Constants.MINIGUN_MAX_COOLDOWN
+
+    def _buff_mercenaries(self, games, slot):
+        units = self._units_in_range(games, CHURCH, self.tower_cell[games, slot])
+        rows = games[:, None]
+        slots = np.maximum(units, 0)
+        kind, team = self._unit_info(rows, units)
+        buffed = (kind == MERCENARY) & (team == self.tower_team[games, slot][:, None]) & (self.unit_state[rows, slots] != DEAD)
+        buffed_games = np.repeat(games, buffed.sum(axis=1))
+        np.add.at(self.unit_health, (buffed_games, units[buffed]), Constants.CHURCH_BUFF_HEALTH)
+        np.add.at(self.unit_attack, (buffed_games, units[buffed]), Constants.CHURCH_BUFF_DAMAGE)
+        self.tower_cooldown[games[buffed.any(axis=1)], slot] = Constants.CHURCH_MAX_COOLDOWN
+
+
+    # --- Win conditions ---
+
+    # Same rules as WorldUpdatePhase.check_wincon. Returns which games just ended.
+    def _check_wincon(self, games: np.ndarray) -> np.ndarray:
+        health_r, health_b = self.base_health[:, RED], self.base_health[:, BLUE]
+        ended = games & ((health_r <= 0) | (health_b <= 0))
+        if not ended.any():
+            return ended
+
+        self._decide(ended & (health_b <= 0) & (health_r > 0), VICTORY_R, VICTORY_REASONS.index("Blue base destroyed!"))
+        self._decide(ended & (health_r <= 0) & (health_b > 0), VICTORY_B, VICTORY_REASONS.index("Red base destroyed!"))
+
+        # Both bases destroyed: break the tie on money, then towers, tower value, mercenaries and their health.
+        # Mercenaries killed this turn still count.
+        tied = np.flatnonzero(ended & (health_r <= 0) & (health_b <= 0))
+        if len(tied):
+            used = self.units_in_use
+            mercs = self.unit_listed[tied, :used] & (self.unit_kind[tied, :used] == MERCENARY)
+            tower_type = self.tower_type[tied]
+            towers = tower_type >= 0
+            tower_value = np.where(towers, TOWER_BASE_PRICES[np.maximum(tower_type, 0)], 0)
+
+            def tie_breaks(team: int) -> tuple:
+                own_mercs = mercs & (self.unit_team[tied, :used] == team)
+                own_towers = towers & (self.tower_team[tied] == team)
+                return (
+                    self.money[tied, team],
+                    own_towers.sum(axis=1),
+                    np.where(own_towers, tower_value, 0).sum(axis=1),
+                    own_mercs.sum(axis=1),
+                    np.where(own_mercs, self.unit_health[tied, :used], 0).sum(axis=1)
+                )
+
+            # VICTORY_REASONS lists the tie-breaks in this order, Red's reason then Blue's
+            undecided = np.ones(len(tied), dtype=bool)
+            for tie_break, (red, blue) in enumerate(zip(tie_breaks(RED), tie_breaks(BLUE))):
+                red_reason = VICTORY_REASONS.index("Tie broken: Red has more money.") + 2 * tie_break
+                self._decide(tied[undecided & (red > blue)], VICTORY_R, red_reason)
+                self._decide(tied[undecided & (blue > red)], VICTORY_B, red_reason + 1)
+                undecided &= red == blue
+            self.victory[tied[undecided]] = VICTORY_TIE
+        return ended
+
+    def _decide(self, games: np.ndarray, victory: int, reason: int):
+        self.victory[games] = victory
+        self.victory_reason[games] = reason
+
+
+    # --- Output ---
+
+    def team_stats(self, game: int, team: int) -> TeamStats:
+        stats = TeamStats()
+        for slot in range(self.tower_count[game]):
+            if self.tower_team[game, slot] == team:
+                tower_type = self.tower_type[game, slot]
+                stats.towers[TOWER_TYPES[tower_type]] += 1
+                stats.tower_count += 1
+                stats.tower_value += int(TOWER_BASE_PRICES[tower_type])
+        for unit in np.flatnonzero(self.unit_listed[game] & (self.unit_kind[game] == MERCENARY) & (self.unit_team[game] == team)):
+            health = int(self.unit_health[game, unit])
+            if self.unit_state[game, unit] == DEAD:
+                stats.mercs_dying += 1
+                stats.dying_merc_health += health
+            else:
+                stats.mercs_alive += 1
+                stats.merc_health += health
+        totals = self.stats[game, team]
+        stats.money_spent = int(totals[MONEY_SPENT])
+        stats.money_refunded = int(totals[MONEY_REFUNDED])
+        stats.income = int(totals[INCOME])
+        stats.mercs_spawned = int(totals[MERCS_SPAWNED])
+        stats.mercs_lost = int(totals[MERCS_LOST])
+        stats.damage_dealt = int(totals[DAMAGE_DEALT])
+        stats.base_damage_dealt = int(totals[BASE_DAMAGE_DEALT])
+        return stats
+
+    # One game's state, laid out like Game.game_state_to_dict. Entity names are made up from unit slots and
+    # tower positions, and tower Targets are always empty.
+    def game_state_dict(self, game: int) -> dict:
+        map_data = self.map_data
+        width = map_data.width
+        entity_grid = [[''] * width for _ in range(map_data.height)]
+
+        towers = []
+        for slot in range(self.tower_count[game]):
+            tower_type = TOWER_TYPES[self.tower_type[game, slot]]
+            y, x = divmod(int(self.tower_cell[game, slot]), width)
+            name = f"{tower_type} {x},{y}"
+            entity_grid[y][x] = name
+            towers.append({
+                "Name" : name,
+                "Type" : tower_type,
+                "Team" : TEAMS[self.tower_team[game, slot]],
+                "x" : x,
+                "y" : y,
+                "Targets" : [],
+                "Cooldown" : int(self.tower_cooldown[game, slot]),
+            })
+
+        def unit_name(unit: int) -> str:
+            return f"{'Mercenary' if self.unit_kind[game, unit] == MERCENARY else 'Demon'} {self.unit_order[game, unit]}"
+
+        grid_only_demons = []
+        for tile in np.flatnonzero(self.path_grid[game] != NO_UNIT):
+            unit = self.path_grid[game, tile]
+            x, y = int(self.tile_x[tile]), int(self.tile_y[tile])
+            entity_grid[y][x] = unit_name(unit)
+            if self.unit_kind[game, unit] == DEMON and not self.unit_listed[game, unit]:
+                # A demon wiped out by both teams provoking (see Game.game_state_to_dict)
+                grid_only_demons.append((y * width + x, {
+                    "Name" : unit_name(unit),
+                    "Team" : TEAMS[self.unit_team[game, unit]],
+                    "x" : x,
+                    "y" : y,
+                    "Health" : int(self.unit_health[game, unit]),
+                    "Damage" : int(self.unit_attack[game, unit])
+                }))
+
+        units = {MERCENARY: [], DEMON: []}
+        listed = np.flatnonzero(self.unit_listed[game])
+        for unit in listed[np.argsort(self.unit_order[game, listed])]:
+            tile = self.lane_start[self.unit_lane[game, unit]] + self.unit_position[game, unit]
+            units[self.unit_kind[game, unit]].append({
+                "Name" : unit_name(unit),
+                "Team" : TEAMS[self.unit_team[game, unit]],
+                "x" : int(self.tile_x[tile]),
+                "y" : int(self.tile_y[tile]),
+                "Health" : int(self.unit_health[game, unit]),
+                "Damage" : int(self.unit_attack[game, unit]),
+                "State" : UNIT_STATES[self.unit_state[game, unit]]
+            })
+
+        spawners = []
+        for spawner, (x, y, _) in enumerate(map_data.demon_spawners):
+            spawners.append({
+                "x" : x,
+                "y" : y,
+                "Target" : TEAMS[self.spawner_target[game, spawner]],
+                "ReloadTime" : int(self.spawner_reload[game, spawner]),
+                "MaxReloadTime" : Constants.DEMON_SPAWNER_RELOAD_TURNS,
+                "Queued" : int(self.spawner_queued[game, spawner]),
+                "ActivationCount" : int(self.spawner_activations[game, spawner]),
+            })
+
+        def player_base(team: int) -> dict:
+            x, y = (map_data.player_base_r_location, map_data.player_base_b_location)[team]
+            queued = self.queued_mercs[game, team]
+            return {
+                "Team" : TEAMS[team],
+                "Health" : int(self.base_health[game, team]),
+                "Money" : int(self.money[game, team]),
+                "x" : x,
+                "y" : y,
+                "QueuedMercenaries" : {
+                    "Up" : int(queued[0]),
+                    "Down" : int(queued[1]),
+                    "Left" : int(queued[2]),
+                    "Right" : int(queued[3])
+                }
+            }
+
+        def tower_prices(team: int) -> dict:
+            return {tower_type: int(self.tower_prices[game, team, index]) for index, tower_type in enumerate(TOWER_TYPES)}
+
+        return {
+            "TeamNameR": "",
+            "TeamNameB": "",
+            "Victory" : VICTORY_NAMES[self.victory[game]],
+            "VictoryReason" : VICTORY_REASONS[self.victory_reason[game]],
+            "TurnsRemaining" : int(self.turns_remaining[game]),
+            "CurrentTurn" : Constants.MAX_TURNS - int(self.turns_remaining[game]),
+
+            "PlayerBaseR" : player_base(RED),
+            "PlayerBaseB" : player_base(BLUE),
+            "RedTeamMoney" : int(self.money[game, RED]),
+            "BlueTeamMoney" : int(self.money[game, BLUE]),
+
+            "FloorTiles" : list(map_data.floor_tiles),
+            "EntityGrid" : entity_grid,
+            "Towers" : towers,
+            "Mercenaries" : units[MERCENARY],
+            "Demons" : units[DEMON],
+            **({"GridOnlyDemons" : [dem_dict for _, dem_dict in sorted(grid_only_demons, key=lambda item: item[0])]} if grid_only_demons else {}),
+            "DemonSpawners" : spawners,
+
+            "TowerPricesR" : tower_prices(RED),
+            "TowerPricesB" : tower_prices(BLUE),
+
+            "TeamStatsR" : self.team_stats(game, RED).to_dict(),
+            "TeamStatsB" : self.team_stats(game, BLUE).to_dict()
+        }
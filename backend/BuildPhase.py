@@ -51,7 +51,7 @@ def _build_tower(game_state: GameState, action: AIAction, is_red_player: bool) -
         log_msg(f"{player_name} player tried to build outside their territory at ({x}, {y})")
         return
     
-    if game_state.entity_grid[y][x] is not None:
+    if game_state.entity_grid.get(x, y) is not None:
         log_msg(f"{player_name} player tried to build on occupied space at ({x}, {y})")
         return
     
@@ -66,7 +66,8 @@ def _build_tower(game_state: GameState, action: AIAction, is_red_player: bool) -
     
     # Build the tower
     game_state.towers.append(tower)
-    game_state.entity_grid[y][x] = tower
+    game_state.entity_grid.set(x, y, tower)
+    game_state.record_tower_built(tower, tower.get_price(game_state, current_team))
     
     # Deduct money
     if is_red_player:
@@ -96,7 +97,7 @@ def _destroy_tower(game_state: GameState, action: AIAction, is_red_player: bool)
         log_msg(f"{player_name} player tried to destroy tower outside their territory at ({x}, {y})")
         return
     
-    tower = game_state.entity_grid[y][x]
+    tower = game_state.entity_grid.get(x, y)
     if tower is None:
         log_msg(f"{player_name} player tried to destroy tower at empty location ({x}, {y})")
         return
@@ -106,20 +107,11 @@ def _destroy_tower(game_state: GameState, action: AIAction, is_red_player: bool)
         return
     
     # Destroy the tower
-    refund = 0
-    if isinstance(tower, Cannon):
-        refund = Constants.CANNON_BASE_PRICE
-    elif isinstance(tower, Crossbow):
-        refund = Constants.CROSSBOW_BASE_PRICE
-    elif isinstance(tower, Minigun):
-        refund = Constants.MINIGUN_BASE_PRICE
-    elif isinstance(tower, House):
-        refund = Constants.HOUSE_BASE_PRICE
-    elif isinstance(tower, Church):
-        refund = Constants.CHURCH_BASE_PRICE
+    refund = tower.base_price
 
     game_state.towers.remove(tower)
-    game_state.entity_grid[y][x] = None
+    game_state.entity_grid.clear(x, y)
+    game_state.record_tower_destroyed(tower, refund)
     
     # Refund money
     if is_red_player:
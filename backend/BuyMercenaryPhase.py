@@ -74,5 +74,6 @@ def _process_mercenary_purchase(game_state: GameState, action: AIAction, is_red_
         game_state.money_r -= Constants.MERCENARY_PRICE
     else:
         game_state.money_b -= Constants.MERCENARY_PRICE
+    game_state.record_spend('r' if is_red_player else 'b', Constants.MERCENARY_PRICE)
     
     log_msg(f"{player_name} queued a mercenary in direction {action.merc_direction}")
\ No newline at end of file
@@ -1,10 +1,12 @@
 import Constants
 from Tower import Tower
 from GameState import GameState
-from NameSelector import select_tower_name
 from Utils import get_increased_tower_price
 
 class Cannon(Tower):
+    type_name = "Cannon"
+    base_price = Constants.CANNON_BASE_PRICE
+
     def __init__(self, x: int, y: int, team_color: str, game_state: GameState) -> None:
         super().__init__(
             x, y,
@@ -17,7 +19,7 @@ class Cannon(Tower):
 
         self.radius = 2 # Cannon shots have a splash radius, this variable shows that
         
-        self.name = select_tower_name('CA', self.team)
+        self.name = game_state.names.select_tower_name('CA', self.team)
 
     def get_price(self, game_state: GameState, team_color: str):
         return (game_state.cannon_price_r if team_color == "r" else game_state.cannon_price_b)
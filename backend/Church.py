@@ -1,10 +1,12 @@
 import Constants
 from Tower import Tower
 from GameState import GameState
-from NameSelector import select_tower_name
 from Utils import log_msg, get_increased_tower_price
 
 class Church(Tower):
+    type_name = "Church"
+    base_price = Constants.CHURCH_BASE_PRICE
+
     def __init__(self, x: int, y: int, team_color: str, game_state: GameState):
         super().__init__(
             x, y,
@@ -16,7 +18,7 @@ class Church(Tower):
         )
 
         self.angle = 0
-        self.name = select_tower_name('CH', self.team)
+        self.name = game_state.names.select_tower_name('CH', self.team)
 
     def get_price(self, game_state: GameState, team_color: str):
         return (game_state.church_price_r if team_color == "r" else game_state.church_price_b)
@@ -0,0 +1,136 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from Utils import log_msg
+
+# The binary form of a map that MapCompiler.py writes next to the map's JSON file (map0.json -> map0.mapc), holding
+# everything the engine would otherwise work out from the JSON: lanes, which lane each tile is on, the path tiles
+# every tower range covers from every tile, buildable tiles and the lane of each demon spawner.
+# MapCache loads it instead of tracing the lanes itself whenever it's there and was compiled from the JSON as it
+# is now (the file holds the JSON's SHA-256). A stale or unreadable file is ignored, with a note in the log.
+#
+# Layout, little-endian: a header, a directory of sections, then the sections. Every section is an array of
+# int32, starting on an 8 byte boundary, so it can be used straight from the memory-mapped file. Tiles are
+# numbered y * width + x ("cells").
+#
+#   lane_start, lane_length      - per lane in LANE_NAMES order: where its cells start in lane_tiles (-1 if the
+#                                  map has no such lane) and how many there are
+#   lane_tiles                   - each lane's cells in order, from Red's base to Blue's, one lane after another
+#   tile_lane, tile_position     - per cell: the lane the tile is on (MapData.lane_of_tile) and where on it, or -1
+#   buildable_r, buildable_b     - the cells each team can build on, row by row
+#   cover<range>_start           - per tower range: where each cell's covered path tiles start in
+#   cover<range>_tiles             cover<range>_tiles (width * height + 1 offsets), and those path tiles, in the
+#                                  order MapData.paths_in_range gives them
+#   spawner_lane                 - per demon spawner: the lane of its tile, or -1
+
+MAGIC = b'MMCMAP\0\0'
+FORMAT_VERSION = 1
+# magic, format version, width, height, number of sections, SHA-256 of the map JSON file
+HEADER = struct.Struct('<8sIIII32s')
+# name, offset in the file, number of int32 values
+SECTION = struct.Struct('<16sQQ')
+
+LANE_NAMES = ("up", "down", "left", "right")
+
+
+def compiled_path_for(map_json_file_path: str) -> str:
+    return os.path.splitext(map_json_file_path)[0] + '.mapc'
+
+
+def map_digest(map_json_bytes: bytes) -> bytes:
+    return hashlib.sha256(map_json_bytes).digest()
+
+
+# sections: name -> list or array of ints
+def write_compiled_map(path: str, width: int, height: int, digest: bytes, sections: dict):
+    arrays = {}
+    for name, values in sections.items():
+        values = array('i', values)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        arrays[name] = values
+
+    offset = HEADER.size + SECTION.size * len(arrays)
+    directory = []
+    for name, values in arrays.items():
+        offset = -(-offset // 8) * 8
+        directory.append((name, offset, len(values)))
+        offset += len(values) * values.itemsize
+
+    # Written to a temporary file first, so a reader never maps half a file
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, width, height, len(arrays), digest))
+        for name, offset, count in directory:
+            f.write(SECTION.pack(name.encode('ascii'), offset, count))
+        for (name, offset, count) in directory:
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(arrays[name].tobytes())
+    os.replace(temp_path, path)
+
+
+class CompiledMap:
+    # Raises ValueError if the file isn't a compiled map of a JSON file with this digest
+    def __init__(self, path: str, expected_digest: bytes = None):
+        if sys.byteorder != 'little':
+            raise ValueError('Compiled maps can only be memory-mapped on little-endian machines')
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < HEADER.size:
+            raise ValueError(f'{path} is too short to be a compiled map')
+        magic, version, self.width, self.height, section_count, self.digest = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} compiled map')
+        if expected_digest is not None and self.digest != expected_digest:
+            raise ValueError(f'{path} was compiled from a different version of the map')
+
+        view = memoryview(self.buffer)
+        self.sections = {}
+        for i in range(section_count):
+            name, offset, count = SECTION.unpack_from(self.buffer, HEADER.size + i * SECTION.size)
+            if offset + count * 4 > len(self.buffer):
+                raise ValueError(f'{path} is truncated')
+            self.sections[name.rstrip(b'\0').decode('ascii')] = view[offset:offset + count * 4].cast('i')
+
+    def __getitem__(self, name: str) -> memoryview:
+        return self.sections[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def tile(self, cell: int) -> tuple:
+        return (cell % self.width, cell // self.width)
+
+    # Lane by name, as a tuple of (x, y) like MapData's mercenary paths, or None
+    def lane(self, lane_name: str) -> tuple:
+        lane = LANE_NAMES.index(lane_name)
+        start = self['lane_start'][lane]
+        if start < 0:
+            return None
+        return tuple(self.tile(cell) for cell in self['lane_tiles'][start:start + self['lane_length'][lane]])
+
+    def buildable_tiles(self, team_color: str) -> tuple:
+        return tuple(self.tile(cell) for cell in self[f'buildable_{team_color}'])
+
+    # Path tiles a tower of this range covers from (x, y), or None if the file has no table for the range
+    def paths_in_range(self, x: int, y: int, tower_range: int) -> tuple:
+        if f'cover{tower_range}_start' not in self.sections:
+            return None
+        cell = y * self.width + x
+        starts = self[f'cover{tower_range}_start']
+        return tuple(self.tile(covered) for covered in self[f'cover{tower_range}_tiles'][starts[cell]:starts[cell + 1]])
+
+
+# The compiled form of a map, if there is an up to date one next to its JSON file
+def open_compiled_map(map_json_file_path: str, map_json_bytes: bytes) -> CompiledMap:
+    path = compiled_path_for(map_json_file_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        return CompiledMap(path, map_digest(map_json_bytes))
+    except (OSError, ValueError) as e:
+        log_msg(f'Ignoring compiled map {path}: {e}')
+        return None
@@ -1,10 +1,12 @@
 import Constants
 from Tower import Tower
 from GameState import GameState
-from NameSelector import select_tower_name
 from Utils import get_increased_tower_price
 
 class Crossbow(Tower):
+    type_name = "Crossbow"
+    base_price = Constants.CROSSBOW_BASE_PRICE
+
     def __init__(self, x: int, y: int, team_color: str, game_state: GameState):
         super().__init__(
             x, y,
@@ -23,7 +25,7 @@ class Crossbow(Tower):
             game_state.crossbow_price_r = get_increased_tower_price(game_state.crossbow_price_r, Constants.TOWER_PRICE_PERCENT_INCREASE_PER_BUY)
         else:
             game_state.crossbow_price_b = get_increased_tower_price(game_state.crossbow_price_b, Constants.TOWER_PRICE_PERCENT_INCREASE_PER_BUY)
-        self.name = select_tower_name('CR', self.team)
+        self.name = game_state.names.select_tower_name('CR', self.team)
     
     def tower_activation(self, game_state: GameState):
         super().shoot_single_priority_target(game_state)
\ No newline at end of file
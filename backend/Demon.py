@@ -2,7 +2,6 @@ import Constants
 from Entity import Entity
 from GameState import GameState
 from PlayerBase import PlayerBase
-from NameSelector import select_demon_name
 import Utils
 
 
@@ -14,21 +13,10 @@ class Demon:
         self.y = y
         self.target_team = target_team
         self.state = 'moving'
-        self.name = select_demon_name()
+        self.name = game_state.names.select_demon_name()
 
-        self.current_path = []
-        possible_paths = [
-            game_state.mercenary_path_down, 
-            game_state.mercenary_path_left,
-            game_state.mercenary_path_right,
-            game_state.mercenary_path_up
-        ]
-        # Assumes no overlapping paths. If merc is on any path tile in path, we are on that path
-        for path in possible_paths:
-            if path == None: #<- in case there aren't 4 paths, it will skip iterating over a none value (which cases an error)
-                continue 
-            if (self.x, self.y) in path:
-                self.current_path = path
+        # The lane this entity is on, looked up in the table the map precomputed for its path tiles
+        self.current_path = game_state.map_data.lane_of_tile.get((self.x, self.y), [])
                 
     # Helper function do find what path this merc is on. 
     def get_current_path(self):
@@ -48,7 +36,7 @@ class Demon:
     
     def block_entity_behind(self, game_state: GameState):
         behind_pos = self.get_adjacent_path_tile(game_state, -1)
-        behind_entity = game_state.entity_grid[behind_pos[1]][behind_pos[0]]
+        behind_entity = game_state.entity_grid.get(behind_pos[0], behind_pos[1])
         # base case: we are in the first tile in our path, do not recurse
         if self.x == behind_pos[0] and self.y == behind_pos[1]:
             return
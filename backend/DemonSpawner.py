@@ -5,6 +5,10 @@ class DemonSpawner:
         self.x = x
         self.y = y
         self.reload_time_max = Constants.DEMON_SPAWNER_RELOAD_TURNS
+        self.reset(target_team)
+
+    # Back to how the map starts it, for GameState.reset
+    def reset(self, target_team: str):
         self.reload_time_left = self.reload_time_max
         self.target_team = target_team
         self.activation_count = 0
@@ -0,0 +1,391 @@
+import argparse
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import Constants
+import Utils
+from AIAction import AIAction
+from Game import Game, game_state_to_dict
+from MapCache import load_map
+from NameSelector import NameSelector
+
+# Differential testing: play the same action sequences through the reference engine (Game.py) and a
+# candidate engine, and check that the two agree on the whole game state after every turn.
+# Anything that tries to make turns faster (cached paths, batched engines, clones) must pass this first.
+#
+#   python DifferentialTest.py --candidate batched                       (random games on every map)
+#   python DifferentialTest.py --candidate forward --games 50 --maps ../maps/map3.json
+#   python DifferentialTest.py --candidate batched --replay match.json   (actions recorded by main.py --record)
+#   python DifferentialTest.py --candidate my_engine.py:MyEngine
+#
+# A candidate is a class made with (map file, seed), with run_turn(action_r, action_b) and state_dict()
+# like the engines below. Random tie-breaks must come from random.Random(seed), as they do in ReferenceEngine.
+#
+# States are compared by a hash of their canonical form (canonical_state), which leaves out what
+# no rule depends on: entity names, team names and the Targets towers show the visualizer.
+# When they differ, the action sequence is shrunk to a short one that still makes them differ, and
+# saved (with the seed and the differences) in the same format main.py --record writes, so it can be replayed.
+
+
+# --- Engines ---
+
+class ReferenceEngine:
+    # Game.py itself, with its own random generator and name counters instead of the process-wide ones
+    def __init__(self, map_path: str, seed: int):
+        self.game = Game(map_path)
+        self.game.game_state.rng = random.Random(seed)
+        self.game.game_state.names = NameSelector()
+
+    def run_turn(self, action_r: AIAction, action_b: AIAction):
+        self.game.run_turn(action_r, action_b)
+
+    def state_dict(self) -> dict:
+        return game_state_to_dict(self.game.game_state)
+
+
+class ForwardModelEngine:
+    # Plays every turn with ForwardModel.next_state, so each turn runs on a fresh clone of the last state
+    def __init__(self, map_path: str, seed: int):
+        self.state = ReferenceEngine(map_path, seed).game.game_state
+        self.rng = self.state.rng
+
+    def run_turn(self, action_r: AIAction, action_b: AIAction):
+        from ForwardModel import next_state
+        self.state = next_state(self.state, action_r, action_b, self.rng)
+
+    def state_dict(self) -> dict:
+        return game_state_to_dict(self.state)
+
+
+class RoundTripEngine:
+    # Rebuilds the state from its dict every turn (ForwardModel.state_from_dict), like a search agent would
+    def __init__(self, map_path: str, seed: int):
+        reference = ReferenceEngine(map_path, seed)
+        self.data = reference.state_dict()
+        self.rng = reference.game.game_state.rng
+
+    def run_turn(self, action_r: AIAction, action_b: AIAction):
+        from ForwardModel import next_state, state_from_dict, state_to_dict
+        self.data = state_to_dict(next_state(state_from_dict(self.data), action_r, action_b, self.rng))
+
+    def state_dict(self) -> dict:
+        return self.data
+
+
+class BatchedCandidate:
+    # One game in a BatchedEngine (needs NumPy)
+    def __init__(self, map_path: str, seed: int):
+        from BatchedEngine import BatchedEngine
+        self.engine = BatchedEngine(map_path, 1, rngs=[random.Random(seed)])
+
+    def run_turn(self, action_r: AIAction, action_b: AIAction):
+        self.engine.step([action_r], [action_b])
+
+    def state_dict(self) -> dict:
+        return self.engine.game_state_dict(0)
+
+
+CANDIDATES = {
+    "reference": ReferenceEngine,
+    "forward": ForwardModelEngine,
+    "roundtrip": RoundTripEngine,
+    "batched": BatchedCandidate,
+}
+
+
+# A name from CANDIDATES, or FILE.py:CLASS for an engine of your own
+def load_candidate(spec: str):
+    if spec in CANDIDATES:
+        return CANDIDATES[spec]
+    if ':' not in spec:
+        raise ValueError(f"Unknown candidate '{spec}': use one of {', '.join(CANDIDATES)} or FILE.py:CLASS")
+    file_path, class_name = spec.rsplit(':', 1)
+    module_spec = importlib.util.spec_from_file_location("differential_test_candidate", file_path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+
+# --- Comparing states ---
+
+# The state with everything no rule depends on left out: names (the entity grid keeps which cells are
+# taken), team names and tower Targets
+def canonical_state(state_dict: dict) -> dict:
+    canonical = {key: value for key, value in state_dict.items() if key not in ("TeamNameR", "TeamNameB", "EntityGrid")}
+    canonical["EntityGrid"] = [''.join('x' if name else '.' for name in row) for row in state_dict["EntityGrid"]]
+    for key, dropped in (("Towers", ("Name", "Targets")), ("Mercenaries", ("Name",)), ("Demons", ("Name",)), ("GridOnlyDemons", ("Name",))):
+        if key not in state_dict:
+            continue
+        canonical[key] = [
+            {field: value for field, value in entity.items() if field not in dropped}
+            for entity in state_dict[key]
+        ]
+    return canonical
+
+
+def state_hash(state_dict: dict) -> str:
+    canonical = json.dumps(canonical_state(state_dict), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+# Where two canonical states differ, as (path, reference value, candidate value), at most `limit` of them
+def state_differences(reference: dict, candidate: dict, limit: int = 10) -> list:
+    differences = []
+
+    def walk(path: str, a, b):
+        if len(differences) >= limit or a == b:
+            return
+        if isinstance(a, dict) and isinstance(b, dict):
+            for key in sorted(set(a) | set(b), key=str):
+                walk(f"{path}.{key}" if path else str(key), a.get(key), b.get(key))
+        elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+            for index, (item_a, item_b) in enumerate(zip(a, b)):
+                walk(f"{path}[{index}]", item_a, item_b)
+        else:
+            differences.append((path, a, b))
+
+    walk("", canonical_state(reference), canonical_state(candidate))
+    return differences
+
+
+# --- Running ---
+
+class Mismatch:
+    def __init__(self, turn: int, differences: list, error: str = ""):
+        # Turns played when the states first differed (0 is the initial state)
+        self.turn = turn
+        self.differences = differences
+        # What the candidate raised, if it crashed instead
+        self.error = error
+
+
+# Play the actions through both engines, comparing after every turn. Returns the first Mismatch, or None.
+def first_mismatch(map_path: str, seed: int, actions: list, candidate_class) -> Mismatch:
+    reference = ReferenceEngine(map_path, seed)
+    try:
+        candidate = candidate_class(map_path, seed)
+    except Exception as e:
+        return Mismatch(0, [], f"{type(e).__name__}: {e}")
+
+    turn = 0
+    while True:
+        expected = reference.state_dict()
+        try:
+            got = candidate.state_dict()
+        except Exception as e:
+            return Mismatch(turn, [], f"{type(e).__name__}: {e}")
+        if state_hash(expected) != state_hash(got):
+            return Mismatch(turn, state_differences(expected, got))
+
+        if turn == len(actions) or reference.game.game_state.is_game_over():
+            return None
+        action_r, action_b = actions[turn]
+        reference.run_turn(action_r, action_b)
+        try:
+            candidate.run_turn(action_r, action_b)
+        except Exception as e:
+            return Mismatch(turn + 1, [], f"{type(e).__name__}: {e}")
+        turn += 1
+
+
+NOTHING = AIAction("nothing", 0, 0)
+
+
+def _is_nothing(action: AIAction) -> bool:
+    return action.action not in ("build", "destroy") and not action.merc_direction and not action.provoke_demons
+
+
+# Simpler versions of an action to try in its place, simplest first
+def _simpler_actions(action: AIAction) -> list:
+    simpler = [NOTHING]
+    if action.merc_direction or action.provoke_demons:
+        simpler.append(AIAction(action.action, action.x, action.y, action.tower_type))
+    if action.provoke_demons:
+        simpler.append(AIAction(action.action, action.x, action.y, action.tower_type, action.merc_direction))
+    if action.merc_direction and action.action in ("build", "destroy"):
+        simpler.append(AIAction("nothing", 0, 0, "", action.merc_direction, action.provoke_demons))
+    return simpler
+
+
+# Shrink an action sequence that makes the engines differ to a shorter, simpler one that still does:
+# cut it off at the first mismatch, blank out ever smaller runs of turns, then simplify single actions
+def shrink(map_path: str, seed: int, actions: list, candidate_class) -> tuple:
+    mismatch = first_mismatch(map_path, seed, actions, candidate_class)
+    if mismatch is None:
+        return actions, None
+    actions = list(actions[:mismatch.turn])
+
+    def attempt(trial: list) -> bool:
+        nonlocal actions, mismatch
+        trial_mismatch = first_mismatch(map_path, seed, trial, candidate_class)
+        if trial_mismatch is None:
+            return False
+        actions, mismatch = trial[:trial_mismatch.turn], trial_mismatch
+        return True
+
+    chunk = max(1, len(actions) // 2)
+    while True:
+        start = 0
+        while start < len(actions):
+            end = min(start + chunk, len(actions))
+            if all(_is_nothing(action) for pair in actions[start:end] for action in pair) or \
+                    not attempt(actions[:start] + [(NOTHING, NOTHING)] * (end - start) + actions[end:]):
+                start += chunk
+        if chunk == 1:
+            break
+        chunk //= 2
+
+    for turn in range(len(actions)):
+        for team in (0, 1):
+            if turn >= len(actions) or _is_nothing(actions[turn][team]):
+                continue
+            for simpler in _simpler_actions(actions[turn][team]):
+                pair = list(actions[turn])
+                pair[team] = simpler
+                if attempt(actions[:turn] + [tuple(pair)] + actions[turn + 1:]):
+                    break
+
+    return actions, mismatch
+
+
+# --- Action sequences ---
+
+# Random action sequences, a whole game's worth. Each seed favours a different mix of moves, and some
+# actions are deliberately invalid (other team's tiles, off the map, unknown tower types).
+RANDOM_STYLES = (
+    {"mercenary": 0.2, "provoke": 0.02, "build": 0.45, "destroy": 0.1, "towers": ("crossbow", "cannon", "minigun", "house", "church", "tower")},
+    {"mercenary": 0.4, "provoke": 0.15, "build": 0.3, "destroy": 0.05, "towers": ("cannon", "church", "minigun")},
+    {"mercenary": 0.05, "provoke": 0.0, "build": 0.6, "destroy": 0.0, "towers": ("house", "crossbow", "cannon")},
+    {"mercenary": 0.1, "provoke": 0.05, "build": 0.2, "destroy": 0.2, "towers": ("crossbow", "minigun")},
+)
+
+
+def random_actions(map_path: str, seed: int, turns: int = None) -> list:
+    map_data = load_map(map_path)
+    rng = random.Random(seed)
+    style = RANDOM_STYLES[seed % len(RANDOM_STYLES)]
+    buildable = {
+        team: [(x, y) for y, row in enumerate(map_data.floor_tiles) for x, tile in enumerate(row) if tile == team]
+        for team in ('r', 'b')
+    }
+    # Towers next to a lane actually get to shoot
+    near_lanes = {team: [(x, y) for x, y in tiles if map_data.paths_in_range(x, y, 1)] for team, tiles in buildable.items()}
+
+    def random_action(team: str) -> AIAction:
+        direction = rng.choice(("N", "S", "E", "W", "X")) if rng.random() < style["mercenary"] else ""
+        provoke = rng.random() < style["provoke"]
+        roll = rng.random()
+        if roll < style["build"] + style["destroy"]:
+            tiles_roll = rng.random()
+            if tiles_roll < 0.6:
+                x, y = rng.choice(near_lanes[team] or buildable[team] or [(0, 0)])
+            elif tiles_roll < 0.9:
+                x, y = rng.choice(buildable[team] or [(0, 0)])
+            else:
+                x, y = rng.randrange(-1, map_data.width + 1), rng.randrange(-1, map_data.height + 1)
+            if roll < style["build"]:
+                return AIAction("build", x, y, rng.choice(style["towers"]), direction, provoke)
+            return AIAction("destroy", x, y, "", direction, provoke)
+        return AIAction("nothing", 0, 0, "", direction, provoke)
+
+    return [(random_action('r'), random_action('b')) for _ in range(turns or Constants.MAX_TURNS)]
+
+
+def save_actions(file_path: str, map_path: str, seed: int, actions: list, extra: dict = None):
+    data = {
+        "Map": map_path,
+        "Seed": seed,
+        "Actions": [[action_r.to_dict(), action_b.to_dict()] for action_r, action_b in actions]
+    }
+    data.update(extra or {})
+    with open(file_path, 'w') as f:
+        json.dump(data, f, indent=1)
+
+
+# Returns (map path, seed, actions) from a file written by save_actions or main.py --record
+def load_actions(file_path: str) -> tuple:
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    actions = [(AIAction.from_dict(pair[0]), AIAction.from_dict(pair[1])) for pair in data["Actions"]]
+    return data["Map"], data["Seed"], actions
+
+
+# --- Command line ---
+
+def _describe(mismatch: Mismatch) -> str:
+    if mismatch.error:
+        return f"candidate raised {mismatch.error}"
+    return "; ".join(f"{path}: reference {a!r}, candidate {b!r}" for path, a, b in mismatch.differences[:3])
+
+
+def _report(map_path: str, seed: int, actions: list, candidate_class, candidate_name: str, out_dir: str, do_shrink: bool) -> str:
+    if do_shrink:
+        actions, mismatch = shrink(map_path, seed, actions, candidate_class)
+    else:
+        mismatch = first_mismatch(map_path, seed, actions, candidate_class)
+        actions = actions[:mismatch.turn]
+
+    os.makedirs(out_dir, exist_ok=True)
+    file_path = os.path.join(out_dir, f"mismatch_{os.path.splitext(os.path.basename(map_path))[0]}_{seed}.json")
+    save_actions(file_path, map_path, seed, actions, {
+        "Candidate": candidate_name,
+        "MismatchTurn": mismatch.turn,
+        "Error": mismatch.error,
+        "Differences": [[path, a, b] for path, a, b in mismatch.differences]
+    })
+
+    print(f"  first mismatch after turn {mismatch.turn}: {_describe(mismatch)}")
+    moves = [(turn, team, action) for turn, pair in enumerate(actions) for team, action in zip("rb", pair) if not _is_nothing(action)]
+    print(f"  reproduced in {len(actions)} turns with {len(moves)} actions (the rest do nothing), saved to {file_path}")
+    for turn, team, action in moves[:20]:
+        print(f"    turn {turn} {team}: {action.to_json()}")
+    return file_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a candidate engine plays exactly like the reference engine.")
+    parser.add_argument("--candidate", default="batched", help=f"One of {', '.join(CANDIDATES)}, or FILE.py:CLASS")
+    parser.add_argument("--maps", nargs="+", help="Map files (default: every map in ../maps)")
+    parser.add_argument("--games", type=int, default=20, help="Random games per map")
+    parser.add_argument("--seed", type=int, default=0, help="First seed; game i uses seed + i")
+    parser.add_argument("--replay", nargs="+", help="Play these recorded action files instead of random games")
+    parser.add_argument("--out", default=os.path.join(tempfile.gettempdir(), "megaminer_mismatches"),
+                        help="Directory for the reproductions of mismatches (default: megaminer_mismatches in the temp directory)")
+    parser.add_argument("--no_shrink", action="store_true", help="Save the whole sequence up to the mismatch, without shrinking it")
+    args = parser.parse_args()
+
+    Utils.logging_enabled = False
+    candidate_class = load_candidate(args.candidate)
+
+    if args.replay:
+        runs = [load_actions(file_path) for file_path in args.replay]
+    else:
+        maps = args.maps or sorted(glob.glob(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'maps', '*.json'))))
+        runs = [
+            (map_path, seed, None)
+            for map_path in maps
+            for seed in range(args.seed, args.seed + args.games)
+        ]
+
+    failures = 0
+    for map_path, seed, actions in runs:
+        if actions is None:
+            actions = random_actions(map_path, seed)
+        mismatch = first_mismatch(map_path, seed, actions, candidate_class)
+        if mismatch is None:
+            continue
+        failures += 1
+        print(f"{map_path} seed {seed}: MISMATCH")
+        _report(map_path, seed, actions, candidate_class, args.candidate, args.out, not args.no_shrink)
+
+    print(f"{len(runs) - failures} of {len(runs)} games matched, {failures} mismatched")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
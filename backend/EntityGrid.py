@@ -0,0 +1,105 @@
+from array import array
+
+# What's on each tile of the map: a flat array of entity ids, one per tile (tile (x, y) is at index
+# y * width + x, and 0 means the tile is empty), plus a table from ids to the entities themselves.
+# Looking up a tile is index arithmetic and two list lookups, copying the grid is one buffer copy,
+# and the ids can be handed to NumPy without copying (as_numpy).
+#
+# An id belongs to a tile, not to an entity: it is given out when something is put on a tile and
+# freed when the tile is cleared or something else is put there, so the table only ever holds
+# what's on the map right now.
+
+class EntityGrid:
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.cells = array('i', [0]) * (width * height)
+        # entities[id] is the entity with that id and tiles[id] the index of the tile it's on.
+        # entities[0] is always None, so an empty tile looks up None
+        self.entities = [None]
+        self.tiles = [-1]
+        # Ids in the table that no tile uses anymore, to be given out again
+        self.free_ids = []
+
+    def index(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    # Indices of a list of (x, y) tiles, for looking them up with occupants()
+    def indices(self, tiles) -> tuple:
+        return tuple(y * self.width + x for x, y in tiles)
+
+    def get(self, x: int, y: int):
+        return self.entities[self.cells[y * self.width + x]]
+
+    # Put an entity on a tile, replacing whatever was there. None empties the tile.
+    def set(self, x: int, y: int, entity):
+        index = y * self.width + x
+        entity_id = self.cells[index]
+        if entity is None:
+            if entity_id:
+                self.entities[entity_id] = None
+                self.free_ids.append(entity_id)
+                self.cells[index] = 0
+        elif entity_id:
+            self.entities[entity_id] = entity
+        else:
+            if self.free_ids:
+                entity_id = self.free_ids.pop()
+                self.entities[entity_id] = entity
+                self.tiles[entity_id] = index
+            else:
+                entity_id = len(self.entities)
+                self.entities.append(entity)
+                self.tiles.append(index)
+            self.cells[index] = entity_id
+
+    def clear(self, x: int, y: int):
+        self.set(x, y, None)
+
+    def clear_all(self):
+        self.cells[:] = array('i', [0]) * len(self.cells)
+        self.entities = [None]
+        self.tiles = [-1]
+        self.free_ids = []
+
+    # The entities on the tiles at these indices, in the same order, leaving out empty tiles
+    def occupants(self, indices: tuple) -> list:
+        cells = self.cells
+        entities = self.entities
+        return [entities[cells[index]] for index in indices if cells[index]]
+
+    # Independent copy of the grid. copy_entity(entity) gives the entity to put in the copy's table
+    # (by default the same objects are shared).
+    def copy(self, copy_entity=None) -> 'EntityGrid':
+        new_grid = EntityGrid.__new__(EntityGrid)
+        new_grid.width = self.width
+        new_grid.height = self.height
+        new_grid.cells = self.cells[:]
+        if copy_entity is None:
+            new_grid.entities = list(self.entities)
+        else:
+            new_grid.entities = [None if entity is None else copy_entity(entity) for entity in self.entities]
+        new_grid.tiles = list(self.tiles)
+        new_grid.free_ids = list(self.free_ids)
+        return new_grid
+
+    # Rows of entity names ('' for empty tiles), as sent to the agents
+    def names(self) -> list:
+        width = self.width
+        rows = [[''] * width for _ in range(self.height)]
+        for entity, index in zip(self.entities, self.tiles):
+            if entity is not None:
+                rows[index // width][index % width] = entity.name
+        return rows
+
+    # [x, y, name] for every occupied tile, in the same order as the rows of names()
+    def positions(self) -> list:
+        width = self.width
+        occupied = sorted((index, entity_id) for entity_id, index in enumerate(self.tiles) if self.entities[entity_id] is not None)
+        return [[index % width, index // width, self.entities[entity_id].name] for index, entity_id in occupied]
+
+    # The ids as a (height, width) NumPy array that shares this grid's memory, so it always shows the
+    # current grid. Nonzero entries are occupied tiles. Needs NumPy, which the engine itself doesn't.
+    def as_numpy(self):
+        import numpy as np
+        return np.frombuffer(self.cells, dtype=np.intc).reshape(self.height, self.width)
@@ -0,0 +1,176 @@
+import random
+from AIAction import AIAction
+from GameState import GameState
+from MapCache import MapData
+from NameSelector import NameSelector
+from Game import run_turn_on_state, game_state_to_dict
+from Mercenary import Mercenary
+from Demon import Demon
+from Cannon import Cannon
+from Crossbow import Crossbow
+from House import House
+from Minigun import Minigun
+from Church import Church
+
+# Forward model: predict what a turn will do, for agents that search ahead.
+#
+# The engine puts the backend directory on every agent's import path, so an agent can simply do:
+#
+#     from ForwardModel import state_from_dict, next_state, state_to_dict
+#     from AIAction import AIAction
+#
+#     def do_turn(self, game_state: dict) -> AIAction:
+#         state = state_from_dict(game_state)
+#         for my_action in candidate_actions:
+#             predicted = next_state(state, my_action, guess_of_their_action)   # when playing Red
+#             ...score predicted...
+#
+# Calling next_state has no side effects: the state passed in is left untouched, nothing is written to
+# the engine log, and the global name counters and the global `random` module are not used. Given the
+# same inputs (and the same rng, if you pass one), it always returns the same result.
+#
+# Entity names in predicted states are not the names the real game will give new entities.
+# Everything else is exactly what the engine would compute.
+
+TOWER_CLASSES = {
+    "Crossbow": Crossbow,
+    "Cannon": Cannon,
+    "House": House,
+    "Minigun": Minigun,
+    "Church": Church
+}
+
+# Maps seen by state_from_dict, so lanes are traced once per map rather than once per call
+_maps = {}
+
+
+# The state one turn after game_state, if Red plays action_r and Blue plays action_b.
+# game_state is not modified. Random tie-breaks between tower targets are drawn from rng;
+# by default, from a generator seeded with the turn number.
+def next_state(game_state: GameState, action_r: AIAction, action_b: AIAction, rng: random.Random = None) -> GameState:
+    new_state = game_state.clone(rng)
+    new_state.logging = False
+    run_turn_on_state(new_state, action_r, action_b)
+    return new_state
+
+
+# Build a GameState from the game state dict an agent receives each turn
+def state_from_dict(game_state_dict: dict) -> GameState:
+    map_data = _map_for(game_state_dict)
+    state = GameState(map_data)
+    state.names = NameSelector()
+    state.rng = random.Random(game_state_dict["TurnsRemaining"])
+
+    state.turns_remaining = game_state_dict["TurnsRemaining"]
+    state.victory = game_state_dict["Victory"] or None
+    state.victory_reason = game_state_dict["VictoryReason"]
+    state.money_r = game_state_dict["RedTeamMoney"]
+    state.money_b = game_state_dict["BlueTeamMoney"]
+
+    for team, prices in (('r', game_state_dict["TowerPricesR"]), ('b', game_state_dict["TowerPricesB"])):
+        setattr(state, f'house_price_{team}', prices["House"])
+        setattr(state, f'crossbow_price_{team}', prices["Crossbow"])
+        setattr(state, f'cannon_price_{team}', prices["Cannon"])
+        setattr(state, f'minigun_price_{team}', prices["Minigun"])
+        setattr(state, f'church_price_{team}', prices["Church"])
+
+    for base, base_dict in ((state.player_base_r, game_state_dict["PlayerBaseR"]), (state.player_base_b, game_state_dict["PlayerBaseB"])):
+        base.health = base_dict["Health"]
+        queued = base_dict.get("QueuedMercenaries", {})
+        base.mercenary_queued_up = queued.get("Up", 0)
+        base.mercenary_queued_down = queued.get("Down", 0)
+        base.mercenary_queued_left = queued.get("Left", 0)
+        base.mercenary_queued_right = queued.get("Right", 0)
+
+    for spawner, spawner_dict in zip(state.demon_spawners, game_state_dict["DemonSpawners"]):
+        spawner.target_team = spawner_dict["Target"]
+        spawner.reload_time_left = spawner_dict["ReloadTime"]
+        spawner.reload_time_max = spawner_dict["MaxReloadTime"]
+        spawner.queued = spawner_dict.get("Queued", 0)
+        spawner.activation_count = spawner_dict.get("ActivationCount", 0)
+
+    # Which entity is on which tile, from the EntityGrid or (for agents that asked for a sparse grid) EntityPositions
+    if "EntityGrid" in game_state_dict:
+        names_on_tiles = {(x, y): name for y, row in enumerate(game_state_dict["EntityGrid"]) for x, name in enumerate(row) if name}
+    elif "EntityPositions" in game_state_dict:
+        names_on_tiles = {(x, y): name for x, y, name in game_state_dict["EntityPositions"]}
+    else:
+        names_on_tiles = None
+
+    def place(entity):
+        # Entities that have died but not been cleaned up yet are in the lists, but no longer on the grid.
+        # Without the grid, that's told by their state (towers don't have one).
+        if names_on_tiles is None:
+            on_grid = getattr(entity, 'state', None) != 'dead'
+        else:
+            on_grid = names_on_tiles.get((entity.x, entity.y)) == entity.name
+        if on_grid:
+            state.entity_grid.set(entity.x, entity.y, entity)
+
+    for merc_dict in game_state_dict["Mercenaries"]:
+        merc = Mercenary(merc_dict["x"], merc_dict["y"], merc_dict["Team"], state)
+        merc.name = merc_dict["Name"]
+        merc.health = merc_dict["Health"]
+        merc.attack_pow = merc_dict["Damage"]
+        merc.state = merc_dict["State"]
+        state.mercs.append(merc)
+        place(merc)
+
+    for demon_dict in game_state_dict["Demons"]:
+        demon = Demon(demon_dict["x"], demon_dict["y"], demon_dict["Team"], 0, state)
+        demon.name = demon_dict["Name"]
+        demon.health = demon_dict["Health"]
+        demon.attack_pow = demon_dict["Damage"]
+        demon.state = demon_dict["State"]
+        state.demons.append(demon)
+        place(demon)
+
+    # Demons wiped out by both teams provoking, which are on the grid but in no list (see Game.game_state_to_dict)
+    for demon_dict in game_state_dict.get("GridOnlyDemons", ()):
+        demon = Demon(demon_dict["x"], demon_dict["y"], demon_dict["Team"], 0, state)
+        demon.name = demon_dict["Name"]
+        demon.health = demon_dict["Health"]
+        demon.attack_pow = demon_dict["Damage"]
+        demon.state = 'dead'
+        state.entity_grid.set(demon.x, demon.y, demon)
+
+    for tower_dict in game_state_dict["Towers"]:
+        tower = TOWER_CLASSES[tower_dict["Type"]](tower_dict["x"], tower_dict["y"], tower_dict["Team"], state)
+        tower.name = tower_dict["Name"]
+        tower.current_cooldown = tower_dict["Cooldown"]
+        tower.targets = [tuple(target) for target in tower_dict["Targets"]]
+        state.towers.append(tower)
+        place(tower)
+
+    state.stats_r.load_totals(game_state_dict.get("TeamStatsR", {}))
+    state.stats_b.load_totals(game_state_dict.get("TeamStatsB", {}))
+    state.recount_stats()
+
+    return state
+
+
+# The same dict an agent would receive for this state (without team names)
+def state_to_dict(game_state: GameState) -> dict:
+    return game_state_to_dict(game_state)
+
+
+def _map_for(game_state_dict: dict) -> MapData:
+    key = (
+        tuple(game_state_dict["FloorTiles"]),
+        (game_state_dict["PlayerBaseR"]["x"], game_state_dict["PlayerBaseR"]["y"]),
+        (game_state_dict["PlayerBaseB"]["x"], game_state_dict["PlayerBaseB"]["y"]),
+        tuple((spawner["x"], spawner["y"]) for spawner in game_state_dict["DemonSpawners"])
+    )
+    map_data = _maps.get(key)
+    if map_data is None:
+        map_data = MapData({
+            "FloorTiles": game_state_dict["FloorTiles"],
+            "PlayerBaseR": game_state_dict["PlayerBaseR"],
+            "PlayerBaseB": game_state_dict["PlayerBaseB"],
+            "DemonSpawners": [
+                {"x": spawner["x"], "y": spawner["y"], "initial_target": spawner["Target"]}
+                for spawner in game_state_dict["DemonSpawners"]
+            ]
+        })
+        _maps[key] = map_data
+    return map_data
@@ -1,11 +1,12 @@
 import json
 import subprocess
 from pathlib import Path
-from Utils import log_msg
+from Utils import log_msg, logging_suppressed
 import Constants
 
 # GameState and related imports
 from GameState import GameState
+from MapCache import load_map
 from Mercenary import Mercenary
 from Demon import Demon
 from Cannon import Cannon
@@ -23,6 +24,37 @@ from WorldUpdatePhase import world_update_phase
 from ProvokeDemonsPhase import provoke_demons_phase
 
 
+# Perform one turn's updates on a GameState, in place. Used by Game.run_turn and by the forward model (ForwardModel.py)
+# If game_state.events is a list, it ends up holding this turn's events (see GameEvents.py).
+# If game_state.hooks is set, its callbacks are called between the phases (see PhaseHooks.py).
+# If game_state.logging is False, nothing is logged while the turn is played.
+def run_turn_on_state(game_state: GameState, action_r: AIAction, action_b: AIAction):
+    if game_state.logging:
+        _run_turn_on_state(game_state, action_r, action_b)
+    else:
+        with logging_suppressed():
+            _run_turn_on_state(game_state, action_r, action_b)
+
+
+def _run_turn_on_state(game_state: GameState, action_r: AIAction, action_b: AIAction):
+    if game_state.events is not None:
+        game_state.events.clear()
+    hooks = game_state.hooks
+
+    log_msg(f"-- TURN: {Constants.MAX_TURNS - game_state.turns_remaining}, REMAINING TURNS: {game_state.turns_remaining}, BLUE: ${game_state.money_b}, RED: ${game_state.money_r} --")
+    if hooks is not None: hooks.fire("turn_start", game_state)
+    buy_mercenary_phase(game_state, action_r, action_b)
+    if hooks is not None: hooks.fire("after_buy_mercenaries", game_state)
+    build_tower_phase(game_state, action_r, action_b)
+    if hooks is not None: hooks.fire("after_build_towers", game_state)
+    provoked_demons = provoke_demons_phase(game_state, action_r, action_b)
+    if hooks is not None: hooks.fire("after_provoke_demons", game_state)
+    world_update_phase(game_state, provoked_demons)
+    game_state.turns_remaining -= 1
+    if hooks is not None: hooks.fire("turn_end", game_state)
+    log_msg("")
+
+
 # Contain the GameState, and run logic for progressing turns
 class Game:
     def __init__(
@@ -31,165 +63,204 @@ class Game:
         map_json_file_path: str
     ):
 
-        map_json_data = json.load(open(map_json_file_path, 'r'))
-        self.game_state = GameState(map_json_data)
+        self.game_state = GameState(load_map(map_json_file_path))
+
+    # Start a new game on the same map, reusing this one's state objects
+    def reset(self):
+        self.game_state.reset()
 
     # set from main.py
     team_name_r = ""
     team_name_b = ""
+    # Set from main.py to a list to record every turn's (action_r, action_b), for replaying the match later
+    action_log = None
 
     # Perform updates to GameState based on two AI Actions
     def run_turn(self, action_r: AIAction, action_b: AIAction):
-        
-        log_msg(f"-- TURN: {Constants.MAX_TURNS - self.game_state.turns_remaining}, REMAINING TURNS: {self.game_state.turns_remaining}, BLUE: ${self.game_state.money_b}, RED: ${self.game_state.money_r} --")
-        buy_mercenary_phase(self.game_state, action_r, action_b)
-        build_tower_phase(self.game_state, action_r, action_b)
-        provoked_demons = provoke_demons_phase(self.game_state, action_r, action_b)
-        world_update_phase(self.game_state, provoked_demons)
-        self.game_state.turns_remaining -= 1
-        log_msg("")
-
-
-    # Converts the game state to a json string that'll be usable by the AI's
-    def game_state_to_json(self) -> str:
-
-        dict_player_base_r : dict = {
-            "Team" : self.game_state.player_base_r.team,
-            "Health" : self.game_state.player_base_r.health,
-            "Money" : self.game_state.money_r,
-            "x" : self.game_state.player_base_r.x,
-            "y" : self.game_state.player_base_r.y
+        if self.action_log is not None:
+            self.action_log.append((action_r, action_b))
+        run_turn_on_state(self.game_state, action_r, action_b)
+
+
+    # Converts the game state to a json string that'll be usable by the AI's.
+    # The static map analysis is only included on request, for the initial game state sent to agents.
+    # entity_grid is one of ENTITY_GRID_MODES, as negotiated with each agent (see main.parse_agent_options).
+    def game_state_to_json(self, include_map_analysis: bool = False, entity_grid: str = "dense") -> str:
+        data = game_state_to_dict(self.game_state, self.team_name_r, self.team_name_b, entity_grid)
+        if include_map_analysis:
+            data["MapAnalysis"] = self.game_state.map_data.analysis()
+        json_string : str = json.dumps(data)
+
+        return json_string
+
+
+# How the entity grid can be sent: the full grid of names ("EntityGrid"), only the occupied
+# tiles ("EntityPositions", a list of [x, y, name]), or not at all. The same information is in
+# the Towers, Mercenaries and Demons lists, so agents that don't use the grid can save the space.
+ENTITY_GRID_MODES = ("dense", "sparse", "none")
+
+
+# Converts a game state to the dict the AI's receive (as JSON) every turn
+def game_state_to_dict(game_state: GameState, team_name_r: str = "", team_name_b: str = "", entity_grid: str = "dense") -> dict:
+
+    dict_player_base_r : dict = {
+        "Team" : game_state.player_base_r.team,
+        "Health" : game_state.player_base_r.health,
+        "Money" : game_state.money_r,
+        "x" : game_state.player_base_r.x,
+        "y" : game_state.player_base_r.y,
+        # Mercenaries bought but not spawned yet, because the tile next to the base was taken
+        "QueuedMercenaries" : {
+            "Up" : game_state.player_base_r.mercenary_queued_up,
+            "Down" : game_state.player_base_r.mercenary_queued_down,
+            "Left" : game_state.player_base_r.mercenary_queued_left,
+            "Right" : game_state.player_base_r.mercenary_queued_right
         }
+    }
 
-        dict_player_base_b : dict = {
-            "Team" : self.game_state.player_base_b.team,
-            "Health" : self.game_state.player_base_b.health,
-            "Money" : self.game_state.money_b,
-            "x" : self.game_state.player_base_b.x,
-            "y" : self.game_state.player_base_b.y
+    dict_player_base_b : dict = {
+        "Team" : game_state.player_base_b.team,
+        "Health" : game_state.player_base_b.health,
+        "Money" : game_state.money_b,
+        "x" : game_state.player_base_b.x,
+        "y" : game_state.player_base_b.y,
+        # Mercenaries bought but not spawned yet, because the tile next to the base was taken
+        "QueuedMercenaries" : {
+            "Up" : game_state.player_base_b.mercenary_queued_up,
+            "Down" : game_state.player_base_b.mercenary_queued_down,
+            "Left" : game_state.player_base_b.mercenary_queued_left,
+            "Right" : game_state.player_base_b.mercenary_queued_right
         }
+    }
+
+    dict_tower_prices_r: dict = {
+        "House" : game_state.house_price_r,
+        "Crossbow" : game_state.crossbow_price_r,
+        "Cannon" : game_state.cannon_price_r,
+        "Minigun" : game_state.minigun_price_r,
+        "Church" : game_state.church_price_r,
+    }
+
+    dict_tower_prices_b: dict = {
+        "House" : game_state.house_price_b,
+        "Crossbow" : game_state.crossbow_price_b,
+        "Cannon" : game_state.cannon_price_b,
+        "Minigun" : game_state.minigun_price_b,
+        "Church" : game_state.church_price_b
+    }
+
+    # Changing the entity grid to a bunch of strings
+    entity_grid_fields = {}
+    if entity_grid == "dense":
+        entity_grid_fields["EntityGrid"] = game_state.entity_grid.names()
+    elif entity_grid == "sparse":
+        entity_grid_fields["EntityPositions"] = game_state.entity_grid.positions()
 
-        dict_tower_prices_r: dict = {
-            "House" : self.game_state.house_price_r,
-            "Crossbow" : self.game_state.crossbow_price_r,
-            "Cannon" : self.game_state.cannon_price_r,
-            "Minigun" : self.game_state.minigun_price_r,
-            "Church" : self.game_state.church_price_r,
+    # Converting mercenarys to dicts in merc list
+    list_mercenary = []
+    for merc in game_state.mercs:
+        merc_dict : dict = {
+            "Name" : merc.name,
+            "Team" : merc.team,
+            "x" : merc.x,
+            "y" : merc.y,
+            "Health" : merc.health,
+            "Damage" : merc.attack_pow,
+            "State" : merc.state
         }
+        list_mercenary.append(merc_dict)
 
-        dict_tower_prices_b: dict = {
-            "House" : self.game_state.house_price_b,
-            "Crossbow" : self.game_state.crossbow_price_b,
-            "Cannon" : self.game_state.cannon_price_b,
-            "Minigun" : self.game_state.minigun_price_b,
-            "Church" : self.game_state.church_price_b
+    list_towers = []
+    for tow in game_state.towers:
+        target_list = []
+
+        for target in tow.targets:
+            target_list.append(target)
+
+        tow_dict : dict = {
+            "Name" : tow.name,
+            "Type" : tow.type_name,
+            "Team" : tow.team,
+            "x" : tow.x,
+            "y" : tow.y,
+            "Targets" : target_list,
+            "Cooldown" : tow.current_cooldown,
         }
+        list_towers.append(tow_dict)
 
-        # Changing the entity grid to a bunch of strings
-        list_entity_grid = []
-        for y in self.game_state.entity_grid:
-            row = []
-            for ent_at_xy in y:
-                if ent_at_xy is None:
-                    row.append('')
-                else:
-                    row.append(ent_at_xy.name)
-            list_entity_grid.append(row)
-
-        # Converting mercenarys to dicts in merc list
-        list_mercenary = []
-        for merc in self.game_state.mercs:
-            merc_dict : dict = {
-                "Name" : merc.name,
-                "Team" : merc.team,
-                "x" : merc.x,
-                "y" : merc.y,
-                "Health" : merc.health,
-                "Damage" : merc.attack_pow,
-                "State" : merc.state
+    list_demons = []
+    for dem in game_state.demons:
+        if isinstance(dem, Demon):
+            dem_dict = {
+                "Name" : dem.name,
+                "Team" : dem.target_team,
+                "x" : dem.x,
+                "y" : dem.y,
+                "Health" : dem.health,
+                "Damage" : dem.attack_pow,
+                "State" : dem.state
             }
-            list_mercenary.append(merc_dict)
-
-        list_towers = []
-        for tow in self.game_state.towers:
-            tower_type = ""
-            if isinstance(tow, Crossbow):
-                tower_type = "Crossbow"
-            elif isinstance(tow, House):
-                tower_type = "House"
-            elif isinstance(tow, Cannon):
-                tower_type = "Cannon"
-            elif isinstance(tow, Minigun):
-                tower_type = "Minigun"
-            elif isinstance(tow, Church):
-                tower_type = "Church"
-            
-            target_list = []
-
-            for target in tow.targets:
-                target_list.append(target)
-
-            tow_dict : dict = {
-                "Name" : tow.name,
-                "Type" : tower_type,
-                "Team" : tow.team,
-                "x" : tow.x,
-                "y" : tow.y,
-                "Targets" : target_list,
-                "Cooldown" : tow.current_cooldown,
+            list_demons.append(dem_dict)
+
+    # Demons wiped out by both teams provoking are dropped from the Demons list but left on the grid, where they
+    # still block the lane and take hits until their tile is cleared (see ProvokeDemonsPhase.py). They're listed
+    # here, in grid order, so the forward model can put them back; the key is only sent while there are any.
+    grid_only_demons = []
+    for entity, index in zip(game_state.entity_grid.entities, game_state.entity_grid.tiles):
+        if isinstance(entity, Demon) and entity.state == 'dead' and entity not in game_state.demons:
+            grid_only_demons.append((index, {
+                "Name" : entity.name,
+                "Team" : entity.target_team,
+                "x" : entity.x,
+                "y" : entity.y,
+                "Health" : entity.health,
+                "Damage" : entity.attack_pow
+            }))
+    grid_only_demon_fields = {}
+    if grid_only_demons:
+        grid_only_demon_fields["GridOnlyDemons"] = [dem_dict for index, dem_dict in sorted(grid_only_demons, key=lambda item: item[0])]
+
+    list_spawners = []
+    for spawner in game_state.demon_spawners:
+        if isinstance(spawner, DemonSpawner):
+            spawner_dict = {
+                "x" : spawner.x,
+                "y" : spawner.y,
+                "Target" : spawner.target_team,
+                "ReloadTime" : spawner.reload_time_left,
+                "MaxReloadTime" : spawner.reload_time_max,
+                "Queued" : spawner.queued,
+                "ActivationCount" : spawner.activation_count,
             }
-            list_towers.append(tow_dict)
-
-        list_demons = []
-        for dem in self.game_state.demons:
-            if isinstance(dem, Demon):
-                dem_dict = {
-                    "Name" : dem.name,
-                    "Team" : dem.target_team,
-                    "x" : dem.x,
-                    "y" : dem.y,
-                    "Health" : dem.health,
-                    "Damage" : dem.attack_pow,
-                    "State" : dem.state
-                }
-                list_demons.append(dem_dict)
-
-        list_spawners = []
-        for spawner in self.game_state.demon_spawners:
-            if isinstance(spawner, DemonSpawner):
-                spawner_dict = {
-                    "x" : spawner.x,
-                    "y" : spawner.y,
-                    "Target" : spawner.target_team,
-                    "ReloadTime" : spawner.reload_time_left,
-                    "MaxReloadTime" : spawner.reload_time_max,
-                }
-            list_spawners.append(spawner_dict)
-
-        data : dict = {
-            "TeamNameR": self.team_name_r,
-            "TeamNameB": self.team_name_b,
-            "Victory" : self.game_state.victory,
-            "VictoryReason" : self.game_state.victory_reason,
-            "TurnsRemaining" : self.game_state.turns_remaining,
-            "CurrentTurn" : Constants.MAX_TURNS - self.game_state.turns_remaining,
-
-            "PlayerBaseR" : dict_player_base_r,
-            "PlayerBaseB" : dict_player_base_b,
-            "RedTeamMoney" : self.game_state.money_r,
-            "BlueTeamMoney" : self.game_state.money_b,
-
-            "FloorTiles" : self.game_state.floor_tiles,
-            "EntityGrid" : list_entity_grid,
-            "Towers" : list_towers,
-            "Mercenaries" : list_mercenary,
-            "Demons" : list_demons,
-            "DemonSpawners" : list_spawners,
-
-            "TowerPricesR" : dict_tower_prices_r,
-            "TowerPricesB" : dict_tower_prices_b
-        } 
+        list_spawners.append(spawner_dict)
 
-        json_string : str = json.dumps(data)
+    data : dict = {
+        "TeamNameR": team_name_r,
+        "TeamNameB": team_name_b,
+        "Victory" : game_state.victory,
+        "VictoryReason" : game_state.victory_reason,
+        "TurnsRemaining" : game_state.turns_remaining,
+        "CurrentTurn" : Constants.MAX_TURNS - game_state.turns_remaining,
+
+        "PlayerBaseR" : dict_player_base_r,
+        "PlayerBaseB" : dict_player_base_b,
+        "RedTeamMoney" : game_state.money_r,
+        "BlueTeamMoney" : game_state.money_b,
+
+        "FloorTiles" : list(game_state.floor_tiles),
+        **entity_grid_fields,
+        "Towers" : list_towers,
+        "Mercenaries" : list_mercenary,
+        "Demons" : list_demons,
+        **grid_only_demon_fields,
+        "DemonSpawners" : list_spawners,
+
+        "TowerPricesR" : dict_tower_prices_r,
+        "TowerPricesB" : dict_tower_prices_b,
+
+        # Running totals for each team (see TeamStats.py)
+        "TeamStatsR" : game_state.stats_r.to_dict(),
+        "TeamStatsB" : game_state.stats_b.to_dict()
+    } 
 
-        return json_string
\ No newline at end of file
+    return data
@@ -0,0 +1,74 @@
+from collections import namedtuple
+
+# What happened during a turn, as typed events, for anything that wants to react to the game as it's played:
+# training rewards, match statistics, logging. Set GameState.events to a list and the engine appends one
+# event per happening to it (through the GameState.record_* methods); the list is emptied at the start of every
+# turn, so after run_turn it holds exactly that turn's events, in the order they happened.
+# Nothing is recorded while GameState.events is None, which is the default, so the engine pays nothing for this
+# unless someone is listening.
+#
+# Teams are 'r' or 'b'. Demons have no team: their team fields are None.
+
+# A team built a tower, paying price for it
+TowerBuilt = namedtuple('TowerBuilt', ['team', 'tower_type', 'x', 'y', 'price'])
+# A team destroyed one of its towers, getting refund back
+TowerDestroyed = namedtuple('TowerDestroyed', ['team', 'tower_type', 'x', 'y', 'refund'])
+# A team spent money on anything but a tower (a mercenary, provoking demons)
+MoneySpent = namedtuple('MoneySpent', ['team', 'amount'])
+# A team's house produced money
+Income = namedtuple('Income', ['team', 'amount'])
+MercenarySpawned = namedtuple('MercenarySpawned', ['team', 'x', 'y'])
+# A tower, mercenary or demon damaged a mercenary or demon. attacker_team is the team of the tower or mercenary that
+# dealt it (None if a demon did), target_team the team of the mercenary hit (None if a demon was hit), amount the health taken.
+DamageDealt = namedtuple('DamageDealt', ['attacker_team', 'target_team', 'amount'])
+# A mercenary or demon damaged a player base. base_team is the team that owns the base.
+BaseHit = namedtuple('BaseHit', ['base_team', 'attacker_team', 'amount'])
+# A church healed a mercenary
+MercenaryBuffed = namedtuple('MercenaryBuffed', ['team', 'amount'])
+# A mercenary or demon died. unit_type is "Mercenary" or "Demon".
+UnitKilled = namedtuple('UnitKilled', ['unit_type', 'team', 'x', 'y'])
+
+
+# What a turn's events add up to for one team
+class TurnSummary:
+    def __init__(self):
+        # Change in the team's money: income and refunds, less spending
+        self.money_change = 0
+        self.income = 0
+        self.base_damage_taken = 0
+        self.base_damage_dealt = 0
+        # Types of the towers the team built (and destroyed) this turn
+        self.towers_built = []
+        self.towers_destroyed = []
+        self.mercs_spawned = 0
+        self.mercs_lost = 0
+
+
+# Sum up a turn's events per team: {'r': TurnSummary, 'b': TurnSummary}
+def summarize_turn(events: list) -> dict:
+    summaries = {'r': TurnSummary(), 'b': TurnSummary()}
+    for event in events:
+        kind = type(event)
+        if kind is BaseHit:
+            summaries[event.base_team].base_damage_taken += event.amount
+            if event.attacker_team is not None:
+                summaries[event.attacker_team].base_damage_dealt += event.amount
+        elif kind is Income:
+            summary = summaries[event.team]
+            summary.income += event.amount
+            summary.money_change += event.amount
+        elif kind is TowerBuilt:
+            summary = summaries[event.team]
+            summary.towers_built.append(event.tower_type)
+            summary.money_change -= event.price
+        elif kind is TowerDestroyed:
+            summary = summaries[event.team]
+            summary.towers_destroyed.append(event.tower_type)
+            summary.money_change += event.refund
+        elif kind is MoneySpent:
+            summaries[event.team].money_change -= event.amount
+        elif kind is MercenarySpawned:
+            summaries[event.team].mercs_spawned += 1
+        elif kind is UnitKilled and event.team is not None:
+            summaries[event.team].mercs_lost += 1
+    return summaries
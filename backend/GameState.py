@@ -1,15 +1,69 @@
 import Constants
 import math
+import random
 from PlayerBase import PlayerBase
 from DemonSpawner import DemonSpawner
+from EntityGrid import EntityGrid
+from MapCache import MapData
+from NameSelector import NameSelector, default_name_selector
+from TeamStats import TeamStats
+from GameEvents import TowerBuilt, TowerDestroyed, MoneySpent, Income, MercenarySpawned, DamageDealt, BaseHit, MercenaryBuffed, UnitKilled
 
 class GameState:
     def __init__(
         self,
-        map_json_data: dict,
+        map_data: MapData,
     ) -> None:
 
-        # Initialization which is independent of the map JSON
+        # Initialization which depends on the map. The map itself is shared with other games (see MapCache.py)
+        self.map_data = map_data
+        self.floor_tiles = map_data.floor_tiles
+
+        self.entity_grid = EntityGrid(len(self.floor_tiles[0]), len(self.floor_tiles))
+
+        self.player_base_r = PlayerBase(
+            x=map_data.player_base_r_location[0],
+            y=map_data.player_base_r_location[1],
+            team_color='r'
+        )
+        self.player_base_b = PlayerBase(
+            x=map_data.player_base_b_location[0],
+            y=map_data.player_base_b_location[1],
+            team_color='b'
+        )
+
+        self.demon_spawners = []
+        for x, y, initial_target in map_data.demon_spawners:
+            self.demon_spawners.append(DemonSpawner(x, y, initial_target))
+
+        # Mercenary paths, from Red to Blue player bases
+        self.mercenary_path_left  = map_data.mercenary_path_left
+        self.mercenary_path_right = map_data.mercenary_path_right
+        self.mercenary_path_up    = map_data.mercenary_path_up
+        self.mercenary_path_down  = map_data.mercenary_path_down
+
+        # Where entity names and random tie-breaks come from. Live games share the process-wide ones;
+        # clones made for the forward model get their own, so predicting a turn changes nothing outside the clone.
+        self.names = default_name_selector
+        self.rng = random
+
+        # Running totals per team, kept up to date by the record_* methods below
+        self.stats_r = TeamStats()
+        self.stats_b = TeamStats()
+
+        # Set to a list to collect each turn's events (see GameEvents.py); None records nothing
+        self.events = None
+        # Set to a PhaseHooks to have callbacks called between the phases of every turn (see PhaseHooks.py)
+        self.hooks = None
+        # False to play this game's turns without logging them (the forward model's states, training environments)
+        self.logging = True
+
+        self.reset()
+
+
+    # Put the game back to how it was before the first turn, on the same map.
+    # Everything is restored in place, so this is much cheaper than building a new GameState.
+    def reset(self):
         self.turns_remaining = Constants.MAX_TURNS
         self.victory = None
         # Human-readable reason why a team won
@@ -19,6 +73,16 @@ class GameState:
         self.mercs = []
         self.towers = []
         self.demons = []
+        self.entity_grid.clear_all()
+
+        self.player_base_r.reset()
+        self.player_base_b.reset()
+        for demon_spawner, (x, y, initial_target) in zip(self.demon_spawners, self.map_data.demon_spawners):
+            demon_spawner.reset(initial_target)
+        self.stats_r.reset()
+        self.stats_b.reset()
+        if self.events is not None:
+            self.events.clear()
 
         self.crossbow_price_b = Constants.CROSSBOW_BASE_PRICE
         self.cannon_price_b = Constants.CANNON_BASE_PRICE
@@ -31,83 +95,154 @@ class GameState:
         self.house_price_r = Constants.HOUSE_BASE_PRICE
         self.minigun_price_r = Constants.MINIGUN_BASE_PRICE
         self.church_price_r = Constants.CHURCH_BASE_PRICE
-        
-        # Initialization which depends on the map JSON
-        self.floor_tiles = map_json_data['FloorTiles']
 
-        self.entity_grid = []
-        for i in range(len(self.floor_tiles)):
-            row = [None] * len(self.floor_tiles[0])
-            self.entity_grid.append(row)
 
-        self.player_base_r = PlayerBase(
-            x=map_json_data["PlayerBaseR"]["x"],
-            y=map_json_data["PlayerBaseR"]["y"],
-            team_color='r'
-        )
-        self.player_base_b = PlayerBase(
-            x=map_json_data["PlayerBaseB"]["x"],
-            y=map_json_data["PlayerBaseB"]["y"],
-            team_color='b'
-        )
+    # Independent copy of this state, for simulating ahead without touching the original.
+    # The map is shared (it never changes); every entity and list is copied, and the grid's ids are one buffer copy.
+    def clone(self, rng: random.Random = None) -> 'GameState':
+        new_state = GameState.__new__(GameState)
+        new_state.__dict__.update(self.__dict__)
+        new_state.names = NameSelector.__new__(NameSelector)
+        new_state.names.__dict__.update(self.names.__dict__)
+        new_state.rng = rng if rng is not None else random.Random(self.turns_remaining)
 
-        self.demon_spawners = []
-        for demon_spawner in map_json_data["DemonSpawners"]:
-            self.demon_spawners.append(DemonSpawner(
-                demon_spawner["x"],
-                demon_spawner["y"],
-                demon_spawner["initial_target"]
-            ))
+        copies = {}
+        def copy_entity(entity):
+            entity_copy = copies.get(id(entity))
+            if entity_copy is None:
+                entity_copy = entity.__class__.__new__(entity.__class__)
+                entity_copy.__dict__.update(entity.__dict__)
+                copies[id(entity)] = entity_copy
+            return entity_copy
+
+        new_state.mercs = [copy_entity(merc) for merc in self.mercs]
+        new_state.demons = [copy_entity(demon) for demon in self.demons]
+        new_state.towers = [copy_entity(tower) for tower in self.towers]
+        for tower in new_state.towers:
+            # The only entity field that is modified in place rather than reassigned
+            tower.targets = list(tower.targets)
+        new_state.entity_grid = self.entity_grid.copy(copy_entity)
+        new_state.player_base_r = copy_entity(self.player_base_r)
+        new_state.player_base_b = copy_entity(self.player_base_b)
+        new_state.demon_spawners = [copy_entity(demon_spawner) for demon_spawner in self.demon_spawners]
+        new_state.stats_r = self.stats_r.copy()
+        new_state.stats_b = self.stats_b.copy()
+        # A clone collects its own events, if this state does
+        new_state.events = None if self.events is None else []
+        # Hooks watch the game they were attached to, not predictions of it
+        new_state.hooks = None
+        return new_state
+
+
+    def team_stats(self, team_color: str) -> TeamStats:
+        return self.stats_r if team_color == 'r' else self.stats_b
+
+    # The engine calls these whenever something happens that changes a team's totals.
+    # Anything that changes a mercenary's health must go through record_damage or record_buff.
+    # They also add the matching event to self.events, when it's being collected.
+
+    def record_tower_built(self, tower, price: int):
+        stats = self.team_stats(tower.team)
+        stats.towers[tower.type_name] += 1
+        stats.tower_count += 1
+        stats.tower_value += tower.base_price
+        stats.money_spent += price
+        if self.events is not None:
+            self.events.append(TowerBuilt(tower.team, tower.type_name, tower.x, tower.y, price))
 
-        # Compute mercenary paths, from Red to Blue player bases
-        self.mercenary_path_left  = self.compute_mercenary_path((self.player_base_r.x-1, self.player_base_r.y), (self.player_base_r.x, self.player_base_r.y), (self.player_base_b.x, self.player_base_b.y))
-        self.mercenary_path_right = self.compute_mercenary_path((self.player_base_r.x+1, self.player_base_r.y), (self.player_base_r.x, self.player_base_r.y), (self.player_base_b.x, self.player_base_b.y))
-        self.mercenary_path_up    = self.compute_mercenary_path((self.player_base_r.x, self.player_base_r.y-1), (self.player_base_r.x, self.player_base_r.y), (self.player_base_b.x, self.player_base_b.y))
-        self.mercenary_path_down  = self.compute_mercenary_path((self.player_base_r.x, self.player_base_r.y+1), (self.player_base_r.x, self.player_base_r.y), (self.player_base_b.x, self.player_base_b.y))
+    def record_tower_destroyed(self, tower, refund: int):
+        stats = self.team_stats(tower.team)
+        stats.towers[tower.type_name] -= 1
+        stats.tower_count -= 1
+        stats.tower_value -= tower.base_price
+        stats.money_refunded += refund
+        if self.events is not None:
+            self.events.append(TowerDestroyed(tower.team, tower.type_name, tower.x, tower.y, refund))
+
+    # Money spent on anything but towers (mercenaries, provoking demons)
+    def record_spend(self, team_color: str, amount: int):
+        self.team_stats(team_color).money_spent += amount
+        if self.events is not None:
+            self.events.append(MoneySpent(team_color, amount))
+
+    def record_income(self, team_color: str, amount: int):
+        self.team_stats(team_color).income += amount
+        if self.events is not None:
+            self.events.append(Income(team_color, amount))
+
+    def record_merc_spawned(self, merc):
+        stats = self.team_stats(merc.team)
+        stats.mercs_alive += 1
+        stats.merc_health += merc.health
+        stats.mercs_spawned += 1
+        if self.events is not None:
+            self.events.append(MercenarySpawned(merc.team, merc.x, merc.y))
+
+    # attacker_team is None for demons. The target is a mercenary, a demon or a player base.
+    def record_damage(self, attacker_team: str, target, amount: int):
+        if attacker_team is not None:
+            stats = self.team_stats(attacker_team)
+            stats.damage_dealt += amount
+            if isinstance(target, PlayerBase):
+                stats.base_damage_dealt += amount
+        # Demons have a target_team instead of a team, so anything else with a team is a mercenary
+        if not isinstance(target, PlayerBase) and hasattr(target, 'team'):
+            self.team_stats(target.team).merc_health -= amount
+        if self.events is not None:
+            if isinstance(target, PlayerBase):
+                self.events.append(BaseHit(target.team, attacker_team, amount))
+            else:
+                self.events.append(DamageDealt(attacker_team, getattr(target, 'team', None), amount))
+
+    def record_buff(self, merc, health_buff: int):
+        self.team_stats(merc.team).merc_health += health_buff
+        if self.events is not None:
+            self.events.append(MercenaryBuffed(merc.team, health_buff))
+
+    # An entity has just been marked dead
+    def record_death(self, entity):
+        if hasattr(entity, 'team'):
+            stats = self.team_stats(entity.team)
+            stats.mercs_alive -= 1
+            stats.merc_health -= entity.health
+            stats.mercs_dying += 1
+            stats.dying_merc_health += entity.health
+            stats.mercs_lost += 1
+        if self.events is not None:
+            self.events.append(UnitKilled(type(entity).__name__, getattr(entity, 'team', None), entity.x, entity.y))
+
+    # Dead entities have just been taken out of the mercs and demons lists
+    def record_dead_removed(self):
+        for stats in (self.stats_r, self.stats_b):
+            stats.mercs_dying = 0
+            stats.dying_merc_health = 0
+
+    # Work out the counts of what's on the board from the entity lists, for states that were
+    # built piece by piece rather than played (see ForwardModel.state_from_dict)
+    def recount_stats(self):
+        for team_color in ('r', 'b'):
+            stats = self.team_stats(team_color)
+            stats.towers = {tower_type: 0 for tower_type in stats.towers}
+            stats.tower_count = stats.tower_value = 0
+            stats.mercs_alive = stats.merc_health = stats.mercs_dying = stats.dying_merc_health = 0
+            for tower in self.towers:
+                if tower.team == team_color:
+                    stats.towers[tower.type_name] += 1
+                    stats.tower_count += 1
+                    stats.tower_value += tower.base_price
+            for merc in self.mercs:
+                if merc.team != team_color:
+                    continue
+                if merc.state == 'dead':
+                    stats.mercs_dying += 1
+                    stats.dying_merc_health += merc.health
+                else:
+                    stats.mercs_alive += 1
+                    stats.merc_health += merc.health
 
 
     def is_out_of_bounds(self, x: int, y: int) -> bool:
         return x < 0 or x >= len(self.floor_tiles[0]) or y < 0 or y >= len(self.floor_tiles)
 
-    
-    def compute_mercenary_path(self, start_point: tuple, red_base_location: tuple, blue_base_location: tuple) -> list:
-        
-        if self.is_out_of_bounds(start_point[0],start_point[1]): return None
-
-        if self.floor_tiles[start_point[1]][start_point[0]] == 'O':
-            # Do bastard DFS algorithm: raise exception if there's any branch in the path
-            computed_path = [start_point]
-            current_tile = start_point
-            traversed = set()
-            traversed.add(start_point)
-
-            # Loop through new neighboring tiles until there are none left or a branch is detected
-            while current_tile != None:
-                # Find the next tile in the path
-                for neighbor in [
-                    (current_tile[0] - 1, current_tile[1]),
-                    (current_tile[0] + 1, current_tile[1]),
-                    (current_tile[0], current_tile[1] - 1),
-                    (current_tile[0], current_tile[1] + 1)
-                ]:
-                    current_tile = None
-                    if (neighbor not in traversed and
-                        not self.is_out_of_bounds(neighbor[0], neighbor[1]) and
-                        not neighbor == red_base_location and
-                        not neighbor == blue_base_location and
-                        self.floor_tiles[neighbor[1]][neighbor[0]] == 'O'):
-                        traversed.add(neighbor)
-                        if current_tile == None: current_tile = neighbor
-                        else: raise Exception('Branching detected in mercenary path')
-                        break # <- The for loop always sets current tile to none, thus always ending the while loop. So we break once we find the neighbor
-                
-                # Record the next tile
-                if current_tile != None: # The last path will always be None, so we write this to exlude it
-                    computed_path.append(current_tile)
-
-            return computed_path # Forgot this line
-        else:
-            return None
-
     def is_game_over(self) -> bool:
         return self.turns_remaining <= 0 or self.victory != None
\ No newline at end of file
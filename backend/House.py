@@ -1,10 +1,12 @@
 import Constants
 from Tower import Tower
 from GameState import GameState
-from NameSelector import select_tower_name
 from Utils import log_msg, get_increased_tower_price
 
 class House(Tower):
+    type_name = "House"
+    base_price = Constants.HOUSE_BASE_PRICE
+
     def __init__(self, x: int, y: int, team_color: str, game_state: GameState):
         super().__init__(
             x, y,
@@ -16,7 +18,7 @@ class House(Tower):
         )
 
         self.angle = 0
-        self.name = select_tower_name('H', self.team)
+        self.name = game_state.names.select_tower_name('H', self.team)
 
     def get_price(self, game_state: GameState, team_color: str):
         return (game_state.house_price_r if team_color == "r" else game_state.house_price_b)
@@ -36,8 +38,10 @@ class House(Tower):
     def tower_activation(self, game_state : GameState):
         if self.team == "r":
             game_state.money_r += Constants.HOUSE_MONEY_PRODUCED
+            game_state.record_income('r', Constants.HOUSE_MONEY_PRODUCED)
             log_msg(f'House {self.name} produced ${Constants.HOUSE_MONEY_PRODUCED} for the Red team. Total = ${game_state.money_r}')
         elif self.team == "b":
             game_state.money_b += Constants.HOUSE_MONEY_PRODUCED
+            game_state.record_income('b', Constants.HOUSE_MONEY_PRODUCED)
             log_msg(f'House {self.name} produced ${Constants.HOUSE_MONEY_PRODUCED} for the Blue team. Total = ${game_state.money_b}')
         self.current_cooldown = Constants.HOUSE_MAX_COOLDOWN
\ No newline at end of file
@@ -0,0 +1,91 @@
+from collections import deque
+import Constants
+
+# Static facts about a map that every agent would otherwise work out from FloorTiles on its own.
+# They're computed once per map (MapData.analysis caches them) and sent to agents only with the
+# initial game state, under "MapAnalysis"; agents that want them should keep them.
+
+TOWER_RANGES = {
+    "House" : Constants.HOUSE_RANGE,
+    "Crossbow" : Constants.CROSSBOW_RANGE,
+    "Cannon" : Constants.CANNON_RANGE,
+    "Minigun" : Constants.MINIGUN_RANGE,
+    "Church" : Constants.CHURCH_RANGE,
+}
+
+# Same offsets as BuyMercenaryPhase, in the order the example agents list them
+QUEUE_DIRECTIONS = {
+    "N": (0, -1),
+    "S": (0, 1),
+    "E": (1, 0),
+    "W": (-1, 0)
+}
+
+
+def analyze_map(map_data) -> dict:
+    lanes = {}
+    for lane_name, path in (
+        ("Up", map_data.mercenary_path_up),
+        ("Down", map_data.mercenary_path_down),
+        ("Left", map_data.mercenary_path_left),
+        ("Right", map_data.mercenary_path_right)
+    ):
+        if path is not None:
+            lanes[lane_name] = {
+                "Tiles" : [list(tile) for tile in path],
+                "Length" : len(path)
+            }
+
+    queue_directions = {}
+    for team, (base_x, base_y) in (('r', map_data.player_base_r_location), ('b', map_data.player_base_b_location)):
+        queue_directions[team] = [
+            direction for direction, (dx, dy) in QUEUE_DIRECTIONS.items()
+            if not map_data.is_out_of_bounds(base_x + dx, base_y + dy)
+            and map_data.floor_tiles[base_y + dy][base_x + dx] == 'O'
+        ]
+
+    # For each tower range, the path tiles a tower built on each tile would cover. Only buildable tiles
+    # ('r' or 'b') have entries; the rest are empty lists. These are exactly the tiles the engine's towers
+    # check, so they are not quite a circle (see MapData.paths_in_range).
+    path_tiles_in_range = {}
+    for tower_range in sorted(set(TOWER_RANGES.values())):
+        if tower_range <= 0:
+            continue
+        path_tiles_in_range[str(tower_range)] = [
+            [
+                [list(tile) for tile in map_data.paths_in_range(x, y, tower_range)] if tile_type in ('r', 'b') else []
+                for x, tile_type in enumerate(row)
+            ]
+            for y, row in enumerate(map_data.floor_tiles)
+        ]
+
+    distance_to_base = {
+        'r': _path_distances(map_data, map_data.player_base_r_location),
+        'b': _path_distances(map_data, map_data.player_base_b_location)
+    }
+
+    return {
+        "Lanes" : lanes,
+        "QueueDirections" : queue_directions,
+        "TowerRanges" : dict(TOWER_RANGES),
+        "PathTilesInRange" : path_tiles_in_range,
+        "DistanceToBase" : distance_to_base
+    }
+
+
+# Steps along path tiles from a base to every path tile, indexed [y][x]. None for tiles that aren't path tiles
+# or can't reach the base. The base's own tile is 0.
+def _path_distances(map_data, base_location: tuple) -> list:
+    distances = [[None] * map_data.width for _ in range(map_data.height)]
+    base_x, base_y = base_location
+    distances[base_y][base_x] = 0
+    frontier = deque([base_location])
+    while frontier:
+        x, y = frontier.popleft()
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if (not map_data.is_out_of_bounds(nx, ny) and
+                distances[ny][nx] is None and
+                map_data.floor_tiles[ny][nx] == 'O'):
+                distances[ny][nx] = distances[y][x] + 1
+                frontier.append((nx, ny))
+    return distances
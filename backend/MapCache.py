@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import threading
+from MapAnalysis import analyze_map
+from CompiledMap import CompiledMap, open_compiled_map
+
+# Parsed maps, shared by every GameState made from the same map file in this process.
+# A map is parsed and its lanes are traced once; after that, setting up a new game on it (a training
+# episode, a tournament match) only has to build the per-game state.
+# Nothing in a MapData may be modified after it is built, since many games read it at the same time.
+# If the map has been compiled (MapCompiler.py), the lanes and tower coverage come from the compiled file instead.
+
+
+# The (x, y) of every tile of the team's color, row by row. Works on a map's floor tiles and on game_state['FloorTiles']
+# alike. The one place this order is defined: MapData.buildable_tiles, compiled maps (MapCompiler.py) and the
+# tile actions of PPO agents (AI_Agents/action_encoding.py), which are indices into this list, all come from it.
+def buildable_tiles(floor_tiles, team_color: str) -> tuple:
+    return tuple(
+        (x, y)
+        for y, row in enumerate(floor_tiles)
+        for x, tile_type in enumerate(row)
+        if tile_type == team_color
+    )
+
+
+def compute_mercenary_path(floor_tiles: tuple, start_point: tuple, red_base_location: tuple, blue_base_location: tuple) -> tuple:
+
+    def is_out_of_bounds(x: int, y: int) -> bool:
+        return x < 0 or x >= len(floor_tiles[0]) or y < 0 or y >= len(floor_tiles)
+
+    if is_out_of_bounds(start_point[0],start_point[1]): return None
+
+    if floor_tiles[start_point[1]][start_point[0]] == 'O':
+        # Do bastard DFS algorithm: raise exception if there's any branch in the path
+        computed_path = [start_point]
+        current_tile = start_point
+        traversed = set()
+        traversed.add(start_point)
+
+        # Loop through new neighboring tiles until there are none left or a branch is detected
+        while current_tile != None:
+            # Find the next tile in the path
+            for neighbor in [
+                (current_tile[0] - 1, current_tile[1]),
+                (current_tile[0] + 1, current_tile[1]),
+                (current_tile[0], current_tile[1] - 1),
+                (current_tile[0], current_tile[1] + 1)
+            ]:
+                current_tile = None
+                if (neighbor not in traversed and
+                    not is_out_of_bounds(neighbor[0], neighbor[1]) and
+                    not neighbor == red_base_location and
+                    not neighbor == blue_base_location and
+                    floor_tiles[neighbor[1]][neighbor[0]] == 'O'):
+                    traversed.add(neighbor)
+                    if current_tile == None: current_tile = neighbor
+                    else: raise Exception('Branching detected in mercenary path')
+                    break # <- The for loop always sets current tile to none, thus always ending the while loop. So we break once we find the neighbor
+
+            # Record the next tile
+            if current_tile != None: # The last path will always be None, so we write this to exlude it
+                computed_path.append(current_tile)
+
+        return tuple(computed_path)
+    else:
+        return None
+
+
+class MapData:
+    def __init__(self, map_json_data: dict, compiled: CompiledMap = None):
+        self.floor_tiles = tuple(map_json_data['FloorTiles'])
+        self.width = len(self.floor_tiles[0])
+        self.height = len(self.floor_tiles)
+
+        self.player_base_r_location = (map_json_data["PlayerBaseR"]["x"], map_json_data["PlayerBaseR"]["y"])
+        self.player_base_b_location = (map_json_data["PlayerBaseB"]["x"], map_json_data["PlayerBaseB"]["y"])
+
+        # (x, y, initial target) of each demon spawner
+        self.demon_spawners = tuple(
+            (demon_spawner["x"], demon_spawner["y"], demon_spawner["initial_target"])
+            for demon_spawner in map_json_data["DemonSpawners"]
+        )
+
+        # Compiled form of the map (see CompiledMap.py), or None
+        self.compiled = compiled
+
+        # Mercenary lanes, from Red to Blue player bases, as tuples of (x, y). None if there's no lane on that side.
+        if compiled is not None:
+            self.mercenary_path_left  = compiled.lane("left")
+            self.mercenary_path_right = compiled.lane("right")
+            self.mercenary_path_up    = compiled.lane("up")
+            self.mercenary_path_down  = compiled.lane("down")
+        else:
+            base_x, base_y = self.player_base_r_location
+            self.mercenary_path_left  = compute_mercenary_path(self.floor_tiles, (base_x-1, base_y), self.player_base_r_location, self.player_base_b_location)
+            self.mercenary_path_right = compute_mercenary_path(self.floor_tiles, (base_x+1, base_y), self.player_base_r_location, self.player_base_b_location)
+            self.mercenary_path_up    = compute_mercenary_path(self.floor_tiles, (base_x, base_y-1), self.player_base_r_location, self.player_base_b_location)
+            self.mercenary_path_down  = compute_mercenary_path(self.floor_tiles, (base_x, base_y+1), self.player_base_r_location, self.player_base_b_location)
+
+        # (x, y) -> the lane that tile is on. Lanes later in this list win if two lanes share a tile,
+        # same as the search mercenaries and demons used to do when they spawned.
+        self.lane_of_tile = {}
+        for path in (self.mercenary_path_down, self.mercenary_path_left, self.mercenary_path_right, self.mercenary_path_up):
+            if path is None:
+                continue
+            for tile in path:
+                self.lane_of_tile[tile] = path
+
+        # (x, y, tower range) -> path tiles a tower there can reach, filled in as towers get built
+        self.paths_in_range_table = {}
+        # team color -> tiles that team can build on, worked out the first time they're asked for
+        self.buildable_tiles_table = {}
+
+        # Static analysis for agents (see MapAnalysis.py), worked out the first time it's asked for
+        self.analysis_data = None
+
+    def is_out_of_bounds(self, x: int, y: int) -> bool:
+        return x < 0 or x >= self.width or y < 0 or y >= self.height
+
+    # Callers must not modify the returned dict; every game on this map shares it
+    def analysis(self) -> dict:
+        if self.analysis_data is None:
+            self.analysis_data = analyze_map(self)
+        return self.analysis_data
+
+    # The (x, y) of every tile the team can build on, row by row (see buildable_tiles above)
+    def buildable_tiles(self, team_color: str) -> tuple:
+        tiles = self.buildable_tiles_table.get(team_color)
+        if tiles is None:
+            if self.compiled is not None:
+                tiles = self.compiled.buildable_tiles(team_color)
+            else:
+                tiles = buildable_tiles(self.floor_tiles, team_color)
+            self.buildable_tiles_table[team_color] = tiles
+        return tiles
+
+    def paths_in_range(self, x: int, y: int, tower_range: int) -> tuple:
+        key = (x, y, tower_range)
+        paths = self.paths_in_range_table.get(key)
+        if paths is None and self.compiled is not None and not self.is_out_of_bounds(x, y):
+            paths = self.compiled.paths_in_range(x, y, tower_range)
+            if paths is not None:
+                self.paths_in_range_table[key] = paths
+        if paths is None:
+            paths = []
+            for xi in range(x - tower_range, x + tower_range):
+                for yi in range(y - tower_range, y + tower_range):
+                    if xi == x and yi == y: continue
+                    if self.is_out_of_bounds(xi,yi): continue
+
+                    # This is the circle equation, I like my tower range to be circles
+                    if math.sqrt((xi - x) * (xi - x) + (yi - y) * (yi - y)) <= tower_range:
+                        # We're using the tile grid since we don't need to know the entities to know where a path is
+                        if self.floor_tiles[yi][xi] == 'O':
+                            paths.append((xi,yi))
+            paths = tuple(paths)
+            self.paths_in_range_table[key] = paths
+        return paths
+
+
+# absolute path -> (modification time, MapData)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Return the MapData for a map file, parsing it only if it's new or changed on disk since it was last loaded
+def load_map(map_json_file_path: str) -> MapData:
+    path = os.path.abspath(map_json_file_path)
+    modified = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+
+    with open(path, 'rb') as f:
+        map_json_bytes = f.read()
+    map_data = MapData(json.loads(map_json_bytes), open_compiled_map(path, map_json_bytes))
+
+    with _cache_lock:
+        _cache[path] = (modified, map_data)
+    return map_data
+
+
+def clear_map_cache():
+    with _cache_lock:
+        _cache.clear()
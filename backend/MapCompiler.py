@@ -0,0 +1,155 @@
+import argparse
+import json
+import sys
+from CompiledMap import LANE_NAMES, compiled_path_for, map_digest, write_compiled_map
+from MapAnalysis import TOWER_RANGES
+from MapCache import MapData, buildable_tiles
+
+# Checks map JSON files and compiles them (see CompiledMap.py), so a broken map is caught before any game is played
+# on it, not when a Game is made in the middle of a tournament, and games load the lanes instead of tracing them.
+#   python MapCompiler.py ../maps/*.json            (check and write map0.mapc next to map0.json, ...)
+#   python MapCompiler.py --check ../maps/*.json    (only check)
+#
+# Tournament.py checks every map of a ladder before it starts.
+
+TILE_TYPES = ('r', 'b', 'O', ' ')
+
+# Check a parsed map JSON file and return its MapData. Raises ValueError saying what's wrong with it.
+def check_map_data(map_json_data: dict) -> MapData:
+    floor_tiles = map_json_data.get('FloorTiles')
+    if not isinstance(floor_tiles, list) or not floor_tiles or not all(isinstance(row, str) and row for row in floor_tiles):
+        raise ValueError('FloorTiles must be a list of non-empty strings')
+    width, height = len(floor_tiles[0]), len(floor_tiles)
+    for y, row in enumerate(floor_tiles):
+        if len(row) != width:
+            raise ValueError(f'FloorTiles row {y} is {len(row)} tiles long, but row 0 is {width}')
+        for x, tile_type in enumerate(row):
+            if tile_type not in TILE_TYPES:
+                raise ValueError(f'Unknown tile type {tile_type!r} at ({x}, {y})')
+
+    def location(what: str, entry) -> tuple:
+        if not isinstance(entry, dict) or not isinstance(entry.get('x'), int) or not isinstance(entry.get('y'), int):
+            raise ValueError(f'{what} must have integer x and y')
+        x, y = entry['x'], entry['y']
+        if x < 0 or x >= width or y < 0 or y >= height:
+            raise ValueError(f'{what} at ({x}, {y}) is off the {width}x{height} map')
+        return (x, y)
+
+    base_r = location('PlayerBaseR', map_json_data.get('PlayerBaseR'))
+    base_b = location('PlayerBaseB', map_json_data.get('PlayerBaseB'))
+    if base_r == base_b:
+        raise ValueError(f'Both player bases are at {base_r}')
+    demon_spawners = map_json_data.get('DemonSpawners')
+    if not isinstance(demon_spawners, list):
+        raise ValueError('DemonSpawners must be a list')
+    for i, demon_spawner in enumerate(demon_spawners):
+        location(f'Demon spawner {i}', demon_spawner)
+        if demon_spawner.get('initial_target') not in ('r', 'b'):
+            raise ValueError(f'Demon spawner {i} must have initial_target "r" or "b"')
+
+    try:
+        map_data = MapData(map_json_data)
+    except Exception as e:
+        raise ValueError(f'Failed to trace the lanes: {e}')
+    lanes = {lane_name: lane for lane_name, lane in zip(LANE_NAMES, map_lanes(map_data)) if lane is not None}
+    if not lanes:
+        raise ValueError('There are no lanes out of Red\'s base')
+
+    # The engine follows the first open neighbor of each lane tile, so a branch or a dead end off a lane
+    # doesn't stop it; it just silently leaves part of the path unused. Find them here instead.
+    path_tiles = {
+        (x, y) for y, row in enumerate(floor_tiles) for x, tile_type in enumerate(row) if tile_type == 'O'
+    } - {base_r, base_b}
+    for lane_name, lane in lanes.items():
+        for i, (x, y) in enumerate(lane):
+            neighbors = {(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)} & path_tiles
+            branches = neighbors - set(lane[max(0, i - 1):i + 2])
+            if branches:
+                raise ValueError(f'The {lane_name} lane branches at ({x}, {y}), towards {sorted(branches)[0]}')
+        end_x, end_y = lane[-1]
+        if abs(end_x - base_b[0]) + abs(end_y - base_b[1]) != 1:
+            raise ValueError(f'The {lane_name} lane ends at ({end_x}, {end_y}), which is not next to Blue\'s base at {base_b}')
+    off_lanes = sorted(path_tiles - set(map_data.lane_of_tile))
+    if off_lanes:
+        raise ValueError(f'Path tile {off_lanes[0]} is not on any lane from Red\'s base')
+    for i, (x, y, _) in enumerate(map_data.demon_spawners):
+        if (x, y) not in map_data.lane_of_tile:
+            raise ValueError(f'Demon spawner {i} at ({x}, {y}) is not on a lane')
+    return map_data
+
+
+# Check a map JSON file. Raises ValueError (or OSError if it can't be read).
+def check_map(map_json_file_path: str) -> MapData:
+    with open(map_json_file_path, 'rb') as f:
+        return check_map_data(json.loads(f.read()))
+
+
+# Lanes in LANE_NAMES order
+def map_lanes(map_data: MapData) -> tuple:
+    return (map_data.mercenary_path_up, map_data.mercenary_path_down, map_data.mercenary_path_left, map_data.mercenary_path_right)
+
+
+# Check a map JSON file and write its compiled form. Returns the compiled file's path.
+def compile_map(map_json_file_path: str, compiled_path: str = None) -> str:
+    with open(map_json_file_path, 'rb') as f:
+        map_json_bytes = f.read()
+    map_data = check_map_data(json.loads(map_json_bytes))
+    width, height = map_data.width, map_data.height
+    def cell(tile: tuple) -> int:
+        return tile[1] * width + tile[0]
+
+    lanes = map_lanes(map_data)
+    sections = {'lane_start': [], 'lane_length': [], 'lane_tiles': []}
+    for lane in lanes:
+        sections['lane_start'].append(-1 if lane is None else len(sections['lane_tiles']))
+        sections['lane_length'].append(0 if lane is None else len(lane))
+        sections['lane_tiles'].extend(cell(tile) for tile in lane or ())
+
+    tile_lane = [-1] * (width * height)
+    tile_position = [-1] * (width * height)
+    for tile, lane in map_data.lane_of_tile.items():
+        lane_index = next(i for i, candidate in enumerate(lanes) if candidate is lane)
+        tile_lane[cell(tile)] = lane_index
+        tile_position[cell(tile)] = lane.index(tile)
+    sections['tile_lane'] = tile_lane
+    sections['tile_position'] = tile_position
+
+    for team_color in ('r', 'b'):
+        sections[f'buildable_{team_color}'] = [cell(tile) for tile in buildable_tiles(map_data.floor_tiles, team_color)]
+
+    for tower_range in sorted(set(TOWER_RANGES.values())):
+        if tower_range <= 0:
+            continue
+        starts, covered = [0], []
+        for y in range(height):
+            for x in range(width):
+                covered.extend(cell(tile) for tile in map_data.paths_in_range(x, y, tower_range))
+                starts.append(len(covered))
+        sections[f'cover{tower_range}_start'] = starts
+        sections[f'cover{tower_range}_tiles'] = covered
+
+    sections['spawner_lane'] = [tile_lane[cell((x, y))] for x, y, _ in map_data.demon_spawners]
+
+    compiled_path = compiled_path or compiled_path_for(map_json_file_path)
+    write_compiled_map(compiled_path, width, height, map_digest(map_json_bytes), sections)
+    return compiled_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check map JSON files and compile them for fast loading.')
+    parser.add_argument('map_json_files', nargs='+', help='Map JSON files')
+    parser.add_argument('--check', action='store_true', help='Only check the maps, write nothing')
+    args = parser.parse_args()
+
+    broken = 0
+    for map_json_file in args.map_json_files:
+        try:
+            if args.check:
+                check_map(map_json_file)
+                print(f'{map_json_file}: ok')
+            else:
+                print(f'{map_json_file}: compiled to {compile_map(map_json_file)}')
+        except (OSError, ValueError) as e:
+            print(f'{map_json_file}: {e}', file=sys.stderr)
+            broken += 1
+    exit(1 if broken else 0)
@@ -1,7 +1,6 @@
 import Constants
 from PlayerBase import PlayerBase
 from GameState import GameState
-from NameSelector import select_merc_name
 from Demon import Demon
 import Utils
 
@@ -20,21 +19,10 @@ class Mercenary:
             Utils.log_msg(f"Mercenary team_color must be 'r' or 'b'") # TF2 reference?
             return
         
-        self.name = select_merc_name(self.team)
+        self.name = game_state.names.select_merc_name(self.team)
 
-        self.current_path = []
-        possible_paths = [
-            game_state.mercenary_path_down, 
-            game_state.mercenary_path_left,
-            game_state.mercenary_path_right,
-            game_state.mercenary_path_up
-        ]
-        # Assumes no overlapping paths. If merc is on any path tile in path, we are on that path
-        for path in possible_paths:
-            if path == None: #<- in case there aren't 4 paths, it will skip iterating over a none value (which cases an error)
-                continue 
-            if (self.x, self.y) in path:
-                self.current_path = path
+        # The lane this entity is on, looked up in the table the map precomputed for its path tiles
+        self.current_path = game_state.map_data.lane_of_tile.get((self.x, self.y), [])
     
     # Helper function do find what path this merc is on.
     def get_current_path(self):
@@ -54,7 +42,7 @@ class Mercenary:
     
     def block_entity_behind(self, game_state: GameState):
         behind_pos = self.get_adjacent_path_tile(game_state, -1)
-        behind_entity = game_state.entity_grid[behind_pos[1]][behind_pos[0]]
+        behind_entity = game_state.entity_grid.get(behind_pos[0], behind_pos[1])
         # base case: we are in the first tile in our path, do not recurse
         if self.x == behind_pos[0] and self.y == behind_pos[1]:
             return
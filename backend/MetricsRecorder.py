@@ -0,0 +1,98 @@
+import csv
+import math
+import os
+from TeamStats import TOWER_TYPES
+
+# Per-turn metrics of a match, as columns, for balance analysis over many games without parsing log.txt.
+# Example: python main.py <map_json_file> -a1 <agent_1> -a2 <agent_2> --metrics match.npz
+#
+# The recorder is attached to a game's phase hooks (PhaseHooks.py) and reads the GameState at the end of every turn.
+# Rows are kept in memory and the whole match is written at once by save(), as either:
+#   .npz - one NumPy array per column:  columns = numpy.load("match.npz"); pandas.DataFrame(dict(columns))
+#   .csv - one row per turn with a header: pandas.read_csv("match.csv")
+#
+# Columns, one value per turn played (turn 1 is the first):
+#   turn
+#   money_r, money_b, base_health_r, base_health_b
+#   mercs_r, mercs_b, merc_health_r, merc_health_b   - mercenaries on the board and their total health
+#   demons, demon_health
+#   towers_<type>_r, towers_<type>_b                 - towers standing, for every tower type (house, crossbow, ...)
+#   price_<type>_r, price_<type>_b                   - what the next tower of that type costs
+#   income_r, money_spent_r, mercs_lost_r, damage_dealt_r (and _b) - totals so far in the game
+#   spawner_<i>_reload, spawner_<i>_target           - turns until each demon spawner fires, and the team it targets
+#   think_ms_r, think_ms_b                           - how long each agent took to choose this turn's action,
+#                                                      NaN for human players and players that weren't watched
+#
+# NumPy is only needed to save .npz files, and is imported then.
+
+METRICS_FORMATS = ('.npz', '.csv')
+
+
+class MetricsRecorder:
+    # monitors: the ResourceMonitor of each team's agent, by team color, for the think times
+    def __init__(self, monitors: dict = None):
+        self.monitors = {team_color: monitor for team_color, monitor in (monitors or {}).items() if monitor is not None}
+        self.columns = {}
+        # Think times already seen, per team
+        self.think_times_seen = {team_color: 0 for team_color in self.monitors}
+
+    def attach(self, hooks):
+        hooks.register("turn_end", self.record_turn)
+
+    def record_turn(self, game_state, point: str = "turn_end"):
+        row = {"turn": len(self.columns.get("turn", ())) + 1}
+
+        for team_color in ('r', 'b'):
+            stats = game_state.team_stats(team_color)
+            row[f"money_{team_color}"] = game_state.money_r if team_color == 'r' else game_state.money_b
+            row[f"base_health_{team_color}"] = (game_state.player_base_r if team_color == 'r' else game_state.player_base_b).health
+            row[f"mercs_{team_color}"] = stats.mercs_alive
+            row[f"merc_health_{team_color}"] = stats.merc_health
+        demons = [demon for demon in game_state.demons if demon.state != "dead"]
+        row["demons"] = len(demons)
+        row["demon_health"] = sum(demon.health for demon in demons)
+
+        for tower_type in TOWER_TYPES:
+            for team_color in ('r', 'b'):
+                row[f"towers_{tower_type.lower()}_{team_color}"] = game_state.team_stats(team_color).towers[tower_type]
+        for tower_type in TOWER_TYPES:
+            for team_color in ('r', 'b'):
+                row[f"price_{tower_type.lower()}_{team_color}"] = getattr(game_state, f"{tower_type.lower()}_price_{team_color}")
+
+        for team_color in ('r', 'b'):
+            stats = game_state.team_stats(team_color)
+            row[f"income_{team_color}"] = stats.income
+            row[f"money_spent_{team_color}"] = stats.money_spent
+            row[f"mercs_lost_{team_color}"] = stats.mercs_lost
+            row[f"damage_dealt_{team_color}"] = stats.damage_dealt
+
+        for i, demon_spawner in enumerate(game_state.demon_spawners):
+            row[f"spawner_{i}_reload"] = demon_spawner.reload_time_left
+            row[f"spawner_{i}_target"] = demon_spawner.target_team
+
+        for team_color in ('r', 'b'):
+            row[f"think_ms_{team_color}"] = self._think_ms(team_color)
+
+        for name, value in row.items():
+            self.columns.setdefault(name, []).append(value)
+
+    # Milliseconds the agent thought this turn, if it was watched and thought at all
+    def _think_ms(self, team_color: str) -> float:
+        monitor = self.monitors.get(team_color)
+        if monitor is None or len(monitor.think_times) == self.think_times_seen[team_color]:
+            return math.nan
+        self.think_times_seen[team_color] = len(monitor.think_times)
+        return monitor.think_times[-1] * 1000
+
+    def save(self, path: str):
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.npz':
+            import numpy as np
+            np.savez_compressed(path, **{name: np.asarray(values) for name, values in self.columns.items()})
+        elif extension == '.csv':
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.columns.keys())
+                writer.writerows(zip(*self.columns.values()))
+        else:
+            raise ValueError(f'Metrics can be saved as {" or ".join(METRICS_FORMATS)}, not {path}')
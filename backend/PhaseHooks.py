@@ -0,0 +1,84 @@
+import time
+from collections import defaultdict
+
+# Callbacks at the boundaries between the phases of a turn, so profilers, replay recorders, metric collectors and
+# reward shapers can look at the game as it's played without editing the engine.
+#
+#   hooks = PhaseHooks()
+#   hooks.register("before_update_towers", lambda game_state, point: print(len(game_state.mercs)))
+#   game.game_state.hooks = hooks
+#
+# A callback gets the GameState and the name of the point it was called at. It may read the state freely; changing
+# it changes the game. Callbacks at the same point are called in the order they were registered.
+# GameState.hooks is None by default, and the engine only checks that at each point, so hooks cost nothing unless
+# some are attached. The forward model's clones (ForwardModel.py) don't carry the hooks of the state they're cloned from.
+#
+# A turn goes through these points, in this order. When a team wins during the world update, the rest of the
+# world update is skipped, so its points are too; "turn_end" is always reached.
+HOOK_POINTS = (
+    "turn_start",
+    "after_buy_mercenaries",
+    "after_build_towers",
+    "after_provoke_demons",
+    # World update (WorldUpdatePhase.py)
+    "after_remove_dead",
+    "after_update_mercenaries",
+    "after_update_demons",
+    "after_spawn",
+    "before_update_towers",
+    "after_update_towers",
+    # After turns_remaining has gone down
+    "turn_end",
+)
+
+
+class PhaseHooks:
+    def __init__(self):
+        self.callbacks = defaultdict(list)
+
+    # Call callback(game_state, point) at a point, or at every point if point is None
+    def register(self, point, callback):
+        for point in (HOOK_POINTS if point is None else (point,)):
+            if point not in HOOK_POINTS:
+                raise ValueError(f"Unknown hook point {point}, expected one of {', '.join(HOOK_POINTS)}")
+            self.callbacks[point].append(callback)
+        return callback
+
+    def unregister(self, point, callback):
+        for point in (HOOK_POINTS if point is None else (point,)):
+            if callback in self.callbacks.get(point, ()):
+                self.callbacks[point].remove(callback)
+
+    # Called by the engine at each point
+    def fire(self, point, game_state):
+        for callback in self.callbacks.get(point, ()):
+            callback(game_state, point)
+
+
+# Hooks that time each stretch of the turn between two points, e.g. "after_update_demons" is the time from
+# after_update_mercenaries to after_update_demons.
+# Example: profiler = PhaseProfiler(); profiler.attach(hooks); ...play...; print(profiler.report())
+class PhaseProfiler:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.last_time = None
+
+    def attach(self, hooks: PhaseHooks):
+        hooks.register(None, self)
+
+    def __call__(self, game_state, point):
+        now = time.perf_counter()
+        if point != "turn_start" and self.last_time is not None:
+            self.seconds[point] += now - self.last_time
+            self.calls[point] += 1
+        self.last_time = now
+
+    # Total and mean milliseconds per stretch, in turn order
+    def report(self) -> str:
+        lines = []
+        for point in HOOK_POINTS:
+            if self.calls[point]:
+                total_ms = self.seconds[point] * 1000
+                lines.append(f"{point:<26} {total_ms:10.1f} ms total {total_ms / self.calls[point]:8.3f} ms/turn")
+        return "\n".join(lines)
@@ -11,6 +11,7 @@ def provoke_demons_phase(game_state: GameState, ai_action_r: AIAction, ai_action
     if ai_action_r.provoke_demons:
         if game_state.money_r >= Constants.PROVOKE_DEMONS_PRICE:
             game_state.money_r -= Constants.PROVOKE_DEMONS_PRICE
+            game_state.record_spend('r', Constants.PROVOKE_DEMONS_PRICE)
             provoked_r = True
             log_msg('Red provoked the demons!')
         else:
@@ -19,6 +20,7 @@ def provoke_demons_phase(game_state: GameState, ai_action_r: AIAction, ai_action
     if ai_action_b.provoke_demons:
         if game_state.money_b >= Constants.PROVOKE_DEMONS_PRICE:
             game_state.money_b -= Constants.PROVOKE_DEMONS_PRICE
+            game_state.record_spend('b', Constants.PROVOKE_DEMONS_PRICE)
             provoked_b = True
             log_msg('Blue provoked the demons!')
         else:
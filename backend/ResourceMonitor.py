@@ -0,0 +1,164 @@
+import os
+import time
+from Utils import log_msg
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; limits other than the think budget can't be enforced there
+    resource = None
+
+# What each agent costs the machine it runs on, and optional limits on it, so one runaway agent can't
+# slow down every other match on a shared tournament host.
+#
+# Recorded for every agent: initialization time (from sending the initial game state to getting the team name),
+# think time per turn (from sending the game state to getting the action),
+# bytes sent and received, and for agents running on this machine, CPU seconds and peak memory (read from
+# /proc, so only on Linux). summary() gives totals and think time percentiles, for the match result.
+#
+# Limits (ResourceLimits), all optional:
+#   memory_mb     - address space of a local agent process (RLIMIT_AS). Going over makes allocations fail.
+#   cpu_seconds   - CPU time of a local agent process for the whole match (RLIMIT_CPU). Going over kills it.
+#   think_seconds - think time an agent may use over the whole match, like a chess clock. Once it's used up,
+#                   the agent forfeits every turn it doesn't answer in time. Works for remote agents too.
+#   init_seconds  - time an agent may take to initialize and send its team name. Kept apart from the think budget,
+#                   since agents that load a model spend most of their time here.
+
+
+class ResourceLimits:
+    def __init__(self, memory_mb: float = None, cpu_seconds: float = None, think_seconds: float = None, init_seconds: float = None):
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.think_seconds = think_seconds
+        self.init_seconds = init_seconds
+
+    # Apply the memory and CPU limits to a process that has just started
+    def apply_to_process(self, pid: int):
+        limits = []
+        if self.memory_mb is not None:
+            limit = int(self.memory_mb * 1024 * 1024)
+            limits.append(('RLIMIT_AS', limit, limit))
+        if self.cpu_seconds is not None:
+            # The kernel sends SIGXCPU at the soft limit, which ends the process
+            limit = max(1, int(self.cpu_seconds))
+            limits.append(('RLIMIT_CPU', limit, limit + 1))
+        if not limits:
+            return
+        if resource is None or not hasattr(resource, 'prlimit'):
+            log_msg('Agent memory and CPU limits are not supported on this platform, ignoring them')
+            return
+        for name, soft, hard in limits:
+            try:
+                resource.prlimit(pid, getattr(resource, name), (soft, hard))
+            except (OSError, ValueError) as e:
+                log_msg(f'Could not set {name} on agent process {pid}: {e}')
+
+
+class ResourceMonitor:
+    # pid: the agent's process, if it runs on this machine
+    def __init__(self, pid: int = None, limits: ResourceLimits = None):
+        self.pid = pid
+        self.limits = limits or ResourceLimits()
+
+        self.init_time = None
+        self.init_start = None
+        self.think_times = []
+        # sum(think_times), kept as turns end so the budget check doesn't add them all up every turn
+        self.think_time_total = 0.0
+        self.turn_start = None
+        self.timed_out_turns = 0
+
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.largest_message_sent = 0
+
+        self.cpu_seconds = None
+        self.peak_rss_mb = None
+
+    def message_sent(self, message: str):
+        size = len(message.encode())
+        self.bytes_sent += size
+        self.largest_message_sent = max(self.largest_message_sent, size)
+
+    def line_received(self, line: str):
+        self.bytes_received += len(line.encode()) + 1
+
+    # Seconds the agent may take to initialize (None for no limit)
+    def init_timeout(self) -> float:
+        return self.limits.init_seconds
+
+    def init_started(self):
+        self.init_start = time.monotonic()
+
+    def init_ended(self):
+        if self.init_start is not None:
+            self.init_time = time.monotonic() - self.init_start
+            self.init_start = None
+        self.sample()
+
+    # Seconds the agent may take for this turn: turn_timeout (None for no limit), or less once the think budget runs low
+    def turn_timeout(self, turn_timeout: float = None) -> float:
+        if self.limits.think_seconds is None:
+            return turn_timeout
+        remaining = max(0.0, self.limits.think_seconds - self.think_time_total)
+        return remaining if turn_timeout is None else min(turn_timeout, remaining)
+
+    def turn_started(self):
+        self.turn_start = time.monotonic()
+
+    def turn_ended(self, timed_out: bool = False):
+        if self.turn_start is not None:
+            think_time = time.monotonic() - self.turn_start
+            self.think_times.append(think_time)
+            self.think_time_total += think_time
+            self.turn_start = None
+        if timed_out:
+            self.timed_out_turns += 1
+        self.sample()
+
+    # Read the agent process's CPU time and peak memory from /proc. Keeps the last reading once the process is gone.
+    def sample(self):
+        if self.pid is None:
+            return
+        try:
+            with open(f'/proc/{self.pid}/stat', 'r') as f:
+                # The command name (2nd field) is in parentheses and may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime, stime, cutime, cstime: fields 14 to 17, counting the pid as field 1
+            self.cpu_seconds = sum(int(ticks) for ticks in fields[11:15]) / os.sysconf('SC_CLK_TCK')
+            with open(f'/proc/{self.pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        self.peak_rss_mb = int(line.split()[1]) / 1024
+                        break
+        except (OSError, ValueError, IndexError):
+            pass
+
+    def summary(self) -> dict:
+        think_times = sorted(self.think_times)
+        return {
+            "InitTime": None if self.init_time is None else round(self.init_time, 6),
+            "Turns": len(think_times),
+            "TimedOutTurns": self.timed_out_turns,
+            "ThinkTime": {
+                "Total": round(self.think_time_total, 6),
+                "Mean": round(self.think_time_total / len(think_times), 6) if think_times else 0.0,
+                "P50": round(percentile(think_times, 50), 6),
+                "P90": round(percentile(think_times, 90), 6),
+                "P99": round(percentile(think_times, 99), 6),
+                "Max": round(think_times[-1], 6) if think_times else 0.0
+            },
+            "CpuSeconds": self.cpu_seconds,
+            "PeakRssMB": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+            "BytesSent": self.bytes_sent,
+            "BytesReceived": self.bytes_received,
+            "LargestMessageSent": self.largest_message_sent
+        }
+
+
+# Nearest-rank percentile of an already sorted list (0 for an empty one)
+def percentile(sorted_values: list, percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
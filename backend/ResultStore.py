@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+# Tournament results in a local SQLite database, with Elo ratings, for leaderboard, head-to-head and per-map queries
+# over any number of matches.
+#
+#   python Tournament.py coordinator ... --results_db results.db          (results go in as matches finish)
+#   python ResultStore.py results.db import tournament_results.jsonl      (or load a results file afterwards)
+#   python ResultStore.py results.db leaderboard
+#   python ResultStore.py results.db head_to_head <agent_a> <agent_b>
+#   python ResultStore.py results.db maps [--agent <agent>]
+#
+# Results are the lines Tournament.py writes (see Coordinator._record). add() buffers them and they're written in
+# batches, one transaction per batch; flush() writes whatever is buffered. A match is only stored once per ladder run
+# (its RunId and MatchId), so importing the same results twice changes nothing, while the same schedule played again
+# with another seed is stored next to the first.
+#
+# Ratings are updated incrementally as each played match is stored, in the order matches are stored, and kept in
+# their own table together with each agent's record, so the leaderboard never rescans the matches.
+# rerate() recomputes them all from the matches, e.g. after changing the K factor.
+
+ELO_INITIAL_RATING = 1500.0
+ELO_K_FACTOR = 24.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    run_id TEXT NOT NULL,
+    match_id TEXT NOT NULL,
+    map TEXT NOT NULL,
+    agent_r TEXT NOT NULL,
+    agent_b TEXT NOT NULL,
+    seed INTEGER,
+    status TEXT NOT NULL,
+    winner TEXT,
+    victory_reason TEXT,
+    turns INTEGER,
+    think_seconds_r REAL,
+    think_seconds_b REAL,
+    max_think_seconds_r REAL,
+    max_think_seconds_b REAL,
+    init_seconds_r REAL,
+    init_seconds_b REAL,
+    cpu_seconds_r REAL,
+    cpu_seconds_b REAL,
+    peak_rss_mb_r REAL,
+    peak_rss_mb_b REAL,
+    timed_out_turns_r INTEGER,
+    timed_out_turns_b INTEGER,
+    error TEXT,
+    stored_at REAL NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (run_id, match_id)
+);
+CREATE INDEX IF NOT EXISTS matches_by_agent_r ON matches (agent_r, agent_b, map);
+CREATE INDEX IF NOT EXISTS matches_by_agent_b ON matches (agent_b, agent_r, map);
+CREATE INDEX IF NOT EXISTS matches_by_map ON matches (map, status);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    agent TEXT PRIMARY KEY,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    ties INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ratings_by_rating ON ratings (rating DESC);
+"""
+
+MATCH_COLUMNS = (
+    "run_id", "match_id", "map", "agent_r", "agent_b", "seed", "status", "winner", "victory_reason", "turns",
+    "think_seconds_r", "think_seconds_b", "max_think_seconds_r", "max_think_seconds_b",
+    "init_seconds_r", "init_seconds_b", "cpu_seconds_r", "cpu_seconds_b",
+    "peak_rss_mb_r", "peak_rss_mb_b", "timed_out_turns_r", "timed_out_turns_b",
+    "error", "stored_at", "result"
+)
+
+
+# Red's score in a played match: 1 for a Red win, 0 for a Blue win, 0.5 otherwise (tie, or out of turns)
+def red_score(winner: str) -> float:
+    if winner == 'r':
+        return 1.0
+    if winner == 'b':
+        return 0.0
+    return 0.5
+
+
+# New ratings of Red and Blue after a match
+def elo_update(rating_r: float, rating_b: float, score_r: float, k_factor: float = ELO_K_FACTOR) -> tuple:
+    expected_r = 1.0 / (1.0 + 10 ** ((rating_b - rating_r) / 400.0))
+    change = k_factor * (score_r - expected_r)
+    return (rating_r + change, rating_b - change)
+
+
+# One row of the matches table from a result line
+def match_row(result: dict) -> tuple:
+    usage_r = result.get("ResourceUsageR") or {}
+    usage_b = result.get("ResourceUsageB") or {}
+    played = result["Status"] == "played"
+    values = {
+        "run_id": result.get("RunId", ""),
+        "match_id": result["MatchId"],
+        "map": result["Map"],
+        "agent_r": result["AgentR"],
+        "agent_b": result["AgentB"],
+        "seed": result.get("Seed"),
+        "status": result["Status"],
+        "winner": result.get("Victory", "") if played else None,
+        "victory_reason": result.get("VictoryReason"),
+        "turns": result.get("TurnsPlayed"),
+        "think_seconds_r": (usage_r.get("ThinkTime") or {}).get("Total"),
+        "think_seconds_b": (usage_b.get("ThinkTime") or {}).get("Total"),
+        "max_think_seconds_r": (usage_r.get("ThinkTime") or {}).get("Max"),
+        "max_think_seconds_b": (usage_b.get("ThinkTime") or {}).get("Max"),
+        "init_seconds_r": usage_r.get("InitTime"),
+        "init_seconds_b": usage_b.get("InitTime"),
+        "cpu_seconds_r": usage_r.get("CpuSeconds"),
+        "cpu_seconds_b": usage_b.get("CpuSeconds"),
+        "peak_rss_mb_r": usage_r.get("PeakRssMB"),
+        "peak_rss_mb_b": usage_b.get("PeakRssMB"),
+        "timed_out_turns_r": usage_r.get("TimedOutTurns"),
+        "timed_out_turns_b": usage_b.get("TimedOutTurns"),
+        "error": result.get("Error"),
+        "stored_at": time.time(),
+        "result": json.dumps(result)
+    }
+    return tuple(values[column] for column in MATCH_COLUMNS)
+
+
+class ResultStore:
+    # check_same_thread=False: the tournament coordinator stores results from its manager's threads, one at a time
+    def __init__(self, path: str, batch_size: int = 100, k_factor: float = ELO_K_FACTOR):
+        self.path = path
+        self.batch_size = batch_size
+        self.k_factor = k_factor
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        if "run_id" not in {row["name"] for row in self.connection.execute("PRAGMA table_info(matches)")}:
+            raise ValueError(f'{path} was made before matches were stored per ladder run; import the results files into a new database')
+        # Results not written yet
+        self.pending = []
+
+    def add(self, result: dict):
+        self.pending.append(result)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_all(self, results):
+        for result in results:
+            self.add(result)
+        self.flush()
+
+    # Write the buffered results and update the ratings, in one transaction. Returns how many were new.
+    # Only the matches that were actually inserted are rated, so a result stored before is never counted twice.
+    def flush(self) -> int:
+        if not self.pending:
+            return 0
+        results, self.pending = self.pending, []
+        placeholders = ", ".join("?" for _ in MATCH_COLUMNS)
+        insert = f"INSERT OR IGNORE INTO matches ({', '.join(MATCH_COLUMNS)}) VALUES ({placeholders})"
+
+        stored = 0
+        ratings = {}
+        with self.connection:
+            for result in results:
+                if self.connection.execute(insert, match_row(result)).rowcount == 0:
+                    continue
+                stored += 1
+                if result["Status"] == "played":
+                    self._rate(ratings, result["AgentR"], result["AgentB"], result.get("Victory", ""))
+            self._save_ratings(ratings)
+        return stored
+
+    # Recompute every rating from the played matches, in the order they were stored
+    def rerate(self):
+        self.flush()
+        ratings = {}
+        with self.connection:
+            self.connection.execute("DELETE FROM ratings")
+            for row in self.connection.execute("SELECT agent_r, agent_b, winner FROM matches WHERE status = 'played' ORDER BY rowid"):
+                self._rate(ratings, row["agent_r"], row["agent_b"], row["winner"])
+            self._save_ratings(ratings)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    # Agents by rating, best first, with their records
+    def leaderboard(self) -> list:
+        self.flush()
+        return [dict(row) for row in self.connection.execute(
+            "SELECT agent, rating, games, wins, losses, ties FROM ratings ORDER BY rating DESC"
+        )]
+
+    # How agent_a did against agent_b, on each map and overall, playing either color
+    def head_to_head(self, agent_a: str, agent_b: str) -> dict:
+        self.flush()
+        rows = self.connection.execute(
+            """
+            SELECT map, agent_r, winner FROM matches
+            WHERE status = 'played' AND ((agent_r = ? AND agent_b = ?) OR (agent_r = ? AND agent_b = ?))
+            """,
+            (agent_a, agent_b, agent_b, agent_a)
+        )
+        overall = {"Wins": 0, "Losses": 0, "Ties": 0}
+        maps = {}
+        for row in rows:
+            score = red_score(row["winner"]) if row["agent_r"] == agent_a else 1.0 - red_score(row["winner"])
+            outcome = "Wins" if score == 1.0 else "Losses" if score == 0.0 else "Ties"
+            overall[outcome] += 1
+            maps.setdefault(row["map"], {"Wins": 0, "Losses": 0, "Ties": 0})[outcome] += 1
+        return {"AgentA": agent_a, "AgentB": agent_b, **overall, "Maps": maps}
+
+    # Per map: matches played and failed, Red's win rate, and mean length. Only agent's matches, if given.
+    def map_summary(self, agent: str = None) -> list:
+        self.flush()
+        columns = """
+            map,
+            SUM(status = 'played') AS played,
+            SUM(status = 'failed') AS failed,
+            SUM(winner = 'r') AS red_wins,
+            SUM(winner = 'b') AS blue_wins,
+            AVG(CASE WHEN status = 'played' THEN turns END) AS mean_turns
+        """
+        if agent is None:
+            query = f"SELECT {columns} FROM matches GROUP BY map ORDER BY map"
+            parameters = ()
+        else:
+            # One indexed lookup per color
+            query = f"""
+                SELECT {columns} FROM (
+                    SELECT * FROM matches WHERE agent_r = ?
+                    UNION ALL
+                    SELECT * FROM matches WHERE agent_b = ? AND agent_r != ?
+                ) GROUP BY map ORDER BY map
+            """
+            parameters = (agent, agent, agent)
+        return [dict(row) for row in self.connection.execute(query, parameters)]
+
+    # Update ratings (agent -> row dict, filled from the table as agents come up) for one played match
+    def _rate(self, ratings: dict, agent_r: str, agent_b: str, winner: str):
+        row_r = self._rating_row(ratings, agent_r)
+        row_b = self._rating_row(ratings, agent_b)
+        score_r = red_score(winner)
+        row_r["rating"], row_b["rating"] = elo_update(row_r["rating"], row_b["rating"], score_r, self.k_factor)
+        for row, score in ((row_r, score_r), (row_b, 1.0 - score_r)):
+            row["games"] += 1
+            if score == 1.0:
+                row["wins"] += 1
+            elif score == 0.0:
+                row["losses"] += 1
+            else:
+                row["ties"] += 1
+
+    def _rating_row(self, ratings: dict, agent: str) -> dict:
+        if agent not in ratings:
+            row = self.connection.execute("SELECT * FROM ratings WHERE agent = ?", (agent,)).fetchone()
+            ratings[agent] = dict(row) if row else {"agent": agent, "rating": ELO_INITIAL_RATING, "games": 0, "wins": 0, "losses": 0, "ties": 0}
+        return ratings[agent]
+
+    def _save_ratings(self, ratings: dict):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO ratings (agent, rating, games, wins, losses, ties) VALUES (:agent, :rating, :games, :wins, :losses, :ties)",
+            ratings.values()
+        )
+
+
+def get_command_line_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Query and load the SQLite store of tournament results.')
+    parser.add_argument('database', help='SQLite database file (created if missing)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='Store the results from Tournament.py results files')
+    import_parser.add_argument('results_files', nargs='+', help='JSON lines results files')
+    commands.add_parser('leaderboard', help='Agents by Elo rating')
+    head_to_head_parser = commands.add_parser('head_to_head', help='How one agent did against another')
+    head_to_head_parser.add_argument('agent_a')
+    head_to_head_parser.add_argument('agent_b')
+    maps_parser = commands.add_parser('maps', help='Results per map')
+    maps_parser.add_argument('--agent', help='Only matches this agent played')
+    commands.add_parser('rerate', help='Recompute every rating from the stored matches')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    cmd_line_args = get_command_line_arguments()
+    if cmd_line_args.command != 'import' and not os.path.exists(cmd_line_args.database):
+        print(f'Results database not found: {cmd_line_args.database}')
+        exit(1)
+
+    try:
+        store = ResultStore(cmd_line_args.database)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    if cmd_line_args.command == 'import':
+        for results_file in cmd_line_args.results_files:
+            count = 0
+            with open(results_file, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        store.add(json.loads(line))
+                        count += 1
+            print(f'{results_file}: {count} results')
+    elif cmd_line_args.command == 'leaderboard':
+        for row in store.leaderboard():
+            print(f'{row["rating"]:7.1f} {row["wins"]:5} W {row["losses"]:5} L {row["ties"]:5} T  {row["agent"]}')
+    elif cmd_line_args.command == 'head_to_head':
+        record = store.head_to_head(cmd_line_args.agent_a, cmd_line_args.agent_b)
+        print(f'{record["Wins"]} W {record["Losses"]} L {record["Ties"]} T  {record["AgentA"]} against {record["AgentB"]}')
+        for map_file, counts in sorted(record["Maps"].items()):
+            print(f'  {counts["Wins"]:4} W {counts["Losses"]:4} L {counts["Ties"]:4} T  {map_file}')
+    elif cmd_line_args.command == 'maps':
+        for row in store.map_summary(cmd_line_args.agent):
+            mean_turns = f'{row["mean_turns"]:.1f}' if row["mean_turns"] is not None else '-'
+            print(f'{row["played"]:5} played {row["failed"]:3} failed  Red {row["red_wins"] or 0:5} Blue {row["blue_wins"] or 0:5}  {mean_turns:>6} turns  {row["map"]}')
+    elif cmd_line_args.command == 'rerate':
+        store.rerate()
+    store.close()
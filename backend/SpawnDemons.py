@@ -16,7 +16,7 @@ def spawn_demons(game_state: GameState, provoke_demons: bool):
         if provoke_demons:
             spawner.queued += 1
 
-        at_target_space = game_state.entity_grid[spawner.y][spawner.x]
+        at_target_space = game_state.entity_grid.get(spawner.x, spawner.y)
 
         # Wait to spawn until space is clear
         if spawner.queued > 0:
@@ -28,7 +28,7 @@ def spawn_demons(game_state: GameState, provoke_demons: bool):
                     spawner.activation_count,
                     game_state
                 )
-                game_state.entity_grid[new_demon.y][new_demon.x] = new_demon
+                game_state.entity_grid.set(new_demon.x, new_demon.y, new_demon)
                 game_state.demons.append(new_demon)
 
                 spawner.queued -= 1
@@ -0,0 +1,171 @@
+import json
+import queue
+import socket
+import threading
+from Utils import log_msg
+
+# Broadcasts the per-turn game state stream to any number of spectators over TCP.
+#
+# Wire format: one JSON object per line.
+#   {"Type": "Full",  "Frame": n, "State": {...}}    complete game state
+#   {"Type": "Delta", "Frame": n, "Changed": {...}}  top-level keys that changed since frame n-1
+#
+# A spectator always starts with a Full frame. If a spectator can't keep up, frames are dropped
+# for that spectator only, and it gets a Full frame again once it has room. The engine never waits on spectators.
+
+
+# Apply one message from the stream to a spectator's copy of the game state and return the new state
+def apply_frame(game_state: dict, message: dict) -> dict:
+    if message["Type"] == "Full":
+        return message["State"]
+    new_state = dict(game_state)
+    new_state.update(message["Changed"])
+    return new_state
+
+
+class _Spectator:
+    def __init__(self, connection: socket.socket, max_queued_frames: int):
+        self.connection = connection
+        self.frames = queue.Queue(maxsize=max_queued_frames)
+        # Set when a frame had to be dropped, so the next frame must be a Full frame
+        self.needs_keyframe = True
+
+
+class SpectatorServer:
+    def __init__(self, port: int, host: str = '127.0.0.1', max_queued_frames: int = 32):
+        self.max_queued_frames = max_queued_frames
+        self.spectators = []
+        self.writers = []
+        self.lock = threading.Lock()
+        self.running = False
+
+        # Game states handed over by the engine, waiting to be encoded and fanned out
+        self.pending_states = queue.Queue(maxsize=max_queued_frames)
+        self.frame_number = 0
+        # Set by publish() when a state had to be dropped before it was broadcast
+        self.dropped_state = False
+        self.last_state = None
+        self.last_full_message = None
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self.broadcaster = threading.Thread(target=self._broadcast_loop, daemon=True)
+        self.broadcaster.start()
+        log_msg(f'Spectator server listening on port {self.port}')
+
+    # Called by the engine once per game state. Never blocks.
+    def publish(self, game_state_json: str):
+        try:
+            self.pending_states.put_nowait(game_state_json)
+        except queue.Full:
+            # The broadcaster itself fell behind: drop this state, everybody resyncs on the next one
+            self.dropped_state = True
+
+    # Stop accepting spectators, and send out every state published so far before hanging up
+    def close(self, timeout: float = 1.0):
+        self.running = False
+        self.pending_states.put(None)
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+        self.broadcaster.join(timeout)
+        for writer in list(self.writers):
+            writer.join(timeout)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            spectator = _Spectator(connection, self.max_queued_frames)
+            with self.lock:
+                self.spectators.append(spectator)
+                # Late joiners start from the most recent state
+                if self.last_full_message is not None:
+                    self._offer(spectator, self.last_full_message)
+                    spectator.needs_keyframe = False
+                writer = threading.Thread(target=self._write_loop, args=(spectator,), daemon=True)
+                self.writers.append(writer)
+            writer.start()
+
+    def _broadcast_loop(self):
+        while True:
+            game_state_json = self.pending_states.get()
+            if game_state_json is None:
+                # Match is over: let each writer drain what it already has queued, then hang up
+                with self.lock:
+                    for spectator in self.spectators:
+                        if not self._offer(spectator, None):
+                            spectator.connection.close()
+                return
+
+            if self.dropped_state:
+                self.dropped_state = False
+                self.last_state = None
+
+            state = json.loads(game_state_json)
+            self.frame_number += 1
+            full_message = json.dumps({"Type": "Full", "Frame": self.frame_number, "State": state}) + "\n"
+            delta_message = None
+            if self.last_state is not None:
+                changed = {key: value for key, value in state.items() if self.last_state.get(key) != value}
+                delta_message = json.dumps({"Type": "Delta", "Frame": self.frame_number, "Changed": changed}) + "\n"
+            self.last_state = state
+
+            with self.lock:
+                self.last_full_message = full_message
+                for spectator in self.spectators:
+                    if spectator.needs_keyframe or delta_message is None:
+                        if self._offer(spectator, full_message):
+                            spectator.needs_keyframe = False
+                    elif not self._offer(spectator, delta_message):
+                        spectator.needs_keyframe = True
+
+    # Queue a message for one spectator without blocking. Return False if it was dropped.
+    def _offer(self, spectator: _Spectator, message) -> bool:
+        try:
+            spectator.frames.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+    def _write_loop(self, spectator: _Spectator):
+        try:
+            while True:
+                message = spectator.frames.get()
+                if message is None:
+                    break
+                spectator.connection.sendall(message.encode())
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if spectator in self.spectators:
+                    self.spectators.remove(spectator)
+            spectator.connection.close()
+
+
+# Minimal spectator: connect to a running match and print each reconstructed game state
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Watch a live match from a SpectatorServer.')
+    parser.add_argument('port', type=int, help='Port the match is broadcasting on')
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+
+    game_state = {}
+    with socket.create_connection((args.host, args.port)) as connection:
+        for line in connection.makefile('r'):
+            game_state = apply_frame(game_state, json.loads(line))
+            print(json.dumps(game_state), flush=True)
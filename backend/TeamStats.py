@@ -0,0 +1,67 @@
+# Running totals for one team. GameState keeps one per team (stats_r, stats_b) and its record_* methods
+# update them as things happen, so the engine, the RL environment and the state JSON can read them
+# without rescanning the tower and mercenary lists.
+
+TOWER_TYPES = ("House", "Crossbow", "Cannon", "Minigun", "Church")
+
+class TeamStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Towers standing right now, by type
+        self.towers = {tower_type: 0 for tower_type in TOWER_TYPES}
+        self.tower_count = 0
+        # Sum of the base prices of the towers standing right now
+        self.tower_value = 0
+
+        # Mercenaries on the board. Dying ones were killed this turn; they stay in GameState.mercs
+        # (and in the JSON) until the start of the next world update.
+        self.mercs_alive = 0
+        self.merc_health = 0
+        self.mercs_dying = 0
+        self.dying_merc_health = 0
+
+        # Totals over the whole game
+        self.money_spent = 0
+        self.money_refunded = 0
+        self.income = 0
+        self.mercs_spawned = 0
+        self.mercs_lost = 0
+        self.damage_dealt = 0
+        self.base_damage_dealt = 0
+
+    def copy(self) -> 'TeamStats':
+        new_stats = TeamStats.__new__(TeamStats)
+        new_stats.__dict__.update(self.__dict__)
+        new_stats.towers = dict(self.towers)
+        return new_stats
+
+    def to_dict(self) -> dict:
+        return {
+            "Towers" : dict(self.towers),
+            "TowerCount" : self.tower_count,
+            "TowerValue" : self.tower_value,
+            "MercenariesAlive" : self.mercs_alive,
+            "MercenaryHealth" : self.merc_health,
+            "MercenariesDying" : self.mercs_dying,
+            "DyingMercenaryHealth" : self.dying_merc_health,
+            "MoneySpent" : self.money_spent,
+            "MoneyRefunded" : self.money_refunded,
+            "Income" : self.income,
+            "MercenariesSpawned" : self.mercs_spawned,
+            "MercenariesLost" : self.mercs_lost,
+            "DamageDealt" : self.damage_dealt,
+            "BaseDamageDealt" : self.base_damage_dealt,
+        }
+
+    # Totals over the whole game, from a dict made by to_dict. Counts of what's on the board
+    # are left alone; GameState.recount_stats works those out from the entities.
+    def load_totals(self, stats_dict: dict):
+        self.money_spent = stats_dict.get("MoneySpent", 0)
+        self.money_refunded = stats_dict.get("MoneyRefunded", 0)
+        self.income = stats_dict.get("Income", 0)
+        self.mercs_spawned = stats_dict.get("MercenariesSpawned", 0)
+        self.mercs_lost = stats_dict.get("MercenariesLost", 0)
+        self.damage_dealt = stats_dict.get("DamageDealt", 0)
+        self.base_damage_dealt = stats_dict.get("BaseDamageDealt", 0)
@@ -0,0 +1,527 @@
+import argparse
+import collections
+import hashlib
+import ipaddress
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.managers import BaseManager
+from AgentConnection import AGENT_KEY_VARIABLE, ZYGOTE_PREFIX, check_agent_address, parse_agent_address
+from MapCompiler import check_map
+from ResourceMonitor import ResourceLimits
+from ResultStore import ResultStore
+
+# Round-robin ladders spread over any number of machines.
+#
+# The coordinator owns the match queue and the results file. Workers (one per core, on any machine with a
+# checkout of this repo) connect to it, pull match specs (map, agents, seed), play them with the headless
+# engine (main.run_match) and report the result back.
+#
+#   python Tournament.py coordinator --agents ../AI_Agents/ExampleAgentRuleBased.py ../AI_Agents/ppo_agent.py --maps ../maps/*.json --local_workers 4
+#   python Tournament.py --authkey <secret> coordinator --host 0.0.0.0 ...      (to take workers from other machines)
+#   python Tournament.py --authkey <secret> worker --coordinator 10.0.0.5:50000  (on every other machine, from the backend directory)
+#
+# Workers talk to the coordinator with pickles, so anyone who can connect with the authkey can run code on it.
+# The coordinator only listens on this machine unless --host says otherwise. Without --authkey it makes up a random
+# key, and prints it if the host isn't a loopback address.
+#
+# Agent and map paths are sent to workers as given, so run every process from the same directory layout.
+# An agent can also be the HOST:PORT of an AgentServer; give its key with --agent_key to every process that plays matches.
+#
+# - A worker holds a lease on its match and renews it while the match runs. If the lease runs out
+#   (worker crashed, machine lost, network down) the match goes back in the queue.
+# - A failed match is retried up to --max_attempts times, then recorded as failed.
+# - Every match has a stable id. Only the first result for an id is kept, so a worker that comes back
+#   after its match was reassigned can't count a match twice, and rerunning the coordinator with the
+#   same results file only plays the matches that are missing.
+# - Every ladder run has an id too (--run_id, by default made from the seed), stored with each result.
+#   Results of other runs in the same results file or database are kept apart, not taken for this run's.
+
+# Every worker process and every match process is started fresh, so no game state leaks between matches
+_mp = multiprocessing.get_context('spawn')
+
+
+class TournamentManager(BaseManager):
+    pass
+
+
+# Every map, every ordered pair of different agents (so each plays both colors), `rounds` times.
+# Seeds are derived from the match id, so a match replays identically no matter which worker gets it.
+def build_schedule(agents: list, maps: list, rounds: int, seed: int, run_id: str = None) -> list:
+    run_id = default_run_id(seed) if run_id is None else run_id
+    schedule = []
+    for map_file in maps:
+        for agent_r in agents:
+            for agent_b in agents:
+                if agent_r == agent_b:
+                    continue
+                for round_number in range(rounds):
+                    match_id = f'{map_file}|{agent_r}|{agent_b}|{round_number}'
+                    schedule.append({
+                        "RunId": run_id,
+                        "MatchId": match_id,
+                        "Map": map_file,
+                        "AgentR": agent_r,
+                        "AgentB": agent_b,
+                        "Seed": random.Random(f'{seed}|{match_id}').randrange(2 ** 32)
+                    })
+    return schedule
+
+
+# Ladders with the same seed play the same matches, so by default they're the same run
+def default_run_id(seed: int) -> str:
+    return f'seed-{seed}'
+
+
+# Lives in the coordinator process. Workers call its methods through a TournamentManager proxy,
+# from many connections at once, so everything happens under self.lock.
+# If a ResultStore is given, every result also goes into it (see ResultStore.py).
+class Coordinator:
+    def __init__(self, schedule: list, results_file: str, lease_timeout: float, match_timeout: float, max_attempts: int, store: ResultStore = None):
+        self.lease_timeout = lease_timeout
+        self.match_timeout = match_timeout
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+        self.specs = {spec["MatchId"]: spec for spec in schedule}
+        # match id -> result line, for every match that has a result (played or failed for good)
+        self.results = {}
+        self.results_file = results_file
+        if os.path.exists(results_file):
+            with open(results_file, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        result = json.loads(line)
+                        match_id = result["MatchId"]
+                        if match_id in self.specs and result.get("RunId", "") == self.specs[match_id]["RunId"]:
+                            self.results[match_id] = result
+        self.output = open(results_file, 'a')
+        self.store = store
+        if store is not None:
+            # Results from an earlier run of this ladder that the store doesn't have yet
+            store.add_all(self.results.values())
+
+        self.pending = collections.deque(match_id for match_id in self.specs if match_id not in self.results)
+        # match id -> {"Worker", "Started", "Renewed"}
+        self.leases = {}
+        self.attempts = collections.Counter()
+        # worker id -> {"Host", "LastSeen", "MatchesPlayed"}
+        self.workers = {}
+        self.next_worker_number = 1
+
+    def register_worker(self, host: str) -> str:
+        with self.lock:
+            worker_id = f'{host}-{self.next_worker_number}'
+            self.next_worker_number += 1
+            self.workers[worker_id] = {"Host": host, "LastSeen": time.monotonic(), "MatchesPlayed": 0}
+            return worker_id
+
+    # Returns ("match", spec), ("wait", None) while the last matches are still leased out, or ("done", None)
+    def next_match(self, worker_id: str) -> tuple:
+        with self.lock:
+            self._seen(worker_id)
+            while self.pending:
+                match_id = self.pending.popleft()
+                if match_id in self.results or match_id in self.leases:
+                    continue
+                now = time.monotonic()
+                self.leases[match_id] = {"Worker": worker_id, "Started": now, "Renewed": now}
+                self.attempts[match_id] += 1
+                spec = dict(self.specs[match_id])
+                spec["Attempt"] = self.attempts[match_id]
+                spec["Timeout"] = self.match_timeout
+                return ("match", spec)
+            if self.leases:
+                return ("wait", None)
+            return ("done", None)
+
+    # Renew the lease on a running match. Returns False if the worker should give up on it.
+    def heartbeat(self, worker_id: str, match_id: str) -> bool:
+        with self.lock:
+            self._seen(worker_id)
+            lease = self.leases.get(match_id)
+            if lease is None or lease["Worker"] != worker_id:
+                return match_id not in self.results
+            lease["Renewed"] = time.monotonic()
+            return True
+
+    # Returns False if the match already had a result and this one was dropped
+    def report_result(self, worker_id: str, match_id: str, attempt: int, result: dict) -> bool:
+        with self.lock:
+            self._seen(worker_id)
+            self._release(worker_id, match_id)
+            if match_id in self.results:
+                return False
+            self.workers[worker_id]["MatchesPlayed"] += 1
+            self._record(match_id, {"Status": "played", "Worker": worker_id, "Attempt": attempt, **result})
+            return True
+
+    def report_failure(self, worker_id: str, match_id: str, attempt: int, error: str):
+        with self.lock:
+            self._seen(worker_id)
+            self._release(worker_id, match_id)
+            print(f'Match {match_id} failed on {worker_id} (attempt {attempt}): {error}', file=sys.stderr)
+            self._retry_or_give_up(match_id, error)
+
+    # Take back matches whose worker stopped renewing the lease, or that ran too long
+    def expire_leases(self):
+        with self.lock:
+            now = time.monotonic()
+            for match_id, lease in list(self.leases.items()):
+                if now - lease["Renewed"] > self.lease_timeout:
+                    reason = f'lost contact with worker {lease["Worker"]}'
+                elif now - lease["Started"] > self.match_timeout + self.lease_timeout:
+                    reason = f'worker {lease["Worker"]} went over the match timeout'
+                else:
+                    continue
+                print(f'Match {match_id}: {reason}', file=sys.stderr)
+                del self.leases[match_id]
+                self._retry_or_give_up(match_id, reason)
+
+    def status(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            return {
+                "Total": len(self.specs),
+                "Finished": sum(1 for match_id in self.specs if match_id in self.results),
+                "Running": len(self.leases),
+                "Workers": sum(1 for worker in self.workers.values() if now - worker["LastSeen"] <= self.lease_timeout)
+            }
+
+    def is_finished(self) -> bool:
+        with self.lock:
+            return not self.leases and all(match_id in self.results for match_id in self.specs)
+
+    def results_for_schedule(self) -> list:
+        with self.lock:
+            return [self.results[match_id] for match_id in self.specs if match_id in self.results]
+
+    # Write the results the store is holding back for its next batch
+    def flush_store(self):
+        with self.lock:
+            if self.store is not None:
+                self.store.flush()
+
+    def _seen(self, worker_id: str):
+        worker = self.workers.setdefault(worker_id, {"Host": worker_id, "LastSeen": 0, "MatchesPlayed": 0})
+        worker["LastSeen"] = time.monotonic()
+
+    def _release(self, worker_id: str, match_id: str):
+        lease = self.leases.get(match_id)
+        if lease is not None and lease["Worker"] == worker_id:
+            del self.leases[match_id]
+
+    def _retry_or_give_up(self, match_id: str, error: str):
+        if match_id in self.results:
+            return
+        if self.attempts[match_id] < self.max_attempts:
+            self.pending.append(match_id)
+        else:
+            self._record(match_id, {"Status": "failed", "Error": error, "Attempt": self.attempts[match_id]})
+
+    def _record(self, match_id: str, outcome: dict):
+        spec = self.specs[match_id]
+        result = {
+            "RunId": spec["RunId"],
+            "MatchId": match_id,
+            "Map": spec["Map"],
+            "AgentR": spec["AgentR"],
+            "AgentB": spec["AgentB"],
+            "Seed": spec["Seed"],
+            **outcome
+        }
+        self.results[match_id] = result
+        self.output.write(json.dumps(result) + '\n')
+        self.output.flush()
+        if self.store is not None:
+            self.store.add(result)
+
+
+# Wins/losses/ties per agent, best first
+def standings(results: list) -> list:
+    table = {}
+    for result in results:
+        if result["Status"] != "played":
+            continue
+        for agent, team in ((result["AgentR"], 'r'), (result["AgentB"], 'b')):
+            row = table.setdefault(agent, {"Agent": agent, "Wins": 0, "Losses": 0, "Ties": 0})
+            if result["Victory"] == team:
+                row["Wins"] += 1
+            elif result["Victory"] in ('r', 'b'):
+                row["Losses"] += 1
+            else:
+                row["Ties"] += 1
+    return sorted(table.values(), key=lambda row: (row["Wins"] + 0.5 * row["Ties"], -row["Losses"]), reverse=True)
+
+
+# If the worker dies, take the match and its agent processes down with it
+def _watch_worker(worker_pid: int):
+    while os.getppid() == worker_pid:
+        time.sleep(1.0)
+    os.killpg(0, signal.SIGKILL)
+
+
+# Runs in its own process group, so the worker can stop it together with its agent processes
+def _play_match(spec: dict, result_connection, log_file: str):
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+        threading.Thread(target=_watch_worker, args=(os.getppid(),), daemon=True).start()
+    # The engine logs through stderr
+    sys.stderr = open(log_file, 'a') if log_file else open(os.devnull, 'w')
+    try:
+        from main import run_match
+        limits = ResourceLimits(**spec["Limits"])
+        result = run_match(spec["Map"], spec["AgentR"], spec["AgentB"], seed=spec["Seed"], turn_timeout=spec["TurnTimeout"], limits=limits, metrics_file=spec["MetricsFile"])
+        if spec["MetricsFile"]:
+            result["MetricsFile"] = spec["MetricsFile"]
+        result_connection.send(("result", result))
+    except Exception:
+        result_connection.send(("error", traceback.format_exc()))
+
+
+def _stop_match(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        process.kill()
+    process.join()
+
+
+# Where a match's per-turn metrics go, in the worker's metrics directory: one .npz per match, named after its id
+def metrics_file_for(metrics_dir: str, match_id: str) -> str:
+    return os.path.join(metrics_dir, hashlib.sha1(match_id.encode()).hexdigest()[:16] + '.npz')
+
+
+# limits: keyword arguments for each match's ResourceLimits
+# metrics_dir: if given, save every match's per-turn metrics there (see MetricsRecorder.py)
+def run_worker(address: tuple, authkey: bytes, turn_timeout: float, log_file: str, poll_interval: float, heartbeat_interval: float, limits: dict = None, metrics_dir: str = None):
+    TournamentManager.register('coordinator')
+    manager = TournamentManager(address=address, authkey=authkey)
+    manager.connect()
+    coordinator = manager.coordinator()
+    worker_id = coordinator.register_worker(socket.gethostname())
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+    print(f'Worker {worker_id} connected to {address[0]}:{address[1]}', flush=True)
+
+    try:
+        while True:
+            status, spec = coordinator.next_match(worker_id)
+            if status == "done":
+                break
+            if status == "wait":
+                time.sleep(poll_interval)
+                continue
+
+            spec["TurnTimeout"] = turn_timeout
+            spec["Limits"] = limits or {}
+            spec["MetricsFile"] = metrics_file_for(metrics_dir, spec["MatchId"]) if metrics_dir else None
+            receive_end, send_end = _mp.Pipe(duplex=False)
+            process = _mp.Process(target=_play_match, args=(spec, send_end, log_file), daemon=True)
+            process.start()
+            send_end.close()
+
+            outcome = None
+            deadline = time.monotonic() + spec["Timeout"]
+            while outcome is None:
+                if receive_end.poll(heartbeat_interval):
+                    try:
+                        outcome = receive_end.recv()
+                    except EOFError:
+                        process.join()
+                        outcome = ("error", f'match process exited with code {process.exitcode}')
+                elif time.monotonic() > deadline:
+                    _stop_match(process)
+                    outcome = ("error", f'match took longer than {spec["Timeout"]} seconds')
+                elif not coordinator.heartbeat(worker_id, spec["MatchId"]):
+                    # Somebody else already finished this match
+                    _stop_match(process)
+                    outcome = ("abandoned", None)
+            process.join()
+            receive_end.close()
+
+            kind, payload = outcome
+            if kind == "result":
+                coordinator.report_result(worker_id, spec["MatchId"], spec["Attempt"], payload)
+            elif kind == "error":
+                coordinator.report_failure(worker_id, spec["MatchId"], spec["Attempt"], payload)
+    except (EOFError, ConnectionError):
+        print(f'Worker {worker_id} lost the coordinator, stopping', flush=True)
+        return
+    print(f'Worker {worker_id} finished', flush=True)
+
+
+def run_coordinator(cmd_line_args: argparse.Namespace):
+    if cmd_line_args.authkey is None:
+        cmd_line_args.authkey = secrets.token_hex(16)
+        if not is_loopback(cmd_line_args.host):
+            print(f'Workers on other machines need --authkey {cmd_line_args.authkey}', flush=True)
+    authkey = cmd_line_args.authkey.encode()
+    schedule = build_schedule(cmd_line_args.agents, cmd_line_args.maps, cmd_line_args.rounds, cmd_line_args.seed, cmd_line_args.run_id)
+    coordinator = Coordinator(
+        schedule,
+        cmd_line_args.results,
+        cmd_line_args.lease_timeout,
+        cmd_line_args.match_timeout,
+        cmd_line_args.max_attempts,
+        ResultStore(cmd_line_args.results_db) if cmd_line_args.results_db else None
+    )
+
+    TournamentManager.register('coordinator', callable=lambda: coordinator)
+    manager = TournamentManager(address=(cmd_line_args.host, cmd_line_args.port), authkey=authkey)
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.address[1]
+    print(f'Coordinating {len(schedule)} matches on port {port}', flush=True)
+
+    # Local stand-in for a cluster: worker processes on this machine
+    local_workers = []
+    for _ in range(cmd_line_args.local_workers):
+        worker = _mp.Process(
+            target=run_worker,
+            args=(('127.0.0.1', port), authkey, cmd_line_args.turn_timeout, None, 1.0, cmd_line_args.lease_timeout / 3, agent_limits(cmd_line_args), cmd_line_args.metrics_dir)
+        )
+        worker.start()
+        local_workers.append(worker)
+
+    last_status = None
+    while not coordinator.is_finished():
+        time.sleep(1.0)
+        coordinator.expire_leases()
+        coordinator.flush_store()
+        status = coordinator.status()
+        if status != last_status:
+            print(f'{status["Finished"]}/{status["Total"]} matches finished, {status["Running"]} running, {status["Workers"]} workers', flush=True)
+            last_status = status
+
+    for worker in local_workers:
+        worker.join()
+
+    print(f'Results written to {cmd_line_args.results}')
+    if coordinator.store is not None:
+        coordinator.store.close()
+        print(f'Results stored in {cmd_line_args.results_db}; see ResultStore.py for leaderboard, head-to-head and per-map queries')
+    for row in standings(coordinator.results_for_schedule()):
+        print(f'{row["Wins"]:4} W {row["Losses"]:4} L {row["Ties"]:4} T  {row["Agent"]}')
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# Limits on the agents in every match a worker plays (see ResourceMonitor.py)
+def agent_limits(cmd_line_args: argparse.Namespace) -> dict:
+    return {
+        "memory_mb": cmd_line_args.memory_limit,
+        "cpu_seconds": cmd_line_args.cpu_limit,
+        "think_seconds": cmd_line_args.think_budget,
+        "init_seconds": cmd_line_args.init_budget
+    }
+
+
+def get_command_line_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Run a round-robin ApocaWarlords ladder across many worker processes and machines.')
+    parser.add_argument('--authkey', help='Shared secret between the coordinator and its workers. Workers must be given it; a coordinator without one makes up a random key.')
+    parser.add_argument('--agent_key', help=f'Shared secret of the AgentServers in the ladder (default: ${AGENT_KEY_VARIABLE})')
+    parser.add_argument('--turn_timeout', type=float, default=10.0, help='Seconds a remote agent gets to answer each turn')
+    parser.add_argument('--memory_limit', type=float, help='Megabytes of address space each local agent process may use')
+    parser.add_argument('--cpu_limit', type=float, help='CPU seconds each local agent process may use in a match')
+    parser.add_argument('--think_budget', type=float, help='Seconds each agent may think over a whole match')
+    parser.add_argument('--init_budget', type=float, help='Seconds each agent may take to initialize, apart from its think budget')
+    parser.add_argument('--metrics_dir', help='Save the per-turn metrics of every match as a .npz file in this directory, on the machine that plays it')
+    subparsers = parser.add_subparsers(dest='role', required=True)
+
+    coordinator_parser = subparsers.add_parser('coordinator', help='Hand out matches and collect results')
+    coordinator_parser.add_argument('--agents', nargs='+', required=True, help='Agent files (or HOST:PORT of AgentServers, or zygote:<socket> of AgentZygotes) in the ladder')
+    coordinator_parser.add_argument('--maps', nargs='+', required=True, help='Map JSON files to play on')
+    coordinator_parser.add_argument('--rounds', type=int, default=1, help='Matches per map and ordered pair of agents')
+    coordinator_parser.add_argument('--seed', type=int, default=0, help='Ladder seed; every match seed is derived from it')
+    coordinator_parser.add_argument('--run_id', help='Id of this ladder run, stored with its results (default: seed-<seed>). Matches this run already has in the results file are skipped.')
+    coordinator_parser.add_argument('--results', default='tournament_results.jsonl', help='JSON lines file of results. Matches of the same run already in it are skipped.')
+    coordinator_parser.add_argument('--results_db', help='Also store the results, with Elo ratings, in this SQLite database (see ResultStore.py)')
+    coordinator_parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on for workers (0.0.0.0 for workers on other machines)')
+    coordinator_parser.add_argument('--port', type=int, default=50000, help='TCP port to listen on for workers (0 picks a free port)')
+    coordinator_parser.add_argument('--local_workers', type=int, default=0, help='Worker processes to start on this machine')
+    coordinator_parser.add_argument('--lease_timeout', type=float, default=30.0, help='Seconds without a heartbeat before a match is given to another worker')
+    coordinator_parser.add_argument('--match_timeout', type=float, default=600.0, help='Seconds a single match may take')
+    coordinator_parser.add_argument('--max_attempts', type=int, default=3, help='Times a match is tried before it is recorded as failed')
+
+    worker_parser = subparsers.add_parser('worker', help='Play matches for a coordinator')
+    worker_parser.add_argument('--coordinator', required=True, help='HOST:PORT of the coordinator')
+    worker_parser.add_argument('--log_file', help='Append the engine log of every match to this file')
+    worker_parser.add_argument('--heartbeat_interval', type=float, default=5.0, help='Seconds between lease renewals')
+    return parser.parse_args()
+
+
+def validate_command_line_arguments(cmd_line_args: argparse.Namespace) -> str:
+    for name, value in agent_limits(cmd_line_args).items():
+        if value is not None and value <= 0:
+            return f'Agent limit {name} must be positive: {value}'
+
+    if cmd_line_args.role == 'worker':
+        if not cmd_line_args.authkey:
+            return 'Workers need the coordinator\'s --authkey'
+        try:
+            parse_agent_address(cmd_line_args.coordinator)
+        except ValueError:
+            return f'Coordinator address must look like HOST:PORT, got "{cmd_line_args.coordinator}"'
+        return ""
+
+    if len(set(cmd_line_args.agents)) < 2:
+        return 'A ladder needs at least two different agents'
+    for agent in cmd_line_args.agents:
+        if not os.path.exists(agent):
+            try:
+                check_agent_address(agent)
+            except ValueError as e:
+                return str(e) if agent.startswith(ZYGOTE_PREFIX) else f'AI agent file not found: {agent}'
+    for map_file in cmd_line_args.maps:
+        if not os.path.exists(map_file):
+            return f'Map file not found: {map_file}'
+        # A broken map would otherwise fail every match on it, one by one
+        try:
+            check_map(map_file)
+        except (OSError, ValueError) as e:
+            return f'Map {map_file} is broken: {e}'
+    if cmd_line_args.rounds < 1 or cmd_line_args.max_attempts < 1:
+        return 'Rounds and max attempts must be at least 1'
+    return ""
+
+
+if __name__ == '__main__':
+    cmd_line_args = get_command_line_arguments()
+    err = validate_command_line_arguments(cmd_line_args)
+    if err != "":
+        print(err)
+        exit(1)
+
+    # Through the environment, so it reaches the processes every match is played in
+    if cmd_line_args.agent_key:
+        os.environ[AGENT_KEY_VARIABLE] = cmd_line_args.agent_key
+
+    if cmd_line_args.role == 'coordinator':
+        run_coordinator(cmd_line_args)
+    else:
+        run_worker(
+            parse_agent_address(cmd_line_args.coordinator),
+            cmd_line_args.authkey.encode(),
+            cmd_line_args.turn_timeout,
+            cmd_line_args.log_file,
+            1.0,
+            cmd_line_args.heartbeat_interval,
+            agent_limits(cmd_line_args),
+            cmd_line_args.metrics_dir
+        )
@@ -1,5 +1,4 @@
 import math
-import random
 import Constants
 
 from Entity import Entity
@@ -10,6 +9,10 @@ from Demon import Demon
 from Utils import log_msg
 
 class Tower(Entity):
+    # Set by each kind of tower: its name in the game state JSON, and its price before any were bought
+    type_name = ""
+    base_price = 0
+
     def __init__(
         self,
         x: int,
@@ -35,6 +38,8 @@ class Tower(Entity):
             raise Exception("Tower team_color must be 'r' or 'b'") # TF2 reference?
         
         self.path = self.find_all_paths_in_range(game_state)
+        # The same tiles as indices into game_state.entity_grid
+        self.path_indices = game_state.entity_grid.indices(self.path)
     
 
     # Called everytime the tower is updated
@@ -60,14 +65,12 @@ class Tower(Entity):
         health_buff = Constants.CHURCH_BUFF_HEALTH
         dmg_buff = Constants.CHURCH_BUFF_DAMAGE
 
-        for path in self.path:
-            whats_on_path = game_state.entity_grid[path[1]][path[0]]
-
-            if whats_on_path is None: continue
+        for whats_on_path in game_state.entity_grid.occupants(self.path_indices):
             if (isinstance(whats_on_path, Mercenary) and whats_on_path.state != 'dead' and whats_on_path.team == self.team):
 
                 whats_on_path.health += health_buff
                 whats_on_path.attack_pow += dmg_buff
+                game_state.record_buff(whats_on_path, health_buff)
                 self.targets.append((whats_on_path.x, whats_on_path.y))
                 # self.angle = math.atan2(path[1] - self.y, path[0] - self.x)
 
@@ -81,32 +84,33 @@ class Tower(Entity):
 
     def damage_adjacent_targets(self, attack_pow, team, target, game_state: GameState):
         ahead_pos = target.get_adjacent_path_tile(game_state, +1)
-        ahead_ent = game_state.entity_grid[ahead_pos[1]][ahead_pos[0]]
+        ahead_ent = game_state.entity_grid.get(ahead_pos[0], ahead_pos[1])
         
         behind_pos = target.get_adjacent_path_tile(game_state, -1)
-        behind_ent = game_state.entity_grid[behind_pos[1]][behind_pos[0]]
+        behind_ent = game_state.entity_grid.get(behind_pos[0], behind_pos[1])
 
         if isinstance(ahead_ent, Mercenary) and ahead_ent.team != team:
             ahead_ent.health -= attack_pow
+            game_state.record_damage(team, ahead_ent, attack_pow)
             log_msg("Hit an enemy merc that was ahead of me, with the cannon AOE")
         if isinstance(behind_ent, Mercenary) and behind_ent.team != team:
             behind_ent.health -= attack_pow
+            game_state.record_damage(team, behind_ent, attack_pow)
             log_msg("Hit an enemy merc that was behind me, with the cannon AOE")
 
         if isinstance(ahead_ent, Demon):
             ahead_ent.health -= attack_pow
+            game_state.record_damage(team, ahead_ent, attack_pow)
             log_msg("Hit a demon that was ahead of me, with the cannon AOE")
         if isinstance(behind_ent, Demon):
             behind_ent.health -= attack_pow
+            game_state.record_damage(team, behind_ent, attack_pow)
             log_msg("Hit a demon that was behind me, with the cannon AOE")
 
     def shoot_single_priority_target(self, game_state: GameState, do_splash_damage=False):
         potential_targets = []
 
-        for path in self.path:
-            whats_on_path = game_state.entity_grid[path[1]][path[0]]
-
-            if whats_on_path is None: continue
+        for whats_on_path in game_state.entity_grid.occupants(self.path_indices):
             if isinstance(whats_on_path, Mercenary):
                 if whats_on_path.team != self.team:
                     potential_targets.append(whats_on_path)
@@ -124,11 +128,12 @@ class Tower(Entity):
             -ent.current_path.index((ent.x, ent.y)) if self.team == 'b' else ent.current_path.index((ent.x, ent.y)),
             -ent.health,
             -ent.attack_pow,
-            random.random()
+            game_state.rng.random()
         ))
 
         target = potential_targets[0]
         target.health -= self.attack_pow
+        game_state.record_damage(self.team, target, self.attack_pow)
         self.current_cooldown = self.cooldown_max
         self.targets.append((target.x, target.y))
         # self.angle = math.atan2(path[1] - self.y, path[0] - self.x)
@@ -145,14 +150,12 @@ class Tower(Entity):
 
         hit_targets = []
 
-        for path in self.path:
-            whats_on_path = game_state.entity_grid[path[1]][path[0]]
-
-            if whats_on_path is None: continue
+        for whats_on_path in game_state.entity_grid.occupants(self.path_indices):
             if ((isinstance(whats_on_path, Mercenary) and whats_on_path.team != self.team) or
                 (isinstance(whats_on_path, Demon) and whats_on_path.target_team == self.team)):
 
                 whats_on_path.health -= self.attack_pow
+                game_state.record_damage(self.team, whats_on_path, self.attack_pow)
                 self.targets.append((whats_on_path.x, whats_on_path.y))
                 # self.angle = math.atan2(path[1] - self.y, path[0] - self.x)
 
@@ -165,20 +168,6 @@ class Tower(Entity):
             self.last_hit_targets = hit_targets
 
 
-    def find_all_paths_in_range(self, game_state: GameState) -> list:
-        paths = []
-
-        floor_tiles = game_state.floor_tiles
-
-        for xi in range(self.x - self.tower_range, self.x + self.tower_range):
-            for yi in range(self.y - self.tower_range, self.y + self.tower_range):
-                if xi == self.x and yi == self.y: continue
-                if game_state.is_out_of_bounds(xi,yi): continue
-
-                # This is the circle equation, I like my tower range to be circles
-                if math.sqrt((xi - self.x) * (xi - self.x) + (yi - self.y) * (yi - self.y)) <= self.tower_range:
-                    # We're using the tile grid since we don't need to know the entities to know where a path is
-                    if floor_tiles[yi][xi] == 'O':
-                        paths.append((xi,yi))
-
-        return paths
+    # Path tiles within range are the same for every tower of this range on this spot, so the map keeps them
+    def find_all_paths_in_range(self, game_state: GameState) -> tuple:
+        return game_state.map_data.paths_in_range(self.x, self.y, self.tower_range)
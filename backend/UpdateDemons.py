@@ -38,8 +38,8 @@ def set_all_demon_states(game_state: GameState, demons: List[Demon],
 
         next_tile1 = demon.get_adjacent_path_tile(game_state, 1)
         next_tile2 = demon.get_adjacent_path_tile(game_state, 2)
-        blocking_entity1 = game_state.entity_grid[next_tile1[1]][next_tile1[0]]
-        blocking_entity2 = game_state.entity_grid[next_tile2[1]][next_tile2[0]]
+        blocking_entity1 = game_state.entity_grid.get(next_tile1[0], next_tile1[1])
+        blocking_entity2 = game_state.entity_grid.get(next_tile2[0], next_tile2[1])
 
         # check for entities that guarantee 'fighting'
 
@@ -75,7 +75,7 @@ def set_all_demon_states(game_state: GameState, demons: List[Demon],
 def move_all_demons(game_state: GameState, demons: List[Demon]):
     # remove moving demons
     for demon in demons:
-        game_state.entity_grid[demon.y][demon.x] = None
+        game_state.entity_grid.clear(demon.x, demon.y)
 
     # set new position
     for demon in demons:
@@ -85,28 +85,31 @@ def move_all_demons(game_state: GameState, demons: List[Demon]):
 
     # add moving demons back
     for demon in demons:
-        game_state.entity_grid[demon.y][demon.x] = demon
+        game_state.entity_grid.set(demon.x, demon.y, demon)
         log_msg(f"Demon {demon.name} moved to ({demon.x},{demon.y})")
 
 
 def do_demon_combat_single(game_state: GameState, demon: Demon):
     next_tile1 = demon.get_adjacent_path_tile(game_state, 1)
     next_tile2 = demon.get_adjacent_path_tile(game_state, 2)
-    target1: Entity = game_state.entity_grid[next_tile1[1]][next_tile1[0]]
-    target2: Entity = game_state.entity_grid[next_tile2[1]][next_tile2[0]]
+    target1: Entity = game_state.entity_grid.get(next_tile1[0], next_tile1[1])
+    target2: Entity = game_state.entity_grid.get(next_tile2[0], next_tile2[1])
     
     # if tile 1 space in front is empty, we are contesting space with enemy 2 spaces in front 
     if target1 != None:
         b4_health = target1.health
         target1.health -= demon.attack_pow
+        game_state.record_damage(None, target1, demon.attack_pow)
         log_msg(f'Demon {demon.name} attacked opponent {target1.name} at ({next_tile1[0]},{next_tile1[1]}). Target health went from {b4_health} to {target1.health}')
     elif target2 != None:
         b4_health = target2.health
         target2.health -= demon.attack_pow
+        game_state.record_damage(None, target2, demon.attack_pow)
         log_msg(f'Demon {demon.name} attacked opponent {target2.name} at ({next_tile2[0]},{next_tile2[1]}). Target health went from {b4_health} to {target1.health}')
     else:
         # attack the player base if we have reached the end of the path, and there is nobody else to fight
         attackable_base = demon.get_attackable_player_base(game_state)
         if attackable_base != None:
             attackable_base.health -= demon.attack_pow
+            game_state.record_damage(None, attackable_base, demon.attack_pow)
             log_msg(f'Demon {demon.name} attacked {attackable_base.name} at ({attackable_base.x},{attackable_base.y})')
\ No newline at end of file
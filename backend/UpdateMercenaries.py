@@ -41,8 +41,8 @@ def set_all_merc_states(game_state: GameState, mercs: List[Mercenary],
 
         next_tile1 = merc.get_adjacent_path_tile(game_state, 1)
         next_tile2 = merc.get_adjacent_path_tile(game_state, 2)
-        blocking_entity1 = game_state.entity_grid[next_tile1[1]][next_tile1[0]]
-        blocking_entity2 = game_state.entity_grid[next_tile2[1]][next_tile2[0]]
+        blocking_entity1 = game_state.entity_grid.get(next_tile1[0], next_tile1[1])
+        blocking_entity2 = game_state.entity_grid.get(next_tile2[0], next_tile2[1])
 
         # check for entities that guarantee 'fighting' or 'waiting'
 
@@ -84,7 +84,7 @@ def set_all_merc_states(game_state: GameState, mercs: List[Mercenary],
 def move_all_mercs(game_state: GameState, moving_mercs: List[Mercenary]):
     # remove moving mercs
     for merc in moving_mercs:
-        game_state.entity_grid[merc.y][merc.x] = None
+        game_state.entity_grid.clear(merc.x, merc.y)
 
     # set new position
     for merc in moving_mercs:
@@ -94,28 +94,31 @@ def move_all_mercs(game_state: GameState, moving_mercs: List[Mercenary]):
 
     # add moving mercs back
     for merc in moving_mercs:
-        game_state.entity_grid[merc.y][merc.x] = merc
+        game_state.entity_grid.set(merc.x, merc.y, merc)
         log_msg(f"Mercenary {merc.name} moved to ({merc.x},{merc.y})")
 
 
 def do_merc_combat_single(game_state: GameState, merc: Mercenary):
     next_tile1 = merc.get_adjacent_path_tile(game_state, 1)
     next_tile2 = merc.get_adjacent_path_tile(game_state, 2)
-    target1: Entity = game_state.entity_grid[next_tile1[1]][next_tile1[0]]
-    target2: Entity = game_state.entity_grid[next_tile2[1]][next_tile2[0]]
+    target1: Entity = game_state.entity_grid.get(next_tile1[0], next_tile1[1])
+    target2: Entity = game_state.entity_grid.get(next_tile2[0], next_tile2[1])
     
     # if tile 1 space in front is empty, we are contesting space with enemy 2 spaces in front 
     if target1 != None:
         b4_health = target1.health
         target1.health -= merc.attack_pow
+        game_state.record_damage(merc.team, target1, merc.attack_pow)
         log_msg(f'Mercenary {merc.name} attacked opponent {target1.name} at ({next_tile1[0]},{next_tile1[1]}). Target health went from {b4_health} to {target1.health}')
     elif target2 != None:
         b4_health = target2.health
         target2.health -= merc.attack_pow
+        game_state.record_damage(merc.team, target2, merc.attack_pow)
         log_msg(f'Mercenary {merc.name} attacked opponent {target2.name} at ({next_tile2[0]},{next_tile2[1]}). Target health went from {b4_health} to {target2.health}')
     else:
         # attack the player base if we have reached the end of the path, and there is nobody else to fight
         attackable_base = merc.get_attackable_player_base(game_state)
         if attackable_base != None:
             attackable_base.health -= Constants.MERCENARY_ATTACK_POWER
+            game_state.record_damage(merc.team, attackable_base, Constants.MERCENARY_ATTACK_POWER)
             log_msg(f'Mercenary {merc.name} attacked {attackable_base.name} at ({attackable_base.x},{attackable_base.y})')
\ No newline at end of file
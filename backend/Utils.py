@@ -1,11 +1,29 @@
 import sys
 import math
+import threading
+from contextlib import contextmanager
 
 def clamp(x, min_x, max_x):
     return min(max(x, min_x), max_x)
 
+# Whether anything is logged at all, for the whole process, e.g. by a command line tool that wants no log.
+# A single game is kept quiet with GameState.logging instead, which only affects the thread playing it.
+logging_enabled = True
+_local = threading.local()
+
 def log_msg(msg: str):
-    print(msg, file=sys.stderr)
+    if logging_enabled and not getattr(_local, 'suppressed', False):
+        print(msg, file=sys.stderr)
+
+# Nothing logged by this thread inside the with block
+@contextmanager
+def logging_suppressed():
+    was_suppressed = getattr(_local, 'suppressed', False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = was_suppressed
 
 def get_increased_tower_price(current_price, percent_increase: int) -> int:
     return math.floor((1 + 0.01* percent_increase) * current_price)
\ No newline at end of file
@@ -6,42 +6,50 @@ from UpdateMercenaries import update_mercenaries
 from UpdateDemons import update_demons
 from SpawnMercenaries import spawn_mercenaries
 from SpawnDemons import spawn_demons
-from House import House
-from Cannon import Cannon
-from Minigun import Minigun
-from Church import Church
 from Utils import log_msg
 import Constants
 from Entity import Entity
 
 def world_update_phase(game_state: GameState, provoke_demons: bool):
+    # Callbacks between the steps, if any are attached (see PhaseHooks.py)
+    hooks = game_state.hooks
+
     # remove dead entities from respective lists
     game_state.mercs = [m for m in game_state.mercs if m.state != "dead"]
     game_state.demons = [d for d in game_state.demons if d.state != "dead"]
+    game_state.record_dead_removed()
+    if hooks is not None: hooks.fire("after_remove_dead", game_state)
 
     update_mercenaries(game_state)
     mortal_wound_check(game_state, game_state.mercs + game_state.demons)
     game_state.victory = check_wincon(game_state)
+    if hooks is not None: hooks.fire("after_update_mercenaries", game_state)
     if game_state.victory != None: return
 
     update_demons(game_state)
     mortal_wound_check(game_state, game_state.mercs + game_state.demons)
     game_state.victory = check_wincon(game_state)
+    if hooks is not None: hooks.fire("after_update_demons", game_state)
     if game_state.victory != None: return
     
     spawn_mercenaries(game_state)
     spawn_demons(game_state, provoke_demons)
+    if hooks is not None:
+        hooks.fire("after_spawn", game_state)
+        hooks.fire("before_update_towers", game_state)
 
     for tower in game_state.towers:
         tower.update(game_state)
     mortal_wound_check(game_state, game_state.mercs + game_state.demons)
+    if hooks is not None: hooks.fire("after_update_towers", game_state)
 
 
 def mortal_wound_check(game_state: GameState, entities: List[Entity]):
     for ent in entities:
         if ent.health <= 0 and ent.state != "dead":
-            game_state.entity_grid[ent.y][ent.x] = None
+            game_state.entity_grid.clear(ent.x, ent.y)
             ent.state = "dead"
+            game_state.record_death(ent)
             log_msg(f"{ent.name} has suffered mortal wounds")
 
 
@@ -53,8 +61,6 @@ def check_wincon(game_state: GameState):
     team_b_money = game_state.money_b
     team_r_money = game_state.money_r
 
-    towers = game_state.towers
-
     # If one of the players has had their base destroyed
     if team_b_health <= 0 or team_r_health <= 0:
         # If one of the players has their base intact while the other is destroyed, they win
@@ -81,19 +87,13 @@ def check_wincon(game_state: GameState):
             return 'r'
     else:
         # Then, if both players have the same amount of Money, break the tie based on who has built the most towers.
-        # Empty lists that will store each tower the teams have
-        r_towers = []
-        b_towers = []
+        # The counts come from the running totals the GameState keeps (TeamStats.py), so nothing is rescanned here.
+        # Mercenaries killed this turn are still in the mercs list, so they count too.
+        stats_r = game_state.stats_r
+        stats_b = game_state.stats_b
 
-        for tower in towers:
-            current_team = tower.team
-            if current_team == 'r':
-                r_towers.append(tower)
-            else:
-                b_towers.append(tower)
-        
-        if len(r_towers) != len(b_towers):
-            if len(r_towers) > len(b_towers):
+        if stats_r.tower_count != stats_b.tower_count:
+            if stats_r.tower_count > stats_b.tower_count:
                 game_state.victory_reason = "Tie broken: Red has more towers."
                 return 'r'
             else:
@@ -101,38 +101,9 @@ def check_wincon(game_state: GameState):
                 return 'b'
         else:
             # Then, if both players have built the same number of towers, break the tie based on the sum of prices of those towers.
-            # Equals the total price of the total amount of towers per team
-            r_total_cost = 0
-            b_total_cost = 0
+            r_total_cost = stats_r.tower_value
+            b_total_cost = stats_b.tower_value
 
-            for tower in towers:
-                current_team = tower.team
-
-                if isinstance(tower, House):
-                    if current_team == 'r':
-                        r_total_cost += Constants.HOUSE_BASE_PRICE
-                    else:
-                        b_total_cost += Constants.HOUSE_BASE_PRICE
-                elif isinstance(tower, Cannon):
-                    if current_team == 'r':
-                        r_total_cost += Constants.CANNON_BASE_PRICE
-                    else:
-                        b_total_cost += Constants.CANNON_BASE_PRICE
-                elif isinstance(tower, Minigun):
-                    if current_team == 'r':
-                        r_total_cost += Constants.MINIGUN_BASE_PRICE
-                    else:
-                        b_total_cost += Constants.MINIGUN_BASE_PRICE
-                elif isinstance(tower, Church):
-                    if current_team == 'r':
-                        r_total_cost += Constants.CHURCH_BASE_PRICE
-                    else:
-                        b_total_cost += Constants.CHURCH_BASE_PRICE
-                else:   # Crossbow
-                    if current_team == 'r':
-                        r_total_cost += Constants.CROSSBOW_BASE_PRICE
-                    else:
-                        b_total_cost += Constants.CROSSBOW_BASE_PRICE
             if r_total_cost != b_total_cost:
                 if r_total_cost > b_total_cost:
                     game_state.victory_reason = "Tie broken: Red has spent more."
@@ -142,16 +113,8 @@ def check_wincon(game_state: GameState):
                     return 'b'
             else:
                 # Then, if both sums are equal, break the tie based on the number of Mercenaries each player has.
-
-                # Number of mercenaries per team
-                r_mercs = 0
-                b_mercs = 0
-
-                for merc in game_state.mercs:
-                    if merc.team == 'r':
-                        r_mercs += 1
-                    else:
-                        b_mercs += 1
+                r_mercs = stats_r.mercs_alive + stats_r.mercs_dying
+                b_mercs = stats_b.mercs_alive + stats_b.mercs_dying
                 
                 if r_mercs != b_mercs:
                     if r_mercs > b_mercs:
@@ -162,14 +125,8 @@ def check_wincon(game_state: GameState):
                         return 'b'
                 else:
                     # Then, if both have the same number of Mercenaries, break the tie based on the sum of health of mercenaries.
-                    r_mercs_health = 0
-                    b_mercs_health = 0
-
-                    for merc in game_state.mercs:
-                        if merc.team == 'r':
-                            r_mercs_health += merc.health
-                        else:
-                            b_mercs_health += merc.health
+                    r_mercs_health = stats_r.merc_health + stats_r.dying_merc_health
+                    b_mercs_health = stats_b.merc_health + stats_b.dying_merc_health
                     
                     if r_mercs_health != b_mercs_health:
                         if r_mercs_health > b_mercs_health:
@@ -1,91 +1,271 @@
-from Game import Game
+from Game import Game, ENTITY_GRID_MODES
 from AIAction import AIAction
+from AgentConnection import AGENT_KEY_VARIABLE, LocalAgent, RemoteAgent, check_agent_address, connect_agent, close_idle_connections
+from ResourceMonitor import ResourceLimits
+from SpectatorServer import SpectatorServer
+from DifferentialTest import save_actions
+from MetricsRecorder import MetricsRecorder, METRICS_FORMATS
+from PhaseHooks import PhaseHooks
 from Utils import log_msg
 import Constants
 import os
 import argparse
-import subprocess
+import json
+import queue
+import random
 import sys
+import threading
+import time
 
 
-# Main game loop
-def main_game_loop(ai_agent_1, ai_agent_2, game: Game):
-    while not game.game_state.is_game_over():
-        
-        # Get agents' actions
-        agent_1_action_string = ""
-        if ai_agent_1:
-            try:
-                # Send game state to agent
-                if game.game_state.turns_remaining < Constants.MAX_TURNS:
-                    ai_agent_1.stdin.write(game.game_state_to_json() + "\n--END OF TURN--\n")
-                    ai_agent_1.stdin.flush()
-                
-                # Read action from agent
-                agent_1_action_string = ai_agent_1.stdout.readline().strip()
-                
-                # Check if agent died (readline returns empty string if process ended)
-                if not agent_1_action_string:
-                    log_msg('Agent 1 process died or produced no output!')
-                    # Read stderr to see what went wrong
-                    stderr_output = ai_agent_1.stderr.read()
-                    if stderr_output:
-                        log_msg(f'Agent 1 stderr: {stderr_output}')
-            except Exception as e:
-                log_msg(f'Error reading from Agent 1: {e}')
-                agent_1_action_string = ""
-        else:
-            # "Human" input from visualizer or other parent process
-            agent_1_action_string = input()
-        
-        agent_1_action = AIAction('nothing',0,0)
+# Ask one agent for its action this turn. agent_number is 1 (Red) or 2 (Blue).
+# If the agent is None, the action is read from stdin ("Human" input from the visualizer or other parent process)
+# turn_timeout applies to remote agents; any agent may also be limited by its think budget (see ResourceMonitor.py).
+def get_agent_action(ai_agent, agent_number: int, game: Game, turn_timeout: float = None) -> AIAction:
+    action_string = ""
+    if ai_agent:
+        timed_out = False
+        ai_agent.monitor.turn_started()
         try:
-            agent_1_action = AIAction.from_json(agent_1_action_string)
+            # Send game state to agent
+            if game.game_state.turns_remaining < Constants.MAX_TURNS:
+                ai_agent.send(game.game_state_to_json(entity_grid=ai_agent.options["EntityGrid"]) + "\n--END OF TURN--\n")
+
+            # Read action from agent
+            timeout = ai_agent.monitor.turn_timeout(turn_timeout if isinstance(ai_agent, RemoteAgent) else None)
+            action_string = ai_agent.read_line(timeout).strip()
+
+            # Check if agent died (read_line returns empty string if process ended)
+            if not action_string:
+                log_msg(f'Agent {agent_number} process died or produced no output!')
+                # Show the end of its stderr to see what went wrong
+                stderr_output = ai_agent.error_output()
+                if stderr_output:
+                    log_msg(f'Agent {agent_number} stderr (last lines): {stderr_output}')
+        except TimeoutError:
+            log_msg(f'Agent {agent_number} ran out of time for this turn')
+            timed_out = True
+            action_string = ""
         except Exception as e:
-            log_msg(f'Agent 1 produced invalid JSON! Agent 1 forfeits their turn! Error: {e}')
+            log_msg(f'Error reading from Agent {agent_number}: {e}')
+            action_string = ""
+        finally:
+            ai_agent.monitor.turn_ended(timed_out)
+    else:
+        # "Human" input from visualizer or other parent process
+        action_string = input()
 
-        agent_2_action_string = ""
-        if ai_agent_2:
-            try:
-                # Send game state to agent
-                if game.game_state.turns_remaining < Constants.MAX_TURNS:
-                    ai_agent_2.stdin.write(game.game_state_to_json() + "\n--END OF TURN--\n")
-                    ai_agent_2.stdin.flush()
-                
-                # Read action from agent
-                agent_2_action_string = ai_agent_2.stdout.readline().strip()
-                
-                # Check if agent died
-                if not agent_2_action_string:
-                    log_msg('Agent 2 process died or produced no output!')
-                    stderr_output = ai_agent_2.stderr.read()
-                    if stderr_output:
-                        log_msg(f'Agent 2 stderr: {stderr_output}')
-            except Exception as e:
-                log_msg(f'Error reading from Agent 2: {e}')
-                agent_2_action_string = ""
+    action = AIAction('nothing',0,0)
+    try:
+        action = AIAction.from_json(action_string)
+    except Exception as e:
+        log_msg(f'Agent {agent_number} produced invalid JSON! Agent {agent_number} forfeits their turn! Error: {e}')
+    return action
+
+
+# Start an AI agent, either as a child process or by connecting to an AgentServer or AgentZygote
+def start_agent(agent_file: str, remote_address: str, limits: ResourceLimits = None, agent_key: str = None):
+    if remote_address:
+        return connect_agent(remote_address, limits, agent_key)
+    return LocalAgent(agent_file, limits)
+
+
+# Options an agent can ask for before it sends its team name, with the values allowed for each (the first is the default):
+#   --OPTIONS {"EntityGrid": "sparse"}--
+# "EntityGrid" - how the entity grid is sent every turn after the initial game state (see Game.ENTITY_GRID_MODES)
+AGENT_OPTIONS = {
+    "EntityGrid": ENTITY_GRID_MODES
+}
+
+
+def default_agent_options() -> dict:
+    return {option: values[0] for option, values in AGENT_OPTIONS.items()}
+
+
+# Options from an agent's "--OPTIONS {...}--" line. Anything unknown is logged and left at its default.
+def parse_agent_options(line: str, agent_number: int) -> dict:
+    options = default_agent_options()
+    try:
+        requested = json.loads(line[len('--OPTIONS '):-len('--')])
+        if not isinstance(requested, dict):
+            raise ValueError('options must be a JSON object')
+    except ValueError as e:
+        log_msg(f'Agent {agent_number} sent invalid options, using the defaults. Error: {e}')
+        return options
+    for option, value in requested.items():
+        if option not in AGENT_OPTIONS:
+            log_msg(f'Agent {agent_number} asked for unknown option {option}')
+        elif value not in AGENT_OPTIONS[option]:
+            log_msg(f'Agent {agent_number} asked for {option} = {value}, which must be one of {", ".join(AGENT_OPTIONS[option])}')
         else:
-            # "Human" input from visualizer or other parent process
-            agent_2_action_string = input()
-        
-        agent_2_action = AIAction('nothing',0,0)
-        try:
-            agent_2_action = AIAction.from_json(agent_2_action_string)
-        except Exception as e:
-            log_msg(f'Agent 2 produced invalid JSON! Agent 2 forfeits their turn! Error: {e}')
+            options[option] = value
+    return options
+
+
+# Send the initial game state to an agent and return its team name.
+# The agent may ask for options (see AGENT_OPTIONS) before its team name; they're kept in ai_agent.options.
+# The whole exchange must fit in the agent's initialization budget, if it has one (see ResourceMonitor.py).
+def initialize_agent(ai_agent, agent_number: int, game: Game) -> str:
+    color = "RED" if agent_number == 1 else "BLUE"
+    error_name = f"Agent {agent_number} ({'Red' if agent_number == 1 else 'Blue'}) - ERROR"
+    ai_agent.options = default_agent_options()
+    ai_agent.monitor.init_started()
+    try:
+        ai_agent.send(f"--YOU ARE {color}--\n" + game.game_state_to_json(include_map_analysis=True) + "\n--END INITIAL GAME STATE--\n")
+        init_timeout = ai_agent.monitor.init_timeout()
+        deadline = None if init_timeout is None else time.monotonic() + init_timeout
+        team_name = ai_agent.read_line(remaining_time(deadline)).strip()
+        if team_name.startswith('--OPTIONS ') and team_name.endswith('--'):
+            ai_agent.options = parse_agent_options(team_name, agent_number)
+            team_name = ai_agent.read_line(remaining_time(deadline)).strip()
+        if not team_name:
+            log_msg(f'Agent {agent_number} failed to provide team name!')
+            stderr_output = ai_agent.error_output()
+            if stderr_output:
+                log_msg(f'Agent {agent_number} stderr (last lines): {stderr_output}')
+            team_name = error_name
+    except TimeoutError:
+        log_msg(f'Agent {agent_number} ran out of time to initialize')
+        team_name = error_name
+    except Exception as e:
+        log_msg(f'Error initializing Agent {agent_number}: {e}')
+        team_name = error_name
+    finally:
+        ai_agent.monitor.init_ended()
+    return team_name
+
+
+# Seconds left until a deadline (None for no deadline)
+def remaining_time(deadline: float) -> float:
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+# Get both agents' actions, then run the next turn
+def play_turn(ai_agent_1, ai_agent_2, game: Game, turn_timeout: float = None):
+    agent_1_action = get_agent_action(ai_agent_1, 1, game, turn_timeout)
+    agent_2_action = get_agent_action(ai_agent_2, 2, game, turn_timeout)
+    game.run_turn(agent_1_action, agent_2_action)
+
+
+# Main game loop
+def main_game_loop(ai_agent_1, ai_agent_2, game: Game, visualizer: bool, spectator_server: SpectatorServer = None, turn_timeout: float = None):
+    while not game.game_state.is_game_over():
+        play_turn(ai_agent_1, ai_agent_2, game, turn_timeout)
 
-        # Run the next turn
-        game.run_turn(agent_1_action, agent_2_action)
-        
         # Print a string representation of the new game state to stdout
-        print(game.game_state_to_json())
+        game_state_json = game.game_state_to_json()
+        print(game_state_json)
+        if spectator_server:
+            spectator_server.publish(game_state_json)
 
         # If using the visualizer, wait for "--NEXT TURN--" from stdin
-        if cmd_line_args.visualizer:
+        if visualizer:
             while input() != "--NEXT TURN--":
                 pass
 
 
+# Producer side of the look-ahead game loop: runs on its own thread, simulating turns
+# and putting each new game state into turn_buffer. put() blocks while the buffer is full,
+# so the simulation never gets more than turn_buffer.maxsize turns ahead of the visualizer.
+# Spectators are fed from here, so they follow the simulation rather than the visualizer.
+def simulate_ahead(ai_agent_1, ai_agent_2, game: Game, turn_buffer: queue.Queue, spectator_server: SpectatorServer = None, turn_timeout: float = None):
+    try:
+        while not game.game_state.is_game_over():
+            play_turn(ai_agent_1, ai_agent_2, game, turn_timeout)
+            game_state_json = game.game_state_to_json()
+            if spectator_server:
+                spectator_server.publish(game_state_json)
+            turn_buffer.put(game_state_json)
+    except Exception as e:
+        log_msg(f'Simulation thread crashed: {e}')
+    finally:
+        # None tells the consumer that no more turns are coming
+        turn_buffer.put(None)
+
+
+# Game loop for the visualizer when both players are AI agents. The engine (and the agents)
+# keep working on upcoming turns while the visualizer animates the current one, instead of
+# waiting for "--NEXT TURN--" before starting the next simulation step.
+# The visualizer still receives exactly one game state per "--NEXT TURN--".
+def buffered_game_loop(ai_agent_1, ai_agent_2, game: Game, lookahead: int, spectator_server: SpectatorServer = None, turn_timeout: float = None):
+    turn_buffer = queue.Queue(maxsize=lookahead)
+    simulator = threading.Thread(
+        target=simulate_ahead,
+        args=(ai_agent_1, ai_agent_2, game, turn_buffer, spectator_server, turn_timeout),
+        daemon=True
+    )
+    simulator.start()
+
+    while True:
+        game_state_json = turn_buffer.get()
+        if game_state_json is None:
+            break
+
+        # Print a string representation of the new game state to stdout
+        print(game_state_json)
+
+        # Wait for "--NEXT TURN--" from stdin
+        while input() != "--NEXT TURN--":
+            pass
+
+    simulator.join()
+
+
+# Play a whole match between two AI agents without printing anything, and return the result,
+# including what each agent cost (see ResourceMonitor.summary).
+# Each agent is either a path to an agent file, the HOST:PORT of an AgentServer or zygote:<socket> of an AgentZygote.
+# Used by Tournament.py workers, which run many headless matches in one process.
+# If metrics_file is given, the match's per-turn metrics are saved to it (see MetricsRecorder.py).
+def run_match(map_json_file: str, agent_1: str, agent_2: str, seed: int = None, turn_timeout: float = None, limits: ResourceLimits = None, metrics_file: str = None) -> dict:
+    if seed is not None:
+        random.seed(seed)
+
+    ai_agent_1 = None
+    ai_agent_2 = None
+    try:
+        ai_agent_1 = start_agent(None, agent_1, limits) if not os.path.exists(agent_1) else start_agent(agent_1, None, limits)
+        ai_agent_2 = start_agent(None, agent_2, limits) if not os.path.exists(agent_2) else start_agent(agent_2, None, limits)
+
+        game = Game(map_json_file_path = map_json_file)
+        metrics = record_metrics(game, ai_agent_1, ai_agent_2) if metrics_file else None
+        game.team_name_r = initialize_agent(ai_agent_1, 1, game)
+        game.team_name_b = initialize_agent(ai_agent_2, 2, game)
+
+        while not game.game_state.is_game_over():
+            play_turn(ai_agent_1, ai_agent_2, game, turn_timeout)
+        if metrics:
+            metrics.save(metrics_file)
+        resource_usage_r = ai_agent_1.monitor.summary()
+        resource_usage_b = ai_agent_2.monitor.summary()
+    finally:
+        if ai_agent_1:
+            ai_agent_1.close()
+        if ai_agent_2:
+            ai_agent_2.close()
+
+    return {
+        "TeamNameR": game.team_name_r,
+        "TeamNameB": game.team_name_b,
+        "Victory": game.game_state.victory or "",
+        "VictoryReason": game.game_state.victory_reason,
+        "TurnsPlayed": Constants.MAX_TURNS - game.game_state.turns_remaining,
+        "ResourceUsageR": resource_usage_r,
+        "ResourceUsageB": resource_usage_b
+    }
+
+
+# Start recording a game's per-turn metrics, including the agents' think times. Either agent may be None (human).
+def record_metrics(game: Game, ai_agent_1, ai_agent_2) -> MetricsRecorder:
+    metrics = MetricsRecorder({
+        'r': ai_agent_1.monitor if ai_agent_1 else None,
+        'b': ai_agent_2.monitor if ai_agent_2 else None
+    })
+    if game.game_state.hooks is None:
+        game.game_state.hooks = PhaseHooks()
+    metrics.attach(game.game_state.hooks)
+    return metrics
+
+
 # Use argparse to parse command line arguments
 def get_command_line_arguments() -> argparse.Namespace:
 
@@ -107,6 +287,20 @@ def get_command_line_arguments() -> argparse.Namespace:
         '--ai_agent_file_2',
         help='Path to the AI agent 2 python file'
     )
+    parser.add_argument(
+        '-r1',
+        '--remote_agent_1',
+        help='HOST:PORT of an AgentServer hosting AI agent 1, or zygote:<socket path> of an AgentZygote, instead of an agent file'
+    )
+    parser.add_argument(
+        '-r2',
+        '--remote_agent_2',
+        help='HOST:PORT of an AgentServer hosting AI agent 2, or zygote:<socket path> of an AgentZygote, instead of an agent file'
+    )
+    parser.add_argument(
+        '--agent_key',
+        help=f'Shared secret of the AgentServers given by -r1/-r2 (default: ${AGENT_KEY_VARIABLE})'
+    )
     parser.add_argument(
         '-h1',
         '--agent_1_is_human',
@@ -125,6 +319,62 @@ def get_command_line_arguments() -> argparse.Namespace:
         action='store_true',
         help='Enable visualizer mode (non-headless). This argument should not be used from the command line.'
     )
+    parser.add_argument(
+        '-l',
+        '--lookahead',
+        type=int,
+        default=10,
+        help='In visualizer mode with two AI agents, how many turns the engine may simulate ahead of the visualizer. 0 disables look-ahead.'
+    )
+    parser.add_argument(
+        '-sp',
+        '--spectator_port',
+        type=int,
+        help='Broadcast the game state stream to spectators on this localhost TCP port (0 picks a free port)'
+    )
+    parser.add_argument(
+        '-t',
+        '--turn_timeout',
+        type=float,
+        default=10.0,
+        help='Seconds a remote agent gets to answer each turn before it forfeits that turn'
+    )
+    parser.add_argument(
+        '--memory_limit',
+        type=float,
+        help='Megabytes of address space each local agent process may use'
+    )
+    parser.add_argument(
+        '--cpu_limit',
+        type=float,
+        help='CPU seconds each local agent process may use over the whole match; it is stopped when it goes over'
+    )
+    parser.add_argument(
+        '--think_budget',
+        type=float,
+        help='Seconds each agent may think over the whole match; after that it forfeits the turns it is too slow for'
+    )
+    parser.add_argument(
+        '--init_budget',
+        type=float,
+        help='Seconds each agent may take to initialize and send its team name, apart from its think budget'
+    )
+    parser.add_argument(
+        '-s',
+        '--seed',
+        type=int,
+        help='Seed for the random tie-breaks, to make a match reproducible'
+    )
+    parser.add_argument(
+        '-rec',
+        '--record',
+        help='Save the map, seed and every action played to this file, to replay the match with DifferentialTest.py'
+    )
+    parser.add_argument(
+        '-m',
+        '--metrics',
+        help=f'Save per-turn metrics of the match (money, health, units, towers, prices, think times) to this {" or ".join(METRICS_FORMATS)} file'
+    )
     return parser.parse_args()
 
 
@@ -136,19 +386,43 @@ def validate_command_line_arguments(cmd_line_args: argparse.Namespace) -> str:
     if not os.path.exists(cmd_line_args.map_json_file):
         return f'Map file not found: {cmd_line_args.map_json_file}'
     
-    # Agent 1: Must have either AI agent file or be human
+    # Agent 1: Must have either AI agent file, a remote agent, or be human
     if not cmd_line_args.agent_1_is_human:
-        if not cmd_line_args.ai_agent_file_1:
-            return 'Agent 1 must either be human (--agent_1_is_human) or have an AI agent file (-a1)'
-        if not os.path.exists(cmd_line_args.ai_agent_file_1):
+        if cmd_line_args.remote_agent_1:
+            try:
+                check_agent_address(cmd_line_args.remote_agent_1)
+            except ValueError as e:
+                return str(e)
+        elif not cmd_line_args.ai_agent_file_1:
+            return 'Agent 1 must either be human (--agent_1_is_human), have an AI agent file (-a1) or a remote agent (-r1)'
+        elif not os.path.exists(cmd_line_args.ai_agent_file_1):
             return f'AI agent 1 file not found: {cmd_line_args.ai_agent_file_1}'
     
-    # Agent 2: Must have either AI agent file or be human
+    # Agent 2: Must have either AI agent file, a remote agent, or be human
     if not cmd_line_args.agent_2_is_human:
-        if not cmd_line_args.ai_agent_file_2:
-            return 'Agent 2 must either be human (--agent_2_is_human) or have an AI agent file (-a2)'
-        if not os.path.exists(cmd_line_args.ai_agent_file_2):
+        if cmd_line_args.remote_agent_2:
+            try:
+                check_agent_address(cmd_line_args.remote_agent_2)
+            except ValueError as e:
+                return str(e)
+        elif not cmd_line_args.ai_agent_file_2:
+            return 'Agent 2 must either be human (--agent_2_is_human), have an AI agent file (-a2) or a remote agent (-r2)'
+        elif not os.path.exists(cmd_line_args.ai_agent_file_2):
             return f'AI agent 2 file not found: {cmd_line_args.ai_agent_file_2}'
+
+    if cmd_line_args.lookahead < 0:
+        return f'Look-ahead must not be negative: {cmd_line_args.lookahead}'
+
+    if cmd_line_args.turn_timeout <= 0:
+        return f'Turn timeout must be positive: {cmd_line_args.turn_timeout}'
+
+    for name in ('memory_limit', 'cpu_limit', 'think_budget', 'init_budget'):
+        value = getattr(cmd_line_args, name)
+        if value is not None and value <= 0:
+            return f'{name} must be positive: {value}'
+
+    if cmd_line_args.metrics and os.path.splitext(cmd_line_args.metrics)[1].lower() not in METRICS_FORMATS:
+        return f'Metrics file must end in {" or ".join(METRICS_FORMATS)}: {cmd_line_args.metrics}'
     
     return ''
 
@@ -170,17 +444,11 @@ if __name__ == '__main__':
         exit(1)
 
     # Create AI agents
+    limits = ResourceLimits(cmd_line_args.memory_limit, cmd_line_args.cpu_limit, cmd_line_args.think_budget, cmd_line_args.init_budget)
     ai_agent_1 = None
     if not cmd_line_args.agent_1_is_human:
         try:
-            ai_agent_1 = subprocess.Popen(
-                [sys.executable, cmd_line_args.ai_agent_file_1],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
+            ai_agent_1 = start_agent(cmd_line_args.ai_agent_file_1, cmd_line_args.remote_agent_1, limits, cmd_line_args.agent_key)
         except Exception as e:
             print(f"Failed to start Agent 1: {e}")
             exit(1)
@@ -188,71 +456,54 @@ if __name__ == '__main__':
     ai_agent_2 = None
     if not cmd_line_args.agent_2_is_human:
         try:
-            ai_agent_2 = subprocess.Popen(
-                [sys.executable, cmd_line_args.ai_agent_file_2],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
+            ai_agent_2 = start_agent(cmd_line_args.ai_agent_file_2, cmd_line_args.remote_agent_2, limits, cmd_line_args.agent_key)
         except Exception as e:
             print(f"Failed to start Agent 2: {e}")
             exit(1)
 
-    # Initialize the game
+    # Initialize the game. A recorded match needs a seed to be replayed, so pick one if none was given.
+    if cmd_line_args.record and cmd_line_args.seed is None:
+        cmd_line_args.seed = random.randrange(2**32)
+    if cmd_line_args.seed is not None:
+        random.seed(cmd_line_args.seed)
     game = Game(map_json_file_path = cmd_line_args.map_json_file)
+    if cmd_line_args.record:
+        game.action_log = []
+    metrics = record_metrics(game, ai_agent_1, ai_agent_2) if cmd_line_args.metrics else None
 
     # Send initial game state to agents, then get team names
-    team_name_r = ""
-    if ai_agent_1:
-        try:
-            ai_agent_1.stdin.write("--YOU ARE RED--\n")
-            ai_agent_1.stdin.write(game.game_state_to_json() + "\n--END INITIAL GAME STATE--\n")
-            ai_agent_1.stdin.flush()
-            team_name_r = ai_agent_1.stdout.readline().strip()
-            if not team_name_r:
-                log_msg('Agent 1 failed to provide team name!')
-                stderr_output = ai_agent_1.stderr.read()
-                if stderr_output:
-                    log_msg(f'Agent 1 stderr: {stderr_output}')
-                team_name_r = "Agent 1 (Red) - ERROR"
-        except Exception as e:
-            log_msg(f'Error initializing Agent 1: {e}')
-            team_name_r = "Agent 1 (Red) - ERROR"
-    else:
-        team_name_r = "Human Player (Red)"
-    
-    team_name_b = ""
-    if ai_agent_2:
-        try:
-            ai_agent_2.stdin.write("--YOU ARE BLUE--\n")
-            ai_agent_2.stdin.write(game.game_state_to_json() + "\n--END INITIAL GAME STATE--\n")
-            ai_agent_2.stdin.flush()
-            team_name_b = ai_agent_2.stdout.readline().strip()
-            if not team_name_b:
-                log_msg('Agent 2 failed to provide team name!')
-                stderr_output = ai_agent_2.stderr.read()
-                if stderr_output:
-                    log_msg(f'Agent 2 stderr: {stderr_output}')
-                team_name_b = "Agent 2 (Blue) - ERROR"
-        except Exception as e:
-            log_msg(f'Error initializing Agent 2: {e}')
-            team_name_b = "Agent 2 (Blue) - ERROR"
-    else:
-        team_name_b = "Human Player (Blue)"
+    team_name_r = initialize_agent(ai_agent_1, 1, game) if ai_agent_1 else "Human Player (Red)"
+    team_name_b = initialize_agent(ai_agent_2, 2, game) if ai_agent_2 else "Human Player (Blue)"
 
     # Send initial game state and team names to the visualizer (or other parent process)
     game.team_name_r = team_name_r
     game.team_name_b = team_name_b
+    initial_game_state_json = game.game_state_to_json()
     print("--BEGIN INITIAL GAME STATE--")
-    print(game.game_state_to_json())
+    print(initial_game_state_json)
     print("--END INITIAL GAME STATE--")
     print(f"--RED TEAM NAME: {team_name_r}--")
     print(f"--BLUE TEAM NAME: {team_name_b}--")
 
+    # Optionally let spectators watch the match
+    spectator_server = None
+    if cmd_line_args.spectator_port is not None:
+        try:
+            spectator_server = SpectatorServer(cmd_line_args.spectator_port)
+            spectator_server.start()
+            spectator_server.publish(initial_game_state_json)
+        except OSError as e:
+            log_msg(f'Failed to start spectator server: {e}')
+            spectator_server = None
+
     # Main game loop
-    main_game_loop(ai_agent_1, ai_agent_2, game)
+    if cmd_line_args.visualizer and ai_agent_1 and ai_agent_2 and cmd_line_args.lookahead > 0:
+        buffered_game_loop(ai_agent_1, ai_agent_2, game, cmd_line_args.lookahead, spectator_server, cmd_line_args.turn_timeout)
+    else:
+        main_game_loop(ai_agent_1, ai_agent_2, game, cmd_line_args.visualizer, spectator_server, cmd_line_args.turn_timeout)
+
+    if spectator_server:
+        spectator_server.close()
 
     # Print game result
     match game.game_state.victory:
@@ -261,10 +512,26 @@ if __name__ == '__main__':
         case 'tie': print(f"--WINNER: TIE--")
         case _:     print("--RAN OUT OF TURNS--")
 
-    # Clean up subprocesses
+    if cmd_line_args.record:
+        try:
+            save_actions(cmd_line_args.record, cmd_line_args.map_json_file, cmd_line_args.seed, game.action_log)
+        except OSError as e:
+            log_msg(f'Failed to save the match record: {e}')
+
+    if metrics:
+        try:
+            metrics.save(cmd_line_args.metrics)
+        except (OSError, ImportError) as e:
+            log_msg(f'Failed to save the match metrics: {e}')
+
+    # What the agents cost, for the log
+    for agent_number, ai_agent in ((1, ai_agent_1), (2, ai_agent_2)):
+        if ai_agent:
+            log_msg(f'Agent {agent_number} resource usage: {json.dumps(ai_agent.monitor.summary())}')
+
+    # Clean up agents
     if ai_agent_1:
-        ai_agent_1.terminate()
-        ai_agent_1.wait()
+        ai_agent_1.close()
     if ai_agent_2:
-        ai_agent_2.terminate()
-        ai_agent_2.wait()
\ No newline at end of file
+        ai_agent_2.close()
+    close_idle_connections()
\ No newline at end of file